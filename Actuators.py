@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+import Timing
+
+# Actuator dispatch. Key presses and brightness writes run on a background
+# thread so a slow device (DDC/CI brightness can take 100+ ms) never stalls
+# the camera loop. The frame path only records what it wants:
+#
+#   - brightness keeps just the latest target, so a burst of steps becomes
+#     a single write of the final value
+#   - key presses queue in order (each volume step counts), bounded so a
+#     stuck backend can't grow the queue forever
+#
+# Each device also has a minimum interval between writes. Backends are plain
+# objects with press / set_brightness / get_brightness, so the real desktop
+# backend can be swapped for NullBackend or RecordingBackend when headless.
+
+DEFAULT_INTERVALS = {"key": 0.0, "brightness": 0.2}  # seconds between writes
+MAX_PENDING_KEYS = 16
+
+
+class NullBackend:
+    def press(self, key):
+        pass
+
+    def set_brightness(self, value):
+        pass
+
+    def get_brightness(self):
+        return None
+
+
+class RecordingBackend(NullBackend):
+    # Records (time, device, value) for every write; `delay` simulates slow hardware
+    def __init__(self, delay=0.0, brightness=50):
+        self.delay = delay
+        self.brightness = brightness
+        self.calls = []
+
+    def _record(self, device, value):
+        if self.delay:
+            time.sleep(self.delay)
+        self.calls.append((time.time(), device, value))
+
+    def press(self, key):
+        self._record("key", key)
+
+    def set_brightness(self, value):
+        self.brightness = value
+        self._record("brightness", value)
+
+    def get_brightness(self):
+        return self.brightness
+
+
+class DesktopBackend:
+    # pyautogui key presses and screen_brightness_control, imported here so
+    # headless setups don't need either package
+    def __init__(self):
+        import pyautogui
+        import screen_brightness_control as sbc
+        # Disable pyautogui failsafe for non-mouse actions
+        pyautogui.FAILSAFE = False
+        self._pyautogui = pyautogui
+        self._sbc = sbc
+
+    def press(self, key):
+        self._pyautogui.press(key)
+
+    def set_brightness(self, value):
+        self._sbc.set_brightness(int(value))
+
+    def get_brightness(self):
+        return self._sbc.get_brightness()[0]
+
+
+class ActuatorDispatcher:
+    def __init__(self, backend, intervals=None, timer=Timing.NULL_TIMER):
+        self.backend = backend
+        self.intervals = dict(DEFAULT_INTERVALS, **(intervals or {}))
+        self.timer = timer
+        self._cond = threading.Condition()
+        self._keys = deque()      # (key, submit time)
+        self._brightness = None   # (target, submit time of the oldest coalesced request)
+        self._next_write = {}     # device -> earliest time of its next write
+        self._busy = False
+        self._running = False
+        self._thread = None
+
+    def press(self, key):
+        with self._cond:
+            if len(self._keys) >= MAX_PENDING_KEYS:
+                self._keys.popleft()
+                self.timer.inc('actuator_dropped_total', device='key')
+            self._keys.append((key, time.perf_counter()))
+            self._wake()
+        self.timer.inc('actuator_requests_total', device='key')
+
+    def set_brightness(self, value):
+        with self._cond:
+            if self._brightness is None:
+                submitted = time.perf_counter()
+            else:
+                # Replace the pending target; latency counts from the first request
+                submitted = self._brightness[1]
+                self.timer.inc('actuator_coalesced_total', device='brightness')
+            self._brightness = (value, submitted)
+            self._wake()
+        self.timer.inc('actuator_requests_total', device='brightness')
+
+    def _wake(self):
+        # Called with the lock held; the worker starts on first use
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="actuators", daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def _pending(self):
+        return bool(self._keys) or self._brightness is not None
+
+    def _take(self, now):
+        # Next job whose device is off its rate limit, else seconds to wait
+        wait = None
+        if self._keys:
+            ready = self._next_write.get("key", 0.0)
+            if now >= ready or not self._running:
+                key, submitted = self._keys.popleft()
+                return ("key", key, submitted), None
+            wait = ready - now
+        if self._brightness is not None:
+            ready = self._next_write.get("brightness", 0.0)
+            if now >= ready or not self._running:
+                (value, submitted), self._brightness = self._brightness, None
+                return ("brightness", value, submitted), None
+            wait = ready - now if wait is None else min(wait, ready - now)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    job, wait = self._take(time.perf_counter())
+                    if job or not (self._running or self._pending()):
+                        break
+                    self._cond.wait(wait)
+                if job is None:
+                    return
+                self._busy = True
+
+            device, value, submitted = job
+            try:
+                with self.timer('actuate_' + device):
+                    if device == "key":
+                        self.backend.press(value)
+                    else:
+                        self.backend.set_brightness(value)
+                self.timer.inc('actuator_writes_total', device=device)
+            except Exception as e:
+                print(f"Actuator {device} failed: {e}")
+                self.timer.inc('actuator_errors_total', device=device)
+            done = time.perf_counter()
+            self.timer.add('dispatch_' + device, done - submitted)
+
+            with self._cond:
+                self._next_write[device] = done + self.intervals.get(device, 0.0)
+                self._busy = False
+                self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        # Block until everything submitted so far has been written
+        with self._cond:
+            return self._cond.wait_for(lambda: not (self._pending() or self._busy), timeout)
+
+    def stop(self, timeout=2.0):
+        # Flush whatever is pending (ignoring rate limits) and stop the worker
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._running = False
+            self._cond.notify_all()
+        if thread:
+            thread.join(timeout)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+from collections import deque
+import Timing
+
+# WebSocket fan-out for gesture events. broadcast() never awaits a socket:
+# each event is serialized once and appended to every client's bounded queue,
+# and a writer task per client drains its queue. A slow client only falls
+# behind on its own (oldest messages are dropped when its queue is full),
+# and clients whose sends keep failing or hang past send_timeout are evicted.
+# Metrics are named after the broadcaster (ws_clients, ws_messages_sent_total,
+# ...), so several channels can report through one timer.
+
+
+class Client:
+    def __init__(self, websocket, queue_size):
+        self.websocket = websocket
+        self.queue = deque(maxlen=queue_size)
+        self.ready = asyncio.Event()
+        self.failures = 0  # consecutive failed sends
+        self.sent = 0
+        self.dropped = 0
+        self.task = None
+
+
+class Broadcaster:
+    def __init__(self, queue_size=32, send_timeout=2.0, max_failures=3, timer=Timing.NULL_TIMER,
+                 name="ws"):
+        self.name = name
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.max_failures = max_failures
+        self.timer = timer
+        self.clients = {}  # websocket -> Client
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        client = Client(websocket, self.queue_size)
+        client.task = asyncio.create_task(self._writer(client))
+        self.clients[websocket] = client
+        self.timer.set(f"{self.name}_clients", len(self.clients))
+        return client
+
+    def disconnect(self, websocket):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return  # already evicted
+        if client.task is not asyncio.current_task():
+            client.task.cancel()
+        self.timer.set(f"{self.name}_clients", len(self.clients))
+
+    def broadcast(self, message):
+        # Serialize once; every queue shares the same string
+        return self.broadcast_raw(json.dumps(message))
+
+    def broadcast_raw(self, payload):
+        # Already-encoded str (sent as text) or bytes (sent as binary)
+        for client in self.clients.values():
+            if len(client.queue) == client.queue.maxlen:
+                client.dropped += 1  # deque(maxlen) drops the oldest on append
+                self.timer.inc(f"{self.name}_messages_dropped_total")
+            client.queue.append(payload)
+            client.ready.set()
+        return payload
+
+    async def _writer(self, client):
+        websocket = client.websocket
+        while True:
+            if not client.queue:
+                client.ready.clear()
+                await client.ready.wait()
+                continue
+            payload = client.queue.popleft()
+            send = websocket.send_bytes if isinstance(payload, bytes) else websocket.send_text
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(send(payload), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.timer.inc(f"{self.name}_send_failures_total", reason="timeout")
+                await self._evict(client, "timeout")
+                return
+            except Exception as e:
+                client.failures += 1
+                self.timer.inc(f"{self.name}_send_failures_total", reason="error")
+                if client.failures >= self.max_failures:
+                    print(f"Evicting websocket client after {client.failures} failed sends: {e}")
+                    await self._evict(client, "errors")
+                    return
+                continue
+            client.failures = 0
+            client.sent += 1
+            self.timer.inc(f"{self.name}_messages_sent_total")
+            self.timer.add(f"{self.name}_send", time.perf_counter() - start)
+
+    async def _evict(self, client, reason):
+        self.timer.inc(f"{self.name}_evictions_total", reason=reason)
+        self.disconnect(client.websocket)
+        try:
+            await asyncio.wait_for(client.websocket.close(code=1011), 1.0)
+        except Exception:
+            pass  # Half-open or already closed
+
+    async def close(self):
+        tasks = [client.task for client in self.clients.values()]
+        for websocket in list(self.clients):
+            self.disconnect(websocket)
+        await asyncio.gather(*tasks, return_exceptions=True)
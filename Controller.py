@@ -1,34 +1,121 @@
+import argparse
+import queue
+import threading
 import cv2
 import time
 import HandTrackingModule as htm
-from ctypes import cast, POINTER
-from comtypes import CLSCTX_ALL
-from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
-from ffpyplayer.player import MediaPlayer
+import GestureRules
+import FrameSource
+import Timing
+import VideoIndex
+from Pipeline import LatestValue
+
+# ffpyplayer (audio + master clock) and pycaw (Windows volume) are optional
+# so the player can also run headless, e.g. in CI or on Linux
+try:
+    from ffpyplayer.player import MediaPlayer
+except ImportError:
+    MediaPlayer = None
+
+# Playback runs as three stages connected by bounded queues:
+#
+#   decode thread     video file -> (generation, pts, frame)  [frames queue]
+#   inference thread  webcam -> hands + gestures -> PiP image [latest value]
+#                                                  + gestures [gesture queue]
+#   render (main)     presents each frame when the clock reaches its pts
+#
+# The clock is ffpyplayer's audio clock (get_pts), or a wall clock when there
+# is no audio. Frames that are already late are dropped instead of slowing
+# playback, so video stays locked to audio however slow inference gets.
+
+FRAME_QUEUE = 8
+GESTURE_QUEUE = 8
+EOF_MARKER = None
+
+
+class WallClock:
+    # Presentation clock without audio: seconds of media time since start
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._origin = time.monotonic()  # monotonic time at pts 0
+        self._paused_at = None
+
+    def time(self):
+        with self._lock:
+            if self._paused_at is not None:
+                return self._paused_at
+            return time.monotonic() - self._origin
+
+    def set_pause(self, paused):
+        with self._lock:
+            if paused and self._paused_at is None:
+                self._paused_at = time.monotonic() - self._origin
+            elif not paused and self._paused_at is not None:
+                self._origin = time.monotonic() - self._paused_at
+                self._paused_at = None
+
+    def seek(self, pts):
+        with self._lock:
+            if self._paused_at is not None:
+                self._paused_at = pts
+            else:
+                self._origin = time.monotonic() - pts
+
+
+class PlayerClock:
+    # ffpyplayer's master (audio) clock. get_pts stays at 0 until audio
+    # starts, so video waits for the sound instead of running ahead.
+    def __init__(self, player):
+        self.player = player
+
+    def time(self):
+        return self.player.get_pts() or 0.0
+
+    def set_pause(self, paused):
+        self.player.set_pause(paused)
+
+    def seek(self, pts):
+        self.player.seek(pts, relative=False)
+
 
 class GestureVideoController:
-    def __init__(self, video_path='Video.mp4'):
+    def __init__(self, video_path='Video.mp4', webcam_source=0, headless=False, loop=True,
+                 audio=True, timer=Timing.NULL_TIMER):
         self.video_path = video_path
+        self.headless = headless  # no window; frames go to self.show (a no-op by default)
+        self.loop = loop
+        self.timer = timer
         
-        # Video Capture (OpenCV)
-        self.cap_video = cv2.VideoCapture(video_path)
+        # Video Capture (OpenCV), with a keyframe index (built in the
+        # background, cached next to uploads) and a seek cache
+        self.video = VideoIndex.SeekableVideo(video_path)
+        self.cap_video = self.video.cap
         
-        # Audio Player (ffpyplayer)
-        # ff_opts={'paused':True} to start paused if needed, but we start playing
-        self.player = MediaPlayer(video_path)
+        # Audio Player (ffpyplayer). Video decoding is disabled ('vn') since
+        # OpenCV decodes the picture; the player only plays sound and keeps
+        # the clock that video frames are scheduled against.
+        self.player = None
+        if audio and MediaPlayer is not None:
+            self.player = MediaPlayer(video_path, ff_opts={'vn': True})
+            self.clock = PlayerClock(self.player)
+        else:
+            if audio:
+                print("ffpyplayer not available, playing without audio")
+            self.clock = WallClock()
         
         # Video Properties
         self.fps = self.cap_video.get(cv2.CAP_PROP_FPS)
         if self.fps == 0: self.fps = 30
         self.total_frames = int(self.cap_video.get(cv2.CAP_PROP_FRAME_COUNT))
         self.duration = self.total_frames / self.fps
+        # A frame more than one frame interval behind the clock is dropped
+        self.late_tolerance = 1.0 / self.fps
+
+        # Webcam Capture, on its own thread with the newest frame winning. A
+        # video file, image directory or "synthetic" stands in for the webcam
+        # when testing; it is paced to its own fps and loops.
+        self.cap_webcam = FrameSource.open_source(webcam_source, realtime=True, loop=True)
 
-        # Webcam Capture
-        self.cap_webcam = cv2.VideoCapture(0)
-        if not self.cap_webcam.isOpened():
-             # Fallback
-             self.cap_webcam = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-             
         if not self.cap_webcam.isOpened():
             print("CRITICAL: Webcam could not be opened.")
         
@@ -38,17 +125,32 @@ class GestureVideoController:
         # Volume Control Setup
         self.setup_volume_control()
         
+        # Gesture rules ("player" profile of gestures.json, shared engine)
+        self.rules = GestureRules.GestureRules("player")
+
+        # Stage plumbing
+        self.frames = queue.Queue(maxsize=FRAME_QUEUE)      # decoded video frames
+        self.gestures = queue.Queue(maxsize=GESTURE_QUEUE)  # handled on the main thread
+        self.cam = LatestValue()                            # annotated webcam image
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped on every seek; older frames are stale
+        self._seek_to = None  # frame number for the decode thread
+        self._rewind = threading.Event()  # decode thread hit EOF; the main thread loops
+        self._stop = threading.Event()
+        self._threads = []
+        self.show = self._imshow if not headless else (lambda img: None)
+
         # State Variables
         self.is_paused = False
-        self.gesture_cooldown = 0
-        self.prev_x = 0
-        self.swipe_threshold = 20
-        self.history_x = []
+        self.stats = {"shown": 0, "dropped_late": 0, "dropped_seek": 0,
+                      "drift_sum": 0.0, "drift_max": 0.0, "last_pts": 0.0}
         
-        print("Gesture Video Controller Started with Audio")
+        print("Gesture Video Controller Started" + (" with Audio" if self.player else ""))
 
     def setup_volume_control(self):
         try:
+            from ctypes import cast, POINTER
+            from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
             devices = AudioUtilities.GetSpeakers()
             interface = devices.EndpointVolume
             self.volume = cast(interface, POINTER(IAudioEndpointVolume))
@@ -70,142 +172,241 @@ class GestureVideoController:
         self.volume.SetMasterVolumeLevel(new_vol, None)
 
     def seek_video(self, forward=True):
-        # Current Method: using timestamp for syncing
-        current_pts = self.player.get_pts()
-        if current_pts is None: current_pts = 0
+        # Seek relative to what is being heard, not what was last decoded
+        current_pts = self.clock.time()
         
         skip = 10.0 # seconds
         if forward:
-            target = current_pts + skip
+            target = min(current_pts + skip, self.duration)
         else:
             target = max(0, current_pts - skip)
-            
-        # Seek Audio Player
-        self.player.seek(target, relative=False)
-        # Seek OpenCV Video
-        # We might not need accurate seek here if we sync frames to audio, 
-        # but let's do it to be safe
-        self.cap_video.set(cv2.CAP_PROP_POS_FRAMES, int(target * self.fps))
+        self.seek(target, current_pts)
+
+    def seek(self, target, current=None, rewind=False):
+        # Land just after the nearest keyframe (cheap to decode) on the same
+        # side of `current` as the target, and move the clock there too. The
+        # decode thread repositions OpenCV; frames already queued from the
+        # old position are recognised by their generation and dropped.
+        # rewind=True answers the decode thread's loop request: the request
+        # is taken and the seek queued together, so EOF can't ask twice.
+        frame, landed = self.video.landing(target, current)
+        with self._lock:
+            if rewind:
+                if not self._rewind.is_set():
+                    return
+                self._rewind.clear()
+            self._seek_to = frame
+            self._generation += 1
+        self.clock.seek(landed)
+
+    def set_pause(self, paused):
+        self.is_paused = paused
+        self.clock.set_pause(paused)
 
     def detect_gesture(self, img, lmList):
-        # Fingers Up Logic
-        fingers = self.detector.fingersUp() # [Thumb, Index, Middle, Ring, Pinky]
-        total_fingers = fingers.count(1)
-        
-        # 1. Fist Open (Play) - All fingers up
-        if total_fingers == 5:
-            return "Play", (0, 255, 0)
-            
-        # 2. Fist Closed (Pause)
-        if fingers[1:] == [0, 0, 0, 0]:
-             if fingers[0] == 0:
-                 return "Pause", (0, 0, 255)
-        
-        # 3. Thumbs Up/Down (Volume)
-        if fingers[1:] == [0, 0, 0, 0]:
-            thumb_tip_y = lmList[4][2]
-            wrist_y = lmList[0][2]
-            # Simple heuristic: Tip above wrist = Up (y is inverted)
-            if thumb_tip_y < wrist_y:
-                 return "VolUp", (255, 255, 0)
-            elif thumb_tip_y > wrist_y:
-                 return "VolDown", (255, 0, 255)
-
-        # 4. Swipes (Rewind/Forward) using Index Finger x-movement
-        curr_x = lmList[8][1] # Index tip
-        
-        self.history_x.append(curr_x)
-        if len(self.history_x) > 5: self.history_x.pop(0)
-        
-        if len(self.history_x) >= 2:
-            dx = curr_x - self.prev_x
-            self.prev_x = curr_x
-            
-            if abs(dx) > self.swipe_threshold:
-                if dx > 0: # Right
-                    return "Forward", (0, 255, 255)
-                else: # Left
-                    return "Rewind", (255, 100, 100)
-                    
-        self.prev_x = curr_x
-        return None, (0,0,0)
-
-    def run(self):
-        cv2.namedWindow("Smart Gesture Player", cv2.WINDOW_NORMAL)
-        
-        while True:
-            # Sync Logic
-            # Read frame from OpenCV
-            # Read audio frame from ffpyplayer to keep sync
-            
-            audio_frame, val = self.player.get_frame()
-            
-            if self.is_paused:
-                 # Pause logic: we just don't advance
-                 # ffpyplayer handles pause via set_pause
-                 # But we need to make sure we don't block
-                 pass
-            else:
-                # If val == 'eof': break
-                success_vid, img_video = self.cap_video.read()
-                if not success_vid:
-                    # Loop
-                    self.cap_video.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    self.player.seek(0, relative=False)
-                    success_vid, img_video = self.cap_video.read()
-
-            # Webcam
-            success_cam, img_cam = self.cap_webcam.read()
-            if success_cam:
-                img_cam = cv2.flip(img_cam, 1)
-                img_cam = self.detector.findHands(img_cam)
-                lmList, bbox = self.detector.findPosition(img_cam, draw=True)
-                
-                if len(lmList) != 0:
-                     if time.time() - self.gesture_cooldown > 0.5:
-                        gesture, color = self.detect_gesture(img_cam, lmList)
-                        if gesture:
-                            self.gesture_cooldown = time.time()
-                            if gesture == "Play":
-                                self.is_paused = False
-                                self.player.set_pause(False)
-                            elif gesture == "Pause":
-                                self.is_paused = True
-                                self.player.set_pause(True)
-                            elif gesture == "VolUp":
-                                self.change_volume(True)
-                            elif gesture == "VolDown":
-                                self.change_volume(False)
-                            elif gesture == "Forward":
-                                self.seek_video(True)
-                            elif gesture == "Rewind":
-                                self.seek_video(False)
-
-                # PIP
-                if success_vid:
-                    h_vid, w_vid = img_video.shape[:2]
-                    h_small, w_small = int(h_vid * 0.25), int(w_vid * 0.25)
-                    img_cam_small = cv2.resize(img_cam, (w_small, h_small))
-                    img_video[0:h_small, w_vid-w_small:w_vid] = img_cam_small
-                    cv2.imshow("Smart Gesture Player", img_video)
-            
-            # Use 'val' from audio for sync wait
-            if val != 'eof' and audio_frame is not None:
-                # Audio frame available
-                img, t = audio_frame
-                # We could display 'img' if it were a video player only driven by ffpyplayer
-                # But we use OpenCV for 'img_video'.
+        # Finger patterns, thumb direction, index-tip swipes and the shared
+        # 0.5 s cooldown all come from the rule engine
+        match = self.rules.evaluate(self.detector.findLandmarks())
+        if match is None:
+            return None, (0, 0, 0)
+        return match.name, match.color
+
+    def handle_gesture(self, gesture):
+        if gesture == "Play":
+            self.set_pause(False)
+        elif gesture == "Pause":
+            self.set_pause(True)
+        elif gesture == "VolUp":
+            self.change_volume(True)
+        elif gesture == "VolDown":
+            self.change_volume(False)
+        elif gesture == "Forward":
+            self.seek_video(True)
+        elif gesture == "Rewind":
+            self.seek_video(False)
+
+    def _put(self, q, item):
+        # Blocking put that still notices stop()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
                 pass
-            
-            # WaitKey: use a small delay. Real sync is harder but 30ms is approx 30fps
-            if cv2.waitKey(30) & 0xFF == ord('q'):
+        return False
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                seek_to, self._seek_to = self._seek_to, None
+                generation = self._generation
+            if seek_to is not None:
+                with self.timer('video_seek'):
+                    self.video.seek_frame(seek_to)
+
+            with self.timer('video_decode'):
+                success, index, img = self.video.read()
+            if not success:
+                if self.loop:
+                    # Loop (audio too). The main thread does the seek so
+                    # player calls stay on one thread; unless a seek is
+                    # already on its way, ask for one and wait for it.
+                    with self._lock:
+                        if (self._seek_to is None and self._generation == generation
+                                and not self._rewind.is_set()):
+                            self._rewind.set()
+                    self._stop.wait(0.01)
+                    continue
+                self._put(self.frames, EOF_MARKER)
+                return
+            pts = index / self.fps
+            self._put(self.frames, (generation, pts, img))
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            success_cam, img_cam = self.cap_webcam.read()
+            if not success_cam:
+                time.sleep(0.01)
+                continue
+
+            img_cam = cv2.flip(img_cam, 1)
+            img_cam = self.detector.findHands(img_cam)
+            lmList, bbox = self.detector.findPosition(img_cam, draw=True)
+            if len(lmList) != 0:
+                gesture, color = self.detect_gesture(img_cam, lmList)
+                if gesture:
+                    try:
+                        self.gestures.put_nowait(gesture)
+                    except queue.Full:
+                        self.timer.inc('gestures_dropped_total')
+            self.cam.publish(img_cam)
+
+    def _imshow(self, img):
+        cv2.imshow("Smart Gesture Player", img)
+
+    def _wait(self, seconds):
+        # Sleep until the next frame is due; False when the user quit
+        if self.headless:
+            time.sleep(seconds)
+            return True
+        return cv2.waitKey(max(1, int(seconds * 1000))) & 0xFF != ord('q')
+
+    def present(self, img_video, pts, now):
+        # PIP: newest webcam image in the top-right corner
+        seq, img_cam = self.cam.latest()
+        if img_cam is not None:
+            h_vid, w_vid = img_video.shape[:2]
+            h_small, w_small = int(h_vid * 0.25), int(w_vid * 0.25)
+            img_cam_small = cv2.resize(img_cam, (w_small, h_small))
+            img_video[0:h_small, w_vid-w_small:w_vid] = img_cam_small
+        with self.timer('render'):
+            self.show(img_video)
+
+        drift = now - pts  # > 0: shown after its time
+        stats = self.stats
+        stats["shown"] += 1
+        stats["drift_sum"] += abs(drift)
+        stats["drift_max"] = max(stats["drift_max"], abs(drift))
+        stats["last_pts"] = pts
+        self.timer.add('drift', abs(drift))
+        self.timer.inc('video_frames_shown_total')
+
+    def drop(self, reason):
+        self.stats["dropped_" + reason] += 1
+        self.timer.inc('video_frames_dropped_total', reason=reason)
+
+    def report(self):
+        stats = self.stats
+        shown = stats["shown"]
+        return {
+            "shown": shown,
+            "dropped_late": stats["dropped_late"],
+            "dropped_seek": stats["dropped_seek"],
+            "mean_drift_ms": round(stats["drift_sum"] / shown * 1000, 2) if shown else 0.0,
+            "max_drift_ms": round(stats["drift_max"] * 1000, 2),
+            "position_s": round(stats["last_pts"], 3),
+            "clock_s": round(self.clock.time(), 3),
+        }
+
+    def run(self, seconds=0):
+        if not self.headless:
+            cv2.namedWindow("Smart Gesture Player", cv2.WINDOW_NORMAL)
+        self._threads = [threading.Thread(target=self._decode_loop, name="video-decode", daemon=True),
+                         threading.Thread(target=self._inference_loop, name="webcam-inference", daemon=True)]
+        for t in self._threads:
+            t.start()
+        if not self.player:
+            self.clock.seek(0.0)  # Wall clock starts with the first frame
+
+        started = time.monotonic()
+        frame = None  # next frame, held until the clock reaches its pts
+        while not self._stop.is_set():
+            if seconds and time.monotonic() - started >= seconds:
+                break
+            # Gestures and loop seeks run here so player and volume calls
+            # stay on one thread
+            while not self.gestures.empty():
+                self.handle_gesture(self.gestures.get_nowait())
+            if self._rewind.is_set():
+                self.seek(0.0, rewind=True)
+
+            if frame is None:
+                try:
+                    frame = self.frames.get(timeout=0.05)
+                except queue.Empty:
+                    if not self._wait(0.001):
+                        break
+                    continue
+                if frame is EOF_MARKER:
+                    break
+            generation, pts, img_video = frame
+            if generation != self._generation:
+                self.drop("seek")
+                frame = None
+                continue
+
+            now = self.clock.time()
+            if pts < now - self.late_tolerance:
+                self.drop("late")  # Catch up instead of slowing down
+                frame = None
+                continue
+            if pts > now:
+                # Early (or paused): wait in short slices so gestures and
+                # the quit key stay responsive
+                if not self._wait(min(pts - now, 0.05)):
+                    break
+                continue
+
+            self.present(img_video, pts, now)
+            frame = None
+            if not self.headless and not self._wait(0.001):
                 break
-                
-        self.cap_video.release()
+
+        self.stop()
+        report = self.report()
+        print("Playback: " + ", ".join(f"{k}={v}" for k, v in report.items()))
+        return report
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(2.0)
+        self.video.release()
         self.cap_webcam.release()
         self.player = None # Close player
-        cv2.destroyAllWindows()
+        if not self.headless:
+            cv2.destroyAllWindows()
+
 
 if __name__ == '__main__':
-    app = GestureVideoController()
-    app.run()
+    parser = argparse.ArgumentParser(description="Gesture-controlled video player")
+    parser.add_argument("--video", default="Video.mp4")
+    parser.add_argument("--webcam", default="0",
+                        help="camera index, or a video file, image directory or 'synthetic' standing in for it")
+    parser.add_argument("--headless", action="store_true", help="no window; report drift and drops")
+    parser.add_argument("--seconds", type=float, default=0, help="stop after N seconds (0 = until 'q')")
+    parser.add_argument("--no-audio", action="store_true")
+    args = parser.parse_args()
+    app = GestureVideoController(args.video, webcam_source=args.webcam, headless=args.headless,
+                                 loop=not args.headless, audio=not args.no_audio)
+    app.run(seconds=args.seconds)
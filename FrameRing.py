@@ -0,0 +1,121 @@
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+
+# Fixed ring of preallocated frame slots in shared memory. Capture decodes
+# straight into a free slot and flips it in place; inference (in this
+# process or an InferencePool worker) and the JPEG encoders read the same
+# pixels through views, so a frame is never copied between stages.
+#
+# The owning process hands slots out and counts references to them; a slot
+# goes back into rotation once every stage holding it has released it. Each
+# fill bumps the slot's sequence number, which lives in shared memory next to
+# the pixels, so a reader in another process can tell whether the slot still
+# holds the frame it was given.
+
+HEADER = 64  # bytes per slot ahead of the pixels: int64 sequence number, rest padding
+
+
+class Slot:
+    __slots__ = ('index', 'seq', 'array')
+
+    def __init__(self, index, seq, array):
+        self.index = index
+        self.seq = seq
+        self.array = array
+
+    def ref(self):
+        # Picklable reference for other processes: FrameRing.view(*ref)
+        return self.index, self.seq
+
+
+class FrameRing:
+    def __init__(self, slots, shape, dtype=np.uint8, name=None):
+        # name=None creates the ring; a name attaches to an existing one
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.stride = HEADER + self.frame_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * self.stride)
+        else:
+            # Only the owner unlinks. Readers spawned by the owner share its
+            # resource tracker, so registering again there is harmless.
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+            except TypeError:
+                self.shm = shared_memory.SharedMemory(name=name)
+        buf = self.shm.buf
+        self._seqs = [np.ndarray((1,), dtype=np.int64, buffer=buf, offset=i * self.stride)
+                      for i in range(slots)]
+        self._arrays = [np.ndarray(self.shape, dtype=self.dtype, buffer=buf,
+                                   offset=i * self.stride + HEADER)
+                        for i in range(slots)]
+        if self.owner:
+            for seq in self._seqs:
+                seq[0] = 0
+
+        # Ownership, in the owning process only
+        self._refs = [0] * slots
+        self._free = list(range(slots))
+        self._next_seq = 0
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.exhausted = 0  # acquire() calls that found every slot in use
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        # Everything another process needs to attach: FrameRing(**spec)
+        return {"slots": self.slots, "shape": self.shape, "dtype": self.dtype.str, "name": self.name}
+
+    def acquire(self):
+        # A free slot with one reference and a new sequence number, or None
+        with self._lock:
+            if not self._free:
+                self.exhausted += 1
+                return None
+            index = self._free.pop()
+            self._refs[index] = 1
+            self._next_seq += 1
+            seq = self._next_seq
+            self._seqs[index][0] = seq
+            self.acquired += 1
+        return Slot(index, seq, self._arrays[index])
+
+    def retain(self, slot):
+        with self._lock:
+            self._refs[slot.index] += 1
+
+    def release(self, slot):
+        with self._lock:
+            self._refs[slot.index] -= 1
+            if not self._refs[slot.index]:
+                self._free.append(slot.index)
+
+    @property
+    def in_use(self):
+        return self.slots - len(self._free)
+
+    def view(self, index, seq):
+        # Reader side: the slot's pixels, or None if it has been refilled since
+        if self._seqs[index][0] != seq:
+            return None
+        return self._arrays[index]
+
+    def valid(self, index, seq):
+        return self._seqs[index][0] == seq
+
+    def close(self):
+        # The name goes away now; the mapping once no view of it is left
+        if self.owner:
+            self.shm.unlink()
+        self._seqs = self._arrays = []
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a view is still alive; unmapped with the process
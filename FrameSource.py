@@ -0,0 +1,404 @@
+import os
+import re
+import threading
+import time
+import cv2
+import numpy as np
+import Timing
+
+# Frame sources shared by GestureEngine, Controller and camera_test. Every
+# source reads like a cv2.VideoCapture (read(image), get, set, isOpened,
+# release) and also records, for the frame it last returned:
+#
+#   frame_time  wall-clock time the frame was captured (seconds)
+#   position    its position in the media in seconds (None for live sources)
+#   latency     seconds from capture until read() handed it over (also
+#               recorded as the capture_latency stage on `timer`)
+#
+# open_source picks a backend from a spec:
+#
+#   0, "0"                  camera index           CaptureSource, threaded
+#   "rtsp://host/feed"      stream URL             CaptureSource, threaded
+#   "clip.mp4"              video file             CaptureSource
+#   "frames/"               directory of images    ImageDirSource
+#   "synthetic:640x480@30"  moving test pattern    SyntheticSource
+#
+# Live sources run on a capture thread (ThreadedSource) that keeps only the
+# newest frame: a consumer that falls behind gets the latest picture instead
+# of the stale ones queued in the driver, and every skipped frame is counted.
+# Files, image directories and the test pattern deliver every frame as fast
+# as they are read, unless realtime=True paces them to their fps like a
+# camera; with a buffer_size too, frames older than that many intervals are
+# dropped, as a camera driver's queue would.
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+SYNTHETIC_PATTERN = re.compile(r"^synthetic(?::(\d+)x(\d+))?(?:@(\d+(?:\.\d+)?))?$")
+
+
+class FrameSource:
+    live = False
+
+    def __init__(self, fps=30.0, realtime=False, loop=False, buffer_size=None):
+        self.fps = fps or 30.0
+        self.realtime = realtime
+        self.loop = loop
+        self.buffer_size = buffer_size
+        self.frame_time = None
+        self.position = None
+        self.latency = 0.0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.timer = Timing.NULL_TIMER
+        self._start = None
+        self._tick = 0  # frames scheduled since the first read (realtime pacing)
+
+    def read(self, image=None):
+        # (success, image); decodes into `image` when it has the right shape
+        due = self._pace() if self.realtime else None
+        success, img = self._read(image)
+        if not success and self.loop and self._rewind():
+            success, img = self._read(image)
+        if not success:
+            return False, None
+        now = time.time()
+        self.frame_time = now if due is None else due
+        self.latency = now - self.frame_time
+        self.frames_read += 1
+        self.timer.add('capture_latency', self.latency)
+        return True, img
+
+    def _pace(self):
+        # Waits until the next frame is due and returns that time. A consumer
+        # more than buffer_size frames behind loses the oldest ones.
+        now = time.time()
+        if self._start is None:
+            self._start = now
+        due = self._start + self._tick / self.fps
+        if due > now:
+            time.sleep(due - now)
+        elif self.buffer_size:
+            skip = int((now - self._start) * self.fps) - self._tick - self.buffer_size + 1
+            if skip > 0:
+                for _ in range(skip):
+                    self._skip()
+                self._tick += skip
+                self.frames_dropped += skip
+                self.timer.inc('frames_dropped_total', skip, reason='stale')
+                due = self._start + self._tick / self.fps
+        self._tick += 1
+        return due
+
+    # Backends implement these
+    def _read(self, image):
+        raise NotImplementedError
+
+    def _skip(self):
+        return self._read(None)[0]
+
+    def _rewind(self):
+        return self.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def get(self, prop):
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+class CaptureSource(FrameSource):
+    # cv2.VideoCapture: camera index, stream URL or video file
+    def __init__(self, source, width=None, height=None, fps=None, buffer_size=None,
+                 realtime=False, loop=False):
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened() and isinstance(source, int):
+            self.cap = cv2.VideoCapture(source, cv2.CAP_DSHOW)  # Windows fallback
+        self.live = isinstance(source, int) or "://" in str(source)
+        self.size = None  # (width, height) files are resized to
+        if self.live:
+            # Requested from the driver; it may pick the nearest it supports
+            for prop, value in ((cv2.CAP_PROP_FRAME_WIDTH, width), (cv2.CAP_PROP_FRAME_HEIGHT, height),
+                                (cv2.CAP_PROP_FPS, fps), (cv2.CAP_PROP_BUFFERSIZE, buffer_size)):
+                if value:
+                    self.cap.set(prop, value)
+            super().__init__(self.cap.get(cv2.CAP_PROP_FPS))
+        else:
+            super().__init__(fps or self.cap.get(cv2.CAP_PROP_FPS), realtime, loop, buffer_size)
+            if width and height:
+                self.size = (width, height)
+
+    def _read(self, image):
+        if self.size is None:
+            success, img = self.cap.read(image)
+        else:
+            success, img = self.cap.read()
+            if success and img.shape[1::-1] != self.size:
+                fits = image is not None and image.shape[1::-1] == self.size
+                img = cv2.resize(img, self.size, dst=image if fits else None)
+        if success and not self.live:
+            self.position = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        return success, img
+
+    def _skip(self):
+        return self.cap.grab()
+
+    def get(self, prop):
+        if self.size and prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            return float(self.size[prop == cv2.CAP_PROP_FRAME_HEIGHT])
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class _IndexedSource(FrameSource):
+    # Shared frame counter and VideoCapture-style properties
+    def __init__(self, width, height, count, fps, realtime, loop, buffer_size):
+        super().__init__(fps, realtime, loop, buffer_size)
+        self.width = width
+        self.height = height
+        self.count = count  # 0 = endless
+        self.index = 0
+
+    def get(self, prop):
+        values = {cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+                  cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_COUNT: self.count,
+                  cv2.CAP_PROP_POS_FRAMES: self.index, cv2.CAP_PROP_POS_MSEC: self.index * 1000 / self.fps}
+        return float(values.get(prop, 0.0))
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self.index = int(value)
+        return True
+
+    def _skip(self):
+        if self.count and self.index >= self.count:
+            return False
+        self.index += 1
+        return True
+
+    def _output(self, image):
+        # `image` if it fits, else a new frame
+        shape = (self.height, self.width, 3)
+        if image is not None and image.shape == shape and image.dtype == np.uint8:
+            return image
+        return np.empty(shape, dtype=np.uint8)
+
+
+class ImageDirSource(_IndexedSource):
+    # Still images in name order, played as a video at `fps`
+    def __init__(self, path, width=None, height=None, fps=None, buffer_size=None,
+                 realtime=False, loop=False):
+        self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        first = cv2.imread(self.files[0]) if self.files else None
+        if not (width and height):
+            height, width = first.shape[:2] if first is not None else (0, 0)
+        super().__init__(width, height, len(self.files), fps or 30.0, realtime, loop, buffer_size)
+
+    def _read(self, image):
+        if self.index >= self.count:
+            return False, None
+        img = cv2.imread(self.files[self.index])
+        if img is None:
+            return False, None
+        if img.shape[1::-1] != (self.width, self.height):
+            img = cv2.resize(img, (self.width, self.height))
+        out = self._output(image)
+        if out is not img:
+            np.copyto(out, img)
+        self.position = self.index / self.fps
+        self.index += 1
+        return True, out
+
+    def isOpened(self):
+        return bool(self.count)
+
+
+class SyntheticSource(_IndexedSource):
+    # Gradient with a moving disc and the frame number, drawn in place; no
+    # camera or files needed (benchmarks, CI)
+    def __init__(self, width=None, height=None, fps=None, buffer_size=None,
+                 realtime=False, loop=False, frames=0):
+        super().__init__(width or 640, height or 480, frames, fps or 30.0, realtime, loop, buffer_size)
+        x = np.linspace(0, 255, self.width, dtype=np.float32)
+        y = np.linspace(0, 255, self.height, dtype=np.float32)[:, None]
+        self.background = np.stack([y + 0 * x, x + 0 * y, (x + y) / 2], axis=2).astype(np.uint8)
+
+    def _read(self, image):
+        if self.count and self.index >= self.count:
+            return False, None
+        out = self._output(image)
+        np.copyto(out, self.background)
+        phase = self.index / self.fps
+        center = (int(self.width * (0.5 + 0.35 * np.cos(phase))), int(self.height * (0.5 + 0.35 * np.sin(phase))))
+        cv2.circle(out, center, max(8, self.height // 12), (255, 255, 255), -1)
+        cv2.putText(out, str(self.index), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        self.position = phase
+        self.index += 1
+        return True, out
+
+
+class ThreadedSource:
+    # Reads `source` on its own thread and keeps only the newest frame. A
+    # failed read of a live source is retried with backoff (a camera or
+    # stream hiccup); only a non-live source ends, at EOF. With use_ring()
+    # the thread decodes straight into FrameRing slots.
+    RETRY_MIN = 0.05  # seconds before the first retry, doubled up to RETRY_MAX
+    RETRY_MAX = 2.0
+
+    def __init__(self, source):
+        self.source = source
+        self.live = source.live
+        self.frame_time = None
+        self.position = None
+        self.latency = 0.0
+        self.frames_read = 0
+        self.frames_dropped = 0  # captured but replaced before anyone read them
+        self.read_errors = 0
+        self.timer = Timing.NULL_TIMER
+        self.ring = None
+        self._latest = None  # (image, frame_time, position, ring slot or None)
+        self._done = False
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._capture, daemon=True, name="capture")
+        self._thread.start()
+
+    def use_ring(self, ring):
+        # Decode further frames into slots of `ring` (FrameRing.FrameRing)
+        self.ring = ring
+
+    def _capture(self):
+        backoff = self.RETRY_MIN
+        while not self._stop.is_set():
+            ring = self.ring
+            slot = ring.acquire() if ring is not None else None
+            if ring is not None and slot is None:
+                self.timer.inc('frame_ring_exhausted_total')
+            success, img = self.source.read(slot.array if slot is not None else None)
+            if slot is not None and (not success or img is not slot.array):
+                ring.release(slot)  # failed, or the source changed size
+                slot = None
+            if not success:
+                if not self.live:
+                    break
+                self.read_errors += 1
+                self.timer.inc('capture_errors_total')
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.RETRY_MAX)
+                continue
+            backoff = self.RETRY_MIN
+            if ring is not None and slot is None:
+                self.timer.inc('frame_allocations_total', stage='decode')
+            with self._cond:
+                if self._stop.is_set():
+                    self._drop((img, None, None, slot))
+                    break
+                if self._latest is not None:
+                    self._drop(self._latest)
+                    self.frames_dropped += 1
+                    self.timer.inc('frames_dropped_total', reason='stale')
+                self._latest = (img, self.source.frame_time, self.source.position, slot)
+                self._cond.notify_all()
+        with self._cond:
+            self._done = True
+            self._cond.notify_all()
+
+    def _drop(self, frame):
+        if frame[3] is not None:
+            self.ring.release(frame[3])
+
+    def read_slot(self):
+        # (success, image, ring slot or None): the newest frame not handed
+        # out yet, waiting for one if needed. The caller owns the slot.
+        with self._cond:
+            while self._latest is None and not self._done:
+                self._cond.wait()
+            if self._latest is None:
+                return False, None, None
+            img, self.frame_time, self.position, slot = self._latest
+            self._latest = None
+        self.latency = time.time() - self.frame_time
+        self.frames_read += 1
+        self.timer.add('capture_latency', self.latency)
+        return True, img, slot
+
+    def read(self, image=None):
+        # VideoCapture-style read; a frame in a ring slot is copied out
+        success, img, slot = self.read_slot()
+        if not success:
+            return False, None
+        fits = image is not None and image.shape == img.shape and image.dtype == img.dtype
+        if fits or slot is not None:
+            if fits:
+                np.copyto(image, img)
+            else:
+                image = img.copy()
+            self.timer.inc('frame_bytes_copied_total', img.nbytes, stage='capture')
+            if slot is not None:
+                self.ring.release(slot)
+            img = image
+        return True, img
+
+    @property
+    def fps(self):
+        return self.source.fps
+
+    def get(self, prop):
+        return self.source.get(prop)
+
+    def set(self, prop, value):
+        return False  # the capture thread owns the source
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def release(self):
+        # Stops the capture thread and wakes any read() still waiting
+        self._stop.set()
+        self._thread.join(timeout=2)
+        with self._cond:
+            self._done = True
+            if self._latest is not None:
+                self._drop(self._latest)
+                self._latest = None
+            self._cond.notify_all()
+        self.source.release()
+
+
+def open_source(spec, width=None, height=None, fps=None, buffer_size=None, realtime=False,
+                loop=False, threaded=None):
+    # A frame source for a camera index, URL, file, image directory or
+    # "synthetic[:WxH][@fps]". threaded=None runs live sources on a capture
+    # thread. An already open source is returned as is.
+    if hasattr(spec, "read"):
+        return spec
+    if isinstance(spec, str) and spec.isdigit():
+        spec = int(spec)
+    options = {"width": width, "height": height, "fps": fps, "buffer_size": buffer_size,
+               "realtime": realtime, "loop": loop}
+    match = SYNTHETIC_PATTERN.match(spec) if isinstance(spec, str) else None
+    if match:
+        w, h, rate = match.groups()
+        source = SyntheticSource(**dict(options, width=width or (w and int(w)),
+                                        height=height or (h and int(h)), fps=fps or (rate and float(rate))))
+    elif isinstance(spec, str) and os.path.isdir(spec):
+        source = ImageDirSource(spec, **options)
+    else:
+        source = CaptureSource(spec, **options)
+    if threaded is None:
+        threaded = source.live
+    return ThreadedSource(source) if threaded else source
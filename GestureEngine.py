@@ -1,170 +1,270 @@
 import cv2
+import numpy as np
 import time
-import math
 import HandTrackingModule as htm
-import screen_brightness_control as sbc
-import pyautogui
-from collections import deque
-
-# Disable pyautogui failsafe for non-mouse actions
-pyautogui.FAILSAFE = False
+import GestureRules
+import Timing
+import Actuators
+import InferencePool
+import FrameRing
+import FrameSource
 
 class GestureEngine:
-    def __init__(self):
-        # Webcam Capture
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-             self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        
-        # Support 2 hands (Left or Right interchangeably)
-        self.detector = htm.HandDetector(detectionCon=0.75, maxHands=2)
-        
-        # State
-        self.gesture_cooldown = 0
-        self.last_gesture = None
-        self.volume_last_time = 0
-        self.brightness_last_time = 0
-        
-        # Swipe Logic (Track Wrist X landmark of the leading hand)
-        self.wrist_x_history = deque(maxlen=10) 
-        self.swipe_threshold = 50 
+    def __init__(self, source=0, adaptive_inference=True, frame_budget=1 / 30, roi_inference=False,
+                 enable_actions=True, rules_path=GestureRules.DEFAULT_PATH, actuator_backend=None,
+                 inference_pool=None, pool_lanes=None, frame_ring=0, media_clock=False,
+                 capture_options=None):
+        # Frame source: camera index, video file, image directory, "synthetic"
+        # or an open FrameSource (capture_options: width, height, fps,
+        # buffer_size, realtime, ... for FrameSource.open_source). Cameras
+        # are read on a capture thread that keeps only the newest frame.
+        # source=None builds a landmark-only engine: no camera, no MediaPipe,
+        # landmarks are fed to evaluate() directly (e.g. from a recording).
+        self.cap = None
+        self.detector = None
+        if source is not None:
+            self.cap = FrameSource.open_source(source, **(capture_options or {}))
+
+            # Support 2 hands (Left or Right interchangeably)
+            # With adaptive inference MediaPipe runs every N frames (N tuned to
+            # frame_budget) and landmarks are tracked on the frames in between.
+            # ROI inference only feeds a crop around the previous hands to the model.
+            # With an InferencePool.InferencePool the model runs in worker
+            # processes instead (every frame, results `depth` frames late).
+            if inference_pool is not None:
+                self.detector = InferencePool.PooledDetector(inference_pool, lanes=pool_lanes)
+            else:
+                scheduler = htm.InferenceScheduler(frameBudget=frame_budget) if adaptive_inference else None
+                self.detector = htm.HandDetector(detectionCon=0.75, maxHands=2, scheduler=scheduler,
+                                                 roi=roi_inference)
+        self.pooled = inference_pool is not None and source is not None
+
+        # With frame_ring=N, frames are decoded straight into a shared-memory
+        # FrameRing.FrameRing (N spare slots on top of those in the pool) and
+        # flipped in place; created once the frame size is known.
+        self.ring = None
+        self.ring_slots = frame_ring + (self.detector.stream.depth if self.pooled else 0) if frame_ring else 0
+        self.frame_slot = None  # ring slot of the frame process_frame last returned
         
-        # Cooldown for discrete gestures (Play/Pause/Swipe)
-        self.discrete_cooldown = 1.0 
+        # Key presses and brightness writes go through a background dispatcher
+        # (no-op backend for benchmarks and replays unless one is passed in)
+        self.enable_actions = enable_actions
+        if actuator_backend is None:
+            actuator_backend = Actuators.NullBackend()
+            if enable_actions:
+                try:
+                    actuator_backend = Actuators.DesktopBackend()
+                except Exception as e:
+                    print(f"Desktop actions unavailable: {e}")
+        self.actuators = Actuators.ActuatorDispatcher(actuator_backend)
+
+        # Per-stage timing and counter hooks (no-op unless set_timer is called)
+        self.timer = Timing.NULL_TIMER
+        self.capture_time = None  # wall-clock time the current frame was captured
+        # media_clock: capture_time is the frame's position in the video
+        # instead, and cooldowns and swipes follow it, so a file can be
+        # processed faster than real time with the same gestures
+        self.media_clock = media_clock
+
+        # Landmarks and handedness of the frame process_frame last returned
+        self.landmarks = np.zeros((0, 21, 3), dtype=np.float32)
+        self.handedness = []
+        self.gesture_hand = None  # index of the hand that fired the last gesture
 
-        # Initial Brightness
+        # Optional LandmarkLog.LandmarkRecorder that saves every frame's landmarks
+        self.recorder = None
+
+        # Gesture rules (hot-reloaded from gestures.json, "dashboard" profile)
+        self.rules = GestureRules.GestureRules("dashboard", rules_path)
+        self.swipe_threshold = 50  # px; half of it counts as a swipe in progress
+
+        # Initial Brightness (target value; the dispatcher writes it asynchronously)
+        self.current_brightness = 50
         try:
-            self.current_brightness = sbc.get_brightness()[0]
-        except:
-            self.current_brightness = 50
+            brightness = actuator_backend.get_brightness()
+            self.current_brightness = 50 if brightness is None else brightness  # 0 is a real reading
+        except Exception:
+            pass
+
+    def set_timer(self, timer):
+        self.timer = timer
+        self.actuators.timer = timer
+        if self.cap:
+            self.cap.timer = timer
+        if self.detector:
+            self.detector.timer = timer
+
+    def warm_up(self):
+        # Loads the model with a blank frame of the source's size; blocking,
+        # so the server runs it in the background before the first frame
+        if self.detector is None:
+            return
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640
+        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480
+        self.detector.warmUp((height, width, 3))
 
     def get_frame_data(self):
-        success, img = self.cap.read()
-        if not success:
+        # One frame in, (JPEG bytes, gesture) out. The live server skips this
+        # and encodes through Pipeline.StreamEncoder only while someone watches.
+        img, current_gesture = self.process_frame()
+        if img is None:
             return None, None
-
-        img = cv2.flip(img, 1) # Mirror for natural interaction
-        img = self.detector.findHands(img, draw=True)
-        
-        current_gesture = None
-        
-        if self.detector.results.multi_hand_landmarks:
-            # 1. Update Swipe History (using the first hand detected)
-            h, w, c = img.shape
-            handLms = self.detector.results.multi_hand_landmarks[0]
-            wrist_x = int(handLms.landmark[0].x * w)
-            self.wrist_x_history.append((time.time(), wrist_x))
-
-            # Loop through all detected hands to find a gesture
-            for idx, handLms in enumerate(self.detector.results.multi_hand_landmarks):
-                # Retrieve handedness (Left/Right)
-                handedness = self.detector.results.multi_handedness[idx].classification[0].label
-                
-                # Get landmarks and bbox
-                lmList, bbox = self.detector.findPosition(img, handNo=idx, draw=False)
-                
-                if lmList:
-                    # Execute Strict Priority Hierarchy Logic
-                    res_gesture, res_color = self.detect_gesture(img, lmList, handedness)
-                    
-                    if res_gesture:
-                        current_gesture = res_gesture
-                        msg = current_gesture
-                        if "Brightness" in msg:
-                            msg = f"Brightness: {int(self.current_brightness)}%"
-                        
-                        # Draw feedback near the hand
-                        cv2.putText(img, f"{msg}", (lmList[0][1], lmList[0][2] - 50), 
-                                    cv2.FONT_HERSHEY_DUPLEX, 0.8, res_color, 2)
-                        
-                        # Stop checking other hands if a gesture is detected
-                        break
-
-        ret, buffer = cv2.imencode('.jpg', img)
-        frame_bytes = buffer.tobytes()
-        
+        with self.timer('imencode'):
+            ret, buffer = cv2.imencode('.jpg', img)
+            frame_bytes = buffer.tobytes()
+        self.timer.inc('frame_allocations_total', 2, stage='imencode')
+        self.timer.inc('frame_bytes_copied_total', len(frame_bytes), stage='imencode')
         return frame_bytes, current_gesture
 
-    def detect_gesture(self, img, lmList, handedness):
-        now = time.time()
-        
-        # Map finger states (1=extended, 0=curled)
-        # Custom logic for thumb handedness
-        fingers = []
-        # Thumb
-        if handedness == "Right":
-            fingers.append(1 if lmList[4][1] > lmList[3][1] else 0)
-        else: # Left Hand
-            fingers.append(1 if lmList[4][1] < lmList[3][1] else 0)
-        # 4 Fingers
-        for id in [8, 12, 16, 20]:
-            fingers.append(1 if lmList[id][2] < lmList[id-2][2] else 0)
-
-        # --- 1. DYNAMIC SWIPES (Highest Priority) ---
-        if len(self.wrist_x_history) >= 5:
-            start_time, start_x = self.wrist_x_history[0]
-            end_time, end_x = self.wrist_x_history[-1]
-            if (now - start_time) < 0.4:
-                displacement = end_x - start_x
-                if abs(displacement) > self.swipe_threshold:
-                    if now - self.gesture_cooldown > self.discrete_cooldown:
-                        self.gesture_cooldown = now
-                        if displacement > 0:
-                            pyautogui.press('right')
-                            return "Forward", (0, 255, 255)
-                        else:
-                            pyautogui.press('left')
-                            return "Rewind", (255, 100, 100)
-                    else:
-                        return None, (0,0,0) # Locked in cooldown
-
-        # --- 2. BRIGHTNESS CONTROL (Pinch) ---
-        # Middle, Ring, Pinky must be closed
-        if fingers[2] == 0 and fingers[3] == 0 and fingers[4] == 0:
-            x1, y1 = lmList[4][1], lmList[4][2] # Thumb Tip
-            x2, y2 = lmList[8][1], lmList[8][2] # Index Tip
-            dist = math.hypot(x2 - x1, y2 - y1)
-            
-            if now - self.brightness_last_time > 0.15:
-                self.brightness_last_time = now
-                if dist < 40: # User said 30, 40 is more stable
-                    self.current_brightness = max(0, self.current_brightness - 5)
-                    sbc.set_brightness(int(self.current_brightness))
-                    return "Brightness Down", (0, 165, 255)
-                elif dist > 110: # User said 100, 110 is safer
-                    self.current_brightness = min(100, self.current_brightness + 5)
-                    sbc.set_brightness(int(self.current_brightness))
-                    return "Brightness Up", (0, 255, 255)
-            # Register generic brightness mode if fingers held this way
-            return "Brightness", (255, 215, 0)
-
-        # --- 3. VOLUME CONTROL (Thumb Direction) ---
-        # Index, Middle, Ring, Pinky must be closed (Fist with thumb out)
-        if fingers[1:] == [0, 0, 0, 0]:
-            thumb_tip_y = lmList[4][2]
-            thumb_mcp_y = lmList[2][2]
-            
-            if now - self.volume_last_time > 0.2:
-                self.volume_last_time = now
-                if thumb_tip_y < thumb_mcp_y - 25: # Smaller Y = Higher on screen
-                    pyautogui.press('volumeup')
-                    return "VolUp", (0, 255, 0)
-                elif thumb_tip_y > thumb_mcp_y + 25: # Larger Y = Lower on screen
-                    pyautogui.press('volumedown')
-                    return "VolDown", (255, 0, 0)
-
-        # --- 4. PLAY/PAUSE (Fallback) ---
-        if now - self.gesture_cooldown > self.discrete_cooldown:
-            # Play: All 5 fingers extended
-            if fingers == [1, 1, 1, 1, 1]:
-                self.gesture_cooldown = now
-                return "Play", (0, 255, 0)
-            # Pause: All 5 fingers folded
-            if fingers == [0, 0, 0, 0, 0]:
-                self.gesture_cooldown = now
-                return "Pause", (0, 0, 255)
-
-        return None, (0,0,0)
+    def process_frame(self, draw=True):
+        # Capture, inference and gestures for one frame. Returns the (annotated
+        # when draw=True) BGR image and the gesture, or (None, None) at EOF.
+        img = None
+        while img is None:
+            with self.timer('decode'):
+                success, img, slot = self._read()
+            if not success:
+                # Frames still in the inference pool come out after EOF
+                img = self.detector.drain() if self.pooled else None
+                if img is None:
+                    self._set_frame_slot(None)
+                    self.timer.inc('frames_dropped_total', reason='read_failed')
+                    return None, None
+                break
+            self.capture_time = self.cap.frame_time
+            if self.media_clock and self.cap.position is not None:
+                self.capture_time = self.cap.position
+
+            with self.timer('flip'):
+                if slot is not None:
+                    cv2.flip(img, 1, dst=img)  # in place, the slot is ours
+                else:
+                    img = cv2.flip(img, 1) # Mirror for natural interaction
+                    self.timer.inc('frame_allocations_total', stage='flip')
+                    self.timer.inc('frame_bytes_copied_total', img.nbytes, stage='flip')
+            # Run the model on every frame while a swipe may be under way.
+            # A pooled detector returns None until its pipeline has filled.
+            if self.pooled:
+                img = self.detector.findHands(img, draw=draw, ring=self.ring, slot=slot,
+                                              captureTime=self.capture_time)
+            else:
+                img = self.detector.findHands(img, draw=draw, forceInference=self.swipe_in_progress(self.clock()))
+                self._set_frame_slot(slot)
+        if self.pooled:
+            self.capture_time = self.detector.frameTime
+            self._set_frame_slot(self.detector.frameSlot)
+
+        landmarks = self.landmarks = self.detector.findLandmarks()
+        handedness = self.handedness = self.detector.handedness
+        if self.recorder:
+            self.recorder.append(self.capture_time, landmarks, handedness, img.shape)
+
+        current_gesture, res_color, idx = self.evaluate(landmarks, handedness, self.clock())
+        self.gesture_hand = idx
+        if current_gesture and draw:
+            msg = current_gesture
+            if "Brightness" in msg:
+                msg = f"Brightness: {int(self.current_brightness)}%"
+
+            # Draw feedback near the hand
+            lm = landmarks[idx]
+            with self.timer('draw_text'):
+                cv2.putText(img, f"{msg}", (int(lm[0, 0]), int(lm[0, 1]) - 50),
+                            cv2.FONT_HERSHEY_DUPLEX, 0.8, res_color, 2)
+
+        self.timer.inc('frames_processed_total')
+        return img, current_gesture
+
+    def _read(self):
+        # (success, image, ring slot or None)
+        if self.ring is None:
+            success, img = self.cap.read()
+            if success:
+                self.timer.inc('frame_allocations_total', stage='decode')
+                if self.ring_slots:
+                    self.ring = FrameRing.FrameRing(self.ring_slots, img.shape)
+                    if isinstance(self.cap, FrameSource.ThreadedSource):
+                        self.cap.use_ring(self.ring)
+            return success, img, None
+        if isinstance(self.cap, FrameSource.ThreadedSource):
+            # The capture thread already decoded into a slot (it counts its
+            # own fallbacks to new arrays)
+            return self.cap.read_slot()
+        slot = self.ring.acquire()
+        if slot is None:
+            # Every slot still in use downstream: fall back to a new array
+            self.timer.inc('frame_ring_exhausted_total')
+            success, img = self.cap.read()
+            if success:
+                self.timer.inc('frame_allocations_total', stage='decode')
+            return success, img, None
+        success, img = self.cap.read(slot.array)
+        if not success or img is not slot.array:
+            # EOF, or the source changed size: the slot goes straight back
+            self.ring.release(slot)
+            if success:
+                self.timer.inc('frame_allocations_total', stage='decode')
+            return success, img, None
+        return True, img, slot
+
+    def _set_frame_slot(self, slot):
+        if self.frame_slot is not None:
+            self.ring.release(self.frame_slot)
+        self.frame_slot = slot
+
+    def hold_frame(self):
+        # Keeps the last returned frame out of rotation until the returned
+        # callable is called (e.g. by an encoder). None if frames aren't reused.
+        slot = self.frame_slot
+        if slot is None:
+            return None
+        self.ring.retain(slot)
+        return lambda: self.ring.release(slot)
+
+    def evaluate(self, landmarks, handedness, now=None):
+        # Gesture logic for one frame of (hands, 21, 3) landmarks, driven by
+        # the shared rule engine. `now` lets recordings replay with their own
+        # timestamps for cooldowns and swipes.
+        # Returns (gesture, color, index of the hand that fired it).
+        self.timer.set('hands_in_frame', len(landmarks))
+        self.timer.inc('hands_detected_total', len(landmarks))
+        with self.timer('detect_gesture'):
+            match = self.rules.evaluate(landmarks, handedness, now)
+        self.timer.set('hand_tracks', len(self.rules.tracker.tracks))
+        if match is None:
+            return None, (0, 0, 0), None
+
+        self.timer.inc('gestures_total', gesture=match.name)
+        if match.action:
+            self.perform(match.action)
+        return match.name, match.color, match.hand
+
+    def perform(self, action):
+        # Queued, never blocks the frame path
+        if "key" in action:
+            self.actuators.press(action["key"])
+        if "brightness" in action:
+            self.current_brightness = min(100, max(0, self.current_brightness + action["brightness"]))
+            self.actuators.set_brightness(self.current_brightness)
+
+    def clock(self):
+        # Time the gesture rules see for the current frame (None = wall clock)
+        return self.capture_time if self.media_clock else None
+
+    def swipe_in_progress(self, now=None):
+        # Tracked landmark already moving sideways within the swipe window
+        displacement = self.rules.swipe_displacement(time.time() if now is None else now)
+        return abs(displacement) > self.swipe_threshold / 2
 
     def release(self):
-        self.cap.release()
+        self.actuators.stop()
+        if self.pooled:
+            for slot in self.detector.release():
+                self.ring.release(slot)
+        self._set_frame_slot(None)
+        if self.cap:
+            self.cap.release()  # first: a capture thread may still be filling slots
+        if self.ring:
+            self.ring.close()
+        if self.recorder:
+            self.recorder.close()
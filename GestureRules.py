@@ -0,0 +1,280 @@
+import json
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import HandTracks
+
+# Declarative gesture rules shared by GestureEngine and Controller.
+#
+# A profile in gestures.json lists rules in priority order (or with explicit
+# "priority", higher first). Each rule combines predicates on one hand:
+#
+#   "fingers":  [thumb, index, middle, ring, pinky], 1 = up, 0 = down, null = any
+#   "distance": {"points": [a, b], "lt": px, "gt": px}   2D distance a-b
+#   "delta":    {"from": a, "to": b, "axis": "x"|"y", "lt": px, "gt": px}
+#               landmark[to] - landmark[from] along one axis
+#   "swipe":    {"lt": px, "gt": px}   this hand's swipe displacement
+#
+# plus "cooldown" seconds shared by everything in the same "group",
+# "on_cooldown": "skip" (fall through to lower rules) or "block" (stop here),
+# "repeat": false to fire once per hold, "color" (BGR) and "action".
+#
+# Rules are compiled once into a landmark weight matrix and a condition/rule
+# incidence matrix, so every frame scores all hands against all rules with a
+# fixed number of NumPy operations, however many rules there are.
+#
+# Swipes are measured per hand on HandTracks tracks: the profile's "swipe"
+# block sets the landmark, window, min_samples and history length, and an
+# optional "tracking" block tunes matching and filtering (max_distance,
+# max_age, handedness_cost, min_cutoff, beta, d_cutoff).
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gestures.json")
+
+Match = namedtuple("Match", "name color hand action")
+
+# Held poses reported on every frame they are shown. They drive the on-screen
+# feedback but are not events: the server doesn't broadcast them and batch
+# timelines leave them out.
+POSE_STATES = {"Brightness"}
+
+
+def is_event(name):
+    return name not in POSE_STATES
+
+
+AXES = {"x": 0, "y": 1}
+# Finger state as a landmark delta (to - from) that is negative when the
+# finger is up: the thumb compares IP/tip along x (mirrored for left hands),
+# the others compare PIP/tip along y (smaller y = higher on screen).
+FINGER_DELTAS = [(4, 3, 0), (6, 8, 1), (10, 12, 1), (14, 16, 1), (18, 20, 1)]
+# Smallest float32 step, so "x >= 0" can be written as "-x < TINY"
+TINY = float(np.nextafter(np.float32(0), np.float32(1)))
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _bounds(spec):
+    # Every condition is normalised to sign * value < threshold
+    out = []
+    if "lt" in spec:
+        out.append((1.0, spec["lt"]))
+    if "gt" in spec:
+        out.append((-1.0, -spec["gt"]))
+    if not out:
+        raise RuleError(f"condition {spec} needs 'lt' or 'gt'")
+    return out
+
+
+def _delta(a, b, axis):
+    # Weights over the flattened (21 * 3) landmarks giving lm[b, axis] - lm[a, axis]
+    w = np.zeros(63, dtype=np.float32)
+    w[b * 3 + axis] += 1
+    w[a * 3 + axis] -= 1
+    return w
+
+
+class CompiledRules:
+    def __init__(self, profile):
+        rules = profile.get("rules", [])
+        if not rules:
+            raise RuleError("profile has no rules")
+        order = sorted(range(len(rules)), key=lambda i: -rules[i].get("priority", 0))
+        rules = [rules[i] for i in order]
+
+        self.swipe = dict(profile.get("swipe", {}))
+        self.tracking = dict(profile.get("tracking", {}))
+        self.names = [r["name"] for r in rules]
+        self.colors = [tuple(r.get("color", (0, 0, 0))) for r in rules]
+        self.actions = [r.get("action") for r in rules]
+
+        # Conditions of each kind: (rule, weights or pair, sign, threshold, mirrored)
+        linear, dist, swipe = [], [], []
+        for r, rule in enumerate(rules):
+            fingers = rule.get("fingers")
+            if fingers is not None:
+                if len(fingers) != 5:
+                    raise RuleError(f"{rule['name']}: fingers needs 5 entries")
+                for f, state in enumerate(fingers):
+                    if state is None:
+                        continue
+                    a, b, axis = FINGER_DELTAS[f]
+                    sign, threshold = (1.0, 0.0) if state else (-1.0, TINY)
+                    linear.append((r, _delta(a, b, axis), sign, threshold, f == 0))
+            if "delta" in rule:
+                spec = rule["delta"]
+                w = _delta(spec["from"], spec["to"], AXES[spec.get("axis", "y")])
+                for sign, threshold in _bounds(spec):
+                    linear.append((r, w, sign, threshold, False))
+            if "distance" in rule:
+                spec = rule["distance"]
+                for sign, threshold in _bounds(spec):
+                    dist.append((r, tuple(spec["points"]), sign, threshold))
+            if "swipe" in rule:
+                for sign, threshold in _bounds(rule["swipe"]):
+                    swipe.append((r, None, sign, threshold))
+
+        conditions = linear + dist + swipe
+        if {c[0] for c in conditions} != set(range(len(rules))):
+            raise RuleError("every rule needs at least one predicate")
+        nl, nd, ns = len(linear), len(dist), len(swipe)
+        self.num_conditions = nl + nd + ns
+        self.dist_cols = slice(nl, nl + nd)
+        self.swipe_cols = slice(nl + nd, nl + nd + ns)
+
+        # One matmul gives every linear condition (sign folded in) plus the dx
+        # and dy of every distance pair. Column layout: [linear | dx | swipe | dy]
+        weights = np.zeros((63, self.num_conditions + nd), dtype=np.float32)
+        for c, (_, w, sign, _, _) in enumerate(linear):
+            weights[:, c] = sign * w
+        for c, (_, (a, b), _, _) in enumerate(dist):
+            weights[:, nl + c] = _delta(a, b, 0)
+            weights[:, self.num_conditions + c] = _delta(a, b, 1)
+        self.weights = weights
+        self.dist_sign = np.array([c[2] for c in dist], dtype=np.float32)
+        self.swipe_sign = np.array([c[2] for c in swipe], dtype=np.float32)
+        self.threshold = np.array([c[3] for c in conditions], dtype=np.float32)
+        self.mirror = np.zeros(self.num_conditions, dtype=bool)
+        self.mirror[[c for c, cond in enumerate(linear) if cond[4]]] = True
+
+        # Condition -> rule incidence; a rule holds when none of its conditions fail
+        self.cond_rule = np.zeros((self.num_conditions, len(rules)), dtype=bool)
+        for c, cond in enumerate(conditions):
+            self.cond_rule[c, cond[0]] = True
+
+        self.groups = sorted({rule.get("group", rule["name"]) for rule in rules})
+        self.group_index = np.array([self.groups.index(rule.get("group", rule["name"])) for rule in rules],
+                                    dtype=np.intp)
+        self.cooldown = np.array([rule.get("cooldown", 0.0) for rule in rules], dtype=np.float64)
+        self.block = np.array([rule.get("on_cooldown", "skip") == "block" for rule in rules], dtype=bool)
+        self.once = np.array([not rule.get("repeat", True) for rule in rules], dtype=bool)
+        self.any_once = bool(self.once.any())
+
+    def matches(self, landmarks, handedness, swipe):
+        # (hands, rules) boolean matrix of which rules hold for which hand;
+        # swipe is each hand's displacement (NaN = no swipe)
+        m = landmarks.reshape(len(landmarks), 63) @ self.weights
+        v = m[:, :self.num_conditions]
+        if handedness is not None and "Left" in handedness:
+            left = np.array([label == "Left" for label in handedness], dtype=bool)
+            np.negative(v, out=v, where=left[:, None] & self.mirror)
+        if len(self.dist_sign):
+            v[:, self.dist_cols] = np.hypot(v[:, self.dist_cols], m[:, self.num_conditions:]) * self.dist_sign
+        if len(self.swipe_sign):
+            v[:, self.swipe_cols] = self.swipe_sign * np.reshape(swipe, (-1, 1))
+        failed = ~(v < self.threshold)
+        return ~(failed @ self.cond_rule)
+
+
+def load_profile(name, path=DEFAULT_PATH):
+    with open(path) as f:
+        config = json.load(f)
+    try:
+        return config["profiles"][name]
+    except KeyError:
+        raise RuleError(f"profile '{name}' not found in {path}")
+
+
+class GestureRules:
+    # Stateful evaluator for one front end: owns the hand tracks, cooldown
+    # timers and hot reloading of its profile from the config file.
+    def __init__(self, profile="dashboard", path=DEFAULT_PATH, reload_interval=1.0):
+        self.profile = profile
+        self.path = path
+        self.reload_interval = reload_interval
+        self._mtime = None
+        self._next_check = 0.0
+        self.rules = None
+        self._last_fire = {}  # group -> time it last fired
+        self.tracker = None
+        self.tracks = []  # track of each hand in the last evaluated frame
+        self.reload()
+
+    def reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            rules = CompiledRules(load_profile(self.profile, self.path))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self.rules is None:
+                raise
+            print(f"Gesture rules reload failed, keeping previous rules: {e}")
+            return False
+        self._mtime = mtime
+        self.rules = rules
+        # Time at which each rule may fire again; cooldowns survive reloads by group
+        self.ready_at = np.array([self._last_fire.get(g, -np.inf) for g in rules.groups])[rules.group_index]
+        self.ready_at += rules.cooldown
+        self.held = np.zeros(len(rules.names), dtype=bool)
+        swipe = rules.swipe
+        self.swipe_landmark = swipe.get("landmark", 0)
+        self.swipe_window = swipe.get("window")
+        self.swipe_min_samples = swipe.get("min_samples", 2)
+        options = dict(rules.tracking, landmark=self.swipe_landmark, capacity=swipe.get("history", 10))
+        if self.tracker is None or options != self._tracker_options:
+            # Tracks restart only when their settings change
+            self.tracker = HandTracks.HandTracker(**options)
+            self._tracker_options = options
+            self.tracks = []
+        return True
+
+    def maybe_reload(self):
+        if not self.reload_interval:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            if self.reload():
+                print(f"Reloaded gesture rules from {self.path}")
+
+    def swipe_displacement(self, now):
+        # Largest swipe displacement of any live track, or NaN
+        best = np.nan
+        for track in self.tracker.tracks:
+            d = track.displacement(now, self.swipe_window, self.swipe_min_samples)
+            if abs(d) > abs(best) or np.isnan(best):
+                best = d
+        return best
+
+    def evaluate(self, landmarks, handedness=None, now=None):
+        if now is None:
+            now = time.time()
+        self.maybe_reload()
+        rules = self.rules
+        if not len(landmarks):
+            self.held[:] = False
+            self.tracks = []
+            return None
+
+        # One track update and one displacement per hand
+        self.tracks = self.tracker.update(landmarks, handedness, now)
+        swipe = np.array([t.displacement(now, self.swipe_window, self.swipe_min_samples)
+                          for t in self.tracks])
+
+        hits = rules.matches(landmarks, handedness, swipe)
+        candidate = hits.any(axis=0)
+        ready = self.ready_at <= now
+        if rules.any_once:
+            ready &= ~(rules.once & self.held)
+            self.held = candidate
+        eligible = candidate & (ready | rules.block)
+        if not eligible.any():
+            return None
+
+        r = int(eligible.argmax())
+        if not ready[r]:
+            return None  # Highest matching rule is locked in cooldown
+        if rules.cooldown[r] > 0:
+            group = rules.group_index[r]
+            self._last_fire[rules.groups[group]] = now
+            in_group = rules.group_index == group
+            self.ready_at[in_group] = now + rules.cooldown[in_group]
+        hand = int(hits[:, r].argmax())
+        return Match(rules.names[r], rules.colors[r], hand, rules.actions[r])
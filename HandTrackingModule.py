@@ -1,24 +1,116 @@
 import cv2
-import mediapipe as mp
+import numpy as np
 import time
 import math
+import Timing
 
-try:
-    import mediapipe.python.solutions as solutions
-    mp.solutions = solutions
-except ImportError:
-    pass # fallback to default if it was already there or if this path is wrong
+# MediaPipe is imported on first use (building a HandDetector or drawing),
+# so modules that only need the array helpers below load quickly
+mp = None
+
+
+def loadMediapipe():
+    global mp
+    if mp is None:
+        import mediapipe
+        try:
+            import mediapipe.python.solutions as solutions
+            mediapipe.solutions = solutions
+        except ImportError:
+            pass # fallback to default if it was already there or if this path is wrong
+
+        if not hasattr(mediapipe, 'solutions'):
+            print("Warning: mp.solutions still missing after import attempt.")
+        mp = mediapipe
+    return mp
+
+# Decides on which frames the MediaPipe model actually runs. The interval N
+# adapts so that the average per-frame cost stays within frameBudget; in
+# between, landmarks are propagated by the detector's cheap tracker.
+class InferenceScheduler:
+    def __init__(self, frameBudget=1 / 30, maxInterval=4, motionThreshold=25.0, smoothing=0.2):
+        self.frameBudget = frameBudget          # seconds per frame we can afford
+        self.maxInterval = maxInterval          # never track more than N-1 frames in a row
+        self.motionThreshold = motionThreshold  # wrist speed (px/frame) that forces inference
+        self.smoothing = smoothing
+        self.interval = 1
+        self.inferenceTime = None  # moving average of one model run, seconds
+        self.sinceInference = 0
+
+    def shouldInfer(self, motion=0.0, force=False):
+        if force or self.inferenceTime is None or motion > self.motionThreshold:
+            return True
+        return self.sinceInference + 1 >= self.interval
+
+    def record(self, inferred, seconds=0.0):
+        if not inferred:
+            self.sinceInference += 1
+            return
+        self.sinceInference = 0
+        if self.inferenceTime is None:
+            self.inferenceTime = seconds
+        else:
+            self.inferenceTime += self.smoothing * (seconds - self.inferenceTime)
+        # Run the model once every N frames so its cost averages out under budget
+        self.interval = max(1, min(self.maxInterval, math.ceil(self.inferenceTime / self.frameBudget)))
+
+
+# Vectorized helpers over (hands, 21, 3) landmark arrays. They need no model,
+# so recorded landmarks can be evaluated without MediaPipe.
+def bboxes(landmarks):
+    # (hands, 4) int array of xmin, ymin, xmax, ymax
+    xy = landmarks[:, :, :2]
+    return np.concatenate((xy.min(axis=1), xy.max(axis=1)), axis=1).astype(np.int32)
+
+
+def fingersUpArray(landmarks, handedness=None):
+    # (hands, 5) uint8 array of [Thumb, Index, Middle, Ring, Pinky] states.
+    # Without handedness the thumb test assumes a right hand, like fingersUp.
+    lms = landmarks
+    fingers = np.empty((len(lms), 5), dtype=np.uint8)
+    thumb = lms[:, 4, 0] > lms[:, 3, 0]
+    if handedness is not None and "Left" in handedness:
+        left = np.array([label == "Left" for label in handedness], dtype=bool)
+        thumb = np.where(left, lms[:, 4, 0] < lms[:, 3, 0], thumb)
+    fingers[:, 0] = thumb
+    # Tips 8, 12, 16, 20 against PIP joints 6, 10, 14, 18 (strided, no fancy indexing)
+    fingers[:, 1:] = lms[:, 8:21:4, 1] < lms[:, 6:19:4, 1]
+    return fingers
+
+
+def distances(landmarks, p1, p2):
+    # (hands,) array of 2D pixel distances between landmarks p1 and p2
+    d = landmarks[:, p2, :2] - landmarks[:, p1, :2]
+    return np.hypot(d[:, 0], d[:, 1])
+
+
+def pairwiseDistances(landmarks):
+    # (hands, 21, 21) array of 2D distances between every landmark pair
+    d = landmarks[:, :, None, :2] - landmarks[:, None, :, :2]
+    return np.sqrt((d * d).sum(axis=-1))
+
+
+def drawLandmarks(img, landmarks):
+    # Draw the skeleton straight from a (hands, 21, 3) landmark array
+    for lm in landmarks:
+        pts = lm[:, :2].astype(np.int32)
+        for a, b in loadMediapipe().solutions.hands.HAND_CONNECTIONS:
+            cv2.line(img, tuple(int(v) for v in pts[a]), tuple(int(v) for v in pts[b]), (224, 224, 224), 2)
+        for cx, cy in pts:
+            cv2.circle(img, (int(cx), int(cy)), 3, (0, 0, 255), cv2.FILLED)
+    return img
 
-if not hasattr(mp, 'solutions'):
-    print("Warning: mp.solutions still missing after import attempt.")
 
 class HandDetector:
-    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackCon=0.5):
+    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackCon=0.5,
+                 scheduler=None, tracking='velocity', roi=False, roiSize=256, roiPadding=0.5,
+                 roiRefresh=30):
         self.mode = mode
         self.maxHands = maxHands
         self.detectionCon = detectionCon
         self.trackCon = trackCon
 
+        loadMediapipe()
         self.mpHands = mp.solutions.hands
         # Note: In newer mediapipe versions, arguments might need strict keyword usage or type casting
         self.hands = self.mpHands.Hands(static_image_mode=self.mode,
@@ -28,34 +120,252 @@ class HandDetector:
         self.mpDraw = mp.solutions.drawing_utils
         self.tipIds = [4, 8, 12, 16, 20]
 
-    def findHands(self, img, draw=True):
-        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(imgRGB)
+        # Landmark arrays for all detected hands: (hands, 21, 3) float32 in
+        # pixels. The buffer is preallocated and reused every frame.
+        self._lmBuffer = np.zeros((self.maxHands, 21, 3), dtype=np.float32)
+        # Flat float32 view of the same memory: scalar stores into it skip
+        # the per-landmark tuples and NumPy indexing
+        self._lmFlat = memoryview(self._lmBuffer.reshape(-1))
+        self.landmarks = self._lmBuffer[:0]
+        self.handedness = []
+        self.lmList = []
+
+        # Optional adaptive scheduling: with a scheduler, the model only runs
+        # on some frames and landmarks are tracked ('velocity' extrapolation
+        # or 'flow' for pyramidal Lucas-Kanade) on the frames in between.
+        self.scheduler = scheduler
+        self.tracking = tracking
+        self.inferred = True  # whether the last findHands ran the model
+        self.velocity = np.zeros((self.maxHands, 21, 3), dtype=np.float32)  # px/frame
+        self._prevInferred = np.zeros((self.maxHands, 21, 3), dtype=np.float32)
+        self._prevCount = 0
+        self._prevGray = None
+
+        # Optional region-of-interest mode: crop a padded box around the
+        # previous hands, downscale it to roiSize and run the model only on
+        # that. Full-frame detection runs again on loss or every roiRefresh
+        # model runs so new hands are still picked up.
+        self.roi = roi
+        self.roiSize = roiSize
+        self.roiPadding = roiPadding
+        self.roiRefresh = roiRefresh
+        self.lastRoi = None  # crop (x0, y0, x1, y1) used by the last model run
+        self._roi = None
+        self._roiHandsGraph = None
+        self._sinceFullFrame = 0
+        self._rgb = None  # reused RGB buffer for the model input
+
+        # Per-stage timing hooks (no-op unless a Timing.StageTimer is set)
+        self.timer = Timing.NULL_TIMER
 
-        if self.results.multi_hand_landmarks:
-            for handLms in self.results.multi_hand_landmarks:
-                if draw:
-                    self.mpDraw.draw_landmarks(img, handLms, self.mpHands.HAND_CONNECTIONS)
+    def warmUp(self, shape=(480, 640, 3)):
+        # One model run on a blank frame, so loading the model isn't paid by
+        # the first real frame. Leaves no landmarks or tracking state behind.
+        with self.timer('warm_up'):
+            self.hands.process(np.zeros(shape, dtype=np.uint8))
+            if self.roi:
+                # The crop graph too, or the first tracked frame pays for it
+                self._roiGraph().process(np.zeros((self.roiSize, self.roiSize, 3), dtype=np.uint8))
+
+    def findHands(self, img, draw=True, forceInference=False):
+        if self.scheduler is None:
+            self._infer(img)
+        else:
+            motion = self.motion()
+            if self.scheduler.shouldInfer(motion, forceInference):
+                start = time.perf_counter()
+                self._infer(img)
+                self.scheduler.record(True, time.perf_counter() - start)
+            else:
+                with self.timer('track'):
+                    self._track(img)
+                self.scheduler.record(False)
+
+        if self.inferred:
+            self.timer.inc('model_runs_total', mode='full' if self.lastRoi is None else 'roi')
+        else:
+            self.timer.inc('tracked_frames_total')
+
+        if draw and len(self.landmarks):
+            with self.timer('draw'):
+                if self.inferred and self.lastRoi is None:
+                    for handLms in self.results.multi_hand_landmarks:
+                        self.mpDraw.draw_landmarks(img, handLms, self.mpHands.HAND_CONNECTIONS)
+                else:
+                    self.drawLandmarks(img)
         return img
 
+    def _infer(self, img):
+        self.lastRoi = None
+        if self.roi and len(self.landmarks) and self._sinceFullFrame < self.roiRefresh:
+            self.lastRoi = self._roiBox(img.shape)
+            if self.lastRoi is not None:
+                self._processRoi(img, self.lastRoi)
+                self._sinceFullFrame += 1
+                if not len(self.landmarks):
+                    self.lastRoi = None  # Lost the hands, look at the whole frame
+        if self.lastRoi is None:
+            with self.timer('cvtColor'):
+                imgRGB = self._toRGB(img)
+            with self.timer('hands.process'):
+                self.results = self.hands.process(imgRGB)
+            with self.timer('landmarks'):
+                self._updateLandmarks(img.shape)
+            self._sinceFullFrame = 0
+            self._roi = None
+        self.inferred = True
+
+        if self.scheduler is None:
+            return
+        # Per-frame velocity between consecutive model runs
+        n = len(self.landmarks)
+        if n and n == self._prevCount:
+            frames = self.scheduler.sinceInference + 1
+            self.velocity[:n] = (self.landmarks - self._prevInferred[:n]) / frames
+        else:
+            self.velocity[:] = 0
+        self._prevInferred[:n] = self.landmarks
+        self._prevCount = n
+        if self.tracking == 'flow':
+            self._prevGray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    def _roiBox(self, shape):
+        h, w = shape[:2]
+        pts = self.landmarks[:, :, :2]
+        xmin, ymin = pts.min(axis=(0, 1))
+        xmax, ymax = pts.max(axis=(0, 1))
+        pad = self.roiPadding * max(xmax - xmin, ymax - ymin)
+        # Keep the current crop while the hands stay well inside it, so the
+        # ROI graph's own frame-to-frame tracking sees a stable image
+        if self._roi is not None:
+            x0, y0, x1, y1 = self._roi
+            margin = pad / 2
+            if xmin - margin >= x0 and ymin - margin >= y0 and xmax + margin <= x1 and ymax + margin <= y1:
+                return self._roi
+        x0, y0 = max(0, int(xmin - pad)), max(0, int(ymin - pad))
+        x1, y1 = min(w, int(xmax + pad)), min(h, int(ymax + pad))
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        self._roi = (x0, y0, x1, y1)
+        return self._roi
+
+    def _processRoi(self, img, box):
+        x0, y0, x1, y1 = box
+        crop = img[y0:y1, x0:x1]
+        scale = self.roiSize / max(x1 - x0, y1 - y0)
+        if scale < 1:
+            with self.timer('roi_resize'):
+                crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        with self.timer('cvtColor'):
+            cropRGB = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        with self.timer('hands.process'):
+            self.results = self._roiGraph().process(cropRGB)
+        # Landmarks are normalized to the crop; map them back to the frame
+        with self.timer('landmarks'):
+            self._updateLandmarks((y1 - y0, x1 - x0), origin=(x0, y0))
+
+    def _roiGraph(self):
+        # A separate graph so MediaPipe's internal tracking never mixes crop
+        # and full-frame coordinates
+        if self._roiHandsGraph is None:
+            self._roiHandsGraph = self.mpHands.Hands(static_image_mode=self.mode,
+                                                     max_num_hands=self.maxHands,
+                                                     min_detection_confidence=self.detectionCon,
+                                                     min_tracking_confidence=self.trackCon)
+        return self._roiHandsGraph
+
+    def _toRGB(self, img):
+        # Full frames are converted into one buffer kept across frames
+        # (MediaPipe copies its input, so the buffer is free again right away)
+        if self._rgb is None or self._rgb.shape != img.shape:
+            self._rgb = np.empty_like(img)
+            self.timer.inc('frame_allocations_total', stage='cvtColor')
+        self.timer.inc('frame_bytes_copied_total', img.nbytes, stage='cvtColor')
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self._rgb)
+
+    def _track(self, img):
+        # Propagate the previous landmarks without running the model
+        n = len(self.landmarks)
+        self.inferred = False
+        if not n:
+            return
+        if self.tracking == 'flow' and self._prevGray is not None:
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            pts = np.ascontiguousarray(self.landmarks[:, :, :2]).reshape(-1, 1, 2)
+            newPts, status, _ = cv2.calcOpticalFlowPyrLK(self._prevGray, gray, pts, None,
+                                                         winSize=(15, 15), maxLevel=2)
+            ok = status.reshape(n, 21).astype(bool)
+            moved = newPts.reshape(n, 21, 2)
+            # Points the flow lost fall back to constant velocity
+            predicted = self.landmarks[:, :, :2] + self.velocity[:n, :, :2]
+            self.landmarks[:, :, :2] = np.where(ok[..., None], moved, predicted)
+            self.landmarks[:, :, 2] += self.velocity[:n, :, 2]
+            self._prevGray = gray
+        else:
+            self.landmarks += self.velocity[:n]
+
+    def motion(self):
+        # Fastest wrist speed across hands in px/frame, from the last model runs
+        n = len(self.landmarks)
+        if not n:
+            return 0.0
+        return float(np.abs(self.velocity[:n, 0, :2]).max())
+
+    def drawLandmarks(self, img):
+        return drawLandmarks(img, self.landmarks)
+
+    def _updateLandmarks(self, shape, origin=(0, 0)):
+        h, w = shape[:2]
+        hands = self.results.multi_hand_landmarks or []
+        n = min(len(hands), self.maxHands)
+        flat = self._lmFlat
+        k = 0
+        for hand in hands[:n]:
+            for lm in hand.landmark:
+                flat[k] = lm.x
+                flat[k + 1] = lm.y
+                flat[k + 2] = lm.z
+                k += 3
+        self.landmarks = self._lmBuffer[:n]
+        # z uses the same scale as x, as MediaPipe defines it
+        self.landmarks *= (w, h, w)
+        if origin != (0, 0):
+            self.landmarks[:, :, :2] += origin
+        if self.results.multi_handedness:
+            self.handedness = [hd.classification[0].label for hd in self.results.multi_handedness[:n]]
+        else:
+            self.handedness = []
+
+    def findLandmarks(self):
+        # (hands, 21, 3) float32 array of x, y, z pixel coordinates for every
+        # hand found by the last findHands call. Valid until the next frame.
+        return self.landmarks
+
+    def bboxes(self, landmarks=None):
+        return bboxes(self.landmarks if landmarks is None else landmarks)
+
+    def fingersUpArray(self, landmarks=None, handedness=None):
+        return fingersUpArray(self.landmarks if landmarks is None else landmarks, handedness)
+
+    def distances(self, p1, p2, landmarks=None):
+        return distances(self.landmarks if landmarks is None else landmarks, p1, p2)
+
+    def pairwiseDistances(self, landmarks=None):
+        return pairwiseDistances(self.landmarks if landmarks is None else landmarks)
+
     def findPosition(self, img, handNo=0, draw=True):
-        xList = []
-        yList = []
+        # List API kept as a thin view over the landmark array
         bbox = []
         self.lmList = []
-        if self.results.multi_hand_landmarks:
-            myHand = self.results.multi_hand_landmarks[handNo]
-            for id, lm in enumerate(myHand.landmark):
-                h, w, c = img.shape
-                cx, cy = int(lm.x * w), int(lm.y * h)
-                xList.append(cx)
-                yList.append(cy)
-                self.lmList.append([id, cx, cy])
-                if draw:
-                    cv2.circle(img, (cx, cy), 5, (255, 0, 255), cv2.FILLED)
-
-            xmin, xmax = min(xList), max(xList)
-            ymin, ymax = min(yList), max(yList)
+        if handNo < len(self.landmarks):
+            pts = self.landmarks[handNo, :, :2].astype(np.int32)
+            self.lmList = [[id, int(cx), int(cy)] for id, (cx, cy) in enumerate(pts)]
+            if draw:
+                for cx, cy in pts:
+                    cv2.circle(img, (int(cx), int(cy)), 5, (255, 0, 255), cv2.FILLED)
+
+            xmin, ymin = (int(v) for v in pts.min(axis=0))
+            xmax, ymax = (int(v) for v in pts.max(axis=0))
             bbox = xmin, ymin, xmax, ymax
 
             if draw:
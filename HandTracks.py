@@ -0,0 +1,143 @@
+import math
+import numpy as np
+
+# Per-hand tracks across frames. MediaPipe lists hands in detection order,
+# which can swap from one frame to the next; HandTracker matches every hand to
+# the live track whose predicted position is nearest (a handedness mismatch
+# costs extra), so a hand keeps its id and motion history while it stays in
+# view, and swipes are measured per hand.
+#
+# Each Track follows one landmark and keeps, at constant cost per frame:
+#   - a fixed ring of raw (t, x, y) samples; the swipe displacement over the
+#     window is newest - oldest, O(1)
+#   - a One-Euro filter (Casiez et al.) over the landmark whose state gives the
+#     smoothed position, velocity and acceleration in px/s and px/s^2
+#
+# Predicting with the velocity keeps hands matched when the model runs on
+# fewer frames and a hand moves further between samples.
+
+
+def _alpha(cutoff, dt):
+    # Smoothing factor of a first-order low-pass filter at `cutoff` Hz
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class Track:
+    def __init__(self, track_id, capacity=10, min_cutoff=1.0, beta=0.007, d_cutoff=1.0):
+        self.id = track_id
+        self.handedness = None
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+
+        # Ring of raw samples: head is the next write, count the valid entries
+        self.times = np.zeros(max(capacity, 1), dtype=np.float64)
+        self.points = np.zeros((max(capacity, 1), 2), dtype=np.float64)
+        self.head = 0
+        self.count = 0
+
+        # One-Euro state
+        self.x = self.y = 0.0  # filtered position
+        self.vx = self.vy = 0.0
+        self.ax = self.ay = 0.0
+        self.last_seen = None
+        self.hits = 0  # frames this track has been matched in
+
+    def predict(self, now):
+        # Where the landmark should be at `now`, from the filtered motion
+        dt = now - self.last_seen
+        return self.x + self.vx * dt, self.y + self.vy * dt
+
+    def update(self, now, x, y, handedness=None):
+        capacity = len(self.times)
+        self.times[self.head] = now
+        self.points[self.head] = x, y
+        self.head = (self.head + 1) % capacity
+        self.count = min(self.count + 1, capacity)
+        if handedness is not None:
+            self.handedness = handedness
+        self.hits += 1
+
+        if self.last_seen is None:
+            self.x, self.y = x, y
+        else:
+            dt = now - self.last_seen
+            if dt <= 0:
+                return  # same timestamp: the ring has the sample, the filter skips it
+            a_d = _alpha(self.d_cutoff, dt)
+            vx = self.vx + a_d * ((x - self.x) / dt - self.vx)
+            vy = self.vy + a_d * ((y - self.y) / dt - self.vy)
+            self.ax += a_d * ((vx - self.vx) / dt - self.ax)
+            self.ay += a_d * ((vy - self.vy) / dt - self.ay)
+            self.vx, self.vy = vx, vy
+            a = _alpha(self.min_cutoff + self.beta * math.hypot(vx, vy), dt)
+            self.x += a * (x - self.x)
+            self.y += a * (y - self.y)
+        self.last_seen = now
+
+    def displacement(self, now, window=None, min_samples=2, axis=0):
+        # Raw displacement across the ring, or NaN if it is too short or its
+        # oldest sample has left the window
+        if self.count < max(min_samples, 1):
+            return np.nan
+        oldest = (self.head - self.count) % len(self.times)
+        if window is not None and now - self.times[oldest] >= window:
+            return np.nan
+        return self.points[self.head - 1, axis] - self.points[oldest, axis]
+
+    @property
+    def speed(self):
+        return math.hypot(self.vx, self.vy)
+
+
+class HandTracker:
+    def __init__(self, landmark=0, capacity=10, max_distance=150.0, max_age=0.5,
+                 handedness_cost=75.0, min_cutoff=1.0, beta=0.007, d_cutoff=1.0):
+        self.landmark = landmark
+        self.capacity = capacity
+        self.max_distance = max_distance  # px from the prediction to still match
+        self.max_age = max_age  # seconds a track survives without its hand
+        self.handedness_cost = handedness_cost  # px added when handedness disagrees
+        self.filter_options = {"min_cutoff": min_cutoff, "beta": beta, "d_cutoff": d_cutoff}
+        self.tracks = []  # live tracks, oldest first
+        self._next_id = 0
+
+    def update(self, landmarks, handedness=None, now=0.0):
+        # Matches this frame's hands to tracks and feeds them. Returns the
+        # track of every hand, in hand order.
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_age]
+        n = len(landmarks)
+        assigned = [None] * n
+        if n and self.tracks:
+            points = landmarks[:, self.landmark, :2]
+            # Greedy on the (hands x tracks) cost matrix; there are at most a
+            # few hands, so this is as good as an optimal assignment
+            pairs = []
+            for j, track in enumerate(self.tracks):
+                px, py = track.predict(now)
+                for i in range(n):
+                    cost = math.hypot(points[i, 0] - px, points[i, 1] - py)
+                    label = handedness[i] if handedness is not None and i < len(handedness) else None
+                    if label is not None and track.handedness is not None and label != track.handedness:
+                        cost += self.handedness_cost
+                    if cost < self.max_distance:
+                        pairs.append((cost, i, j))
+            taken = set()
+            for cost, i, j in sorted(pairs):
+                if assigned[i] is None and j not in taken:
+                    assigned[i] = self.tracks[j]
+                    taken.add(j)
+        for i in range(n):
+            track = assigned[i]
+            if track is None:
+                track = assigned[i] = Track(self._next_id, self.capacity, **self.filter_options)
+                self._next_id += 1
+                self.tracks.append(track)
+            label = handedness[i] if handedness is not None and i < len(handedness) else None
+            point = landmarks[i, self.landmark]
+            track.update(now, float(point[0]), float(point[1]), label)
+        return assigned
+
+    def reset(self):
+        self.tracks = []
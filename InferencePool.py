@@ -0,0 +1,269 @@
+import multiprocessing
+import threading
+import time
+import numpy as np
+import FrameRing
+import HandTrackingModule as htm
+import Timing
+
+# Hand tracking on a pool of worker processes. MediaPipe holds one Python
+# thread per HandDetector, so a single pipeline tops out on one core; the
+# pool spreads frames over several processes and hands the landmarks back in
+# frame order.
+#
+# Each stream gets a set of lanes (worker processes). A worker keeps one
+# HandDetector per (stream, lane), so MediaPipe's own tracking always sees a
+# regular sequence of frames from the same camera:
+#
+#   lanes=1   every frame of the stream goes to one worker (many sources in
+#             parallel, each pinned to its own core)
+#   lanes=N   frames are dealt round-robin over N workers, each tracking at
+#             fps/N (one high-fps source pipelined across cores)
+#
+# Results are reordered by sequence number before they leave the pool.
+
+RESULT_TIMEOUT = 10.0  # seconds to wait for one frame before checking the workers
+
+
+def _worker(tasks, results, detector_options):
+    detectors = {}
+    rings = {}  # FrameRing name -> (ring, stream keys reading from it)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        key, seq, frame = task
+        if frame is None:  # stream closed: drop its detector and ring
+            detectors.pop(key, None)
+            for name, (ring, keys) in list(rings.items()):
+                keys.discard(key)
+                if not keys:
+                    ring.close()
+                    del rings[name]
+            continue
+        detector = detectors.get(key)
+        if detector is None:
+            detector = detectors[key] = htm.HandDetector(**detector_options)
+        start = time.perf_counter()
+        try:
+            if isinstance(frame, dict):
+                # A slot of the engine's FrameRing: read in place, no copy
+                spec = frame["ring"]
+                entry = rings.get(spec["name"])
+                if entry is None:
+                    entry = rings[spec["name"]] = (FrameRing.FrameRing(**spec), set())
+                entry[1].add(key)
+                frame = entry[0].view(frame["index"], frame["seq"])
+                if frame is None:
+                    raise RuntimeError("frame slot was refilled before inference")
+            detector.findHands(frame, draw=False)
+            landmarks = np.array(detector.findLandmarks())
+            result = (landmarks, list(detector.handedness), time.perf_counter() - start, None)
+        except Exception as e:
+            result = (None, None, time.perf_counter() - start, repr(e))
+        frame = None  # drop the view so the ring can be unmapped
+        results.put((key[0], seq, result))
+
+
+class InferencePool:
+    def __init__(self, workers=2, detectionCon=0.75, maxHands=2, roi=False):
+        self.detector_options = {"detectionCon": detectionCon, "maxHands": maxHands, "roi": roi}
+        # spawn: forking a process that already runs MediaPipe or capture threads is unsafe
+        ctx = multiprocessing.get_context("spawn")
+        self.results = ctx.Queue()
+        self.tasks = [ctx.Queue() for _ in range(workers)]
+        self.processes = [ctx.Process(target=_worker, args=(q, self.results, self.detector_options),
+                                      daemon=True, name=f"hands-{i}")
+                          for i, q in enumerate(self.tasks)]
+        for p in self.processes:
+            p.start()
+
+        self.streams = {}  # stream id -> PoolStream
+        self._next_stream = 0
+        self._next_lane = 0
+        self._lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    @property
+    def workers(self):
+        return len(self.processes)
+
+    def stream(self, lanes=None, depth=None):
+        # A new ordered stream of frames. Lanes are taken round-robin so
+        # pinned streams spread evenly over the workers.
+        lanes = min(lanes or self.workers, self.workers)
+        with self._lock:
+            stream_id = self._next_stream
+            self._next_stream += 1
+            first = self._next_lane
+            self._next_lane = (self._next_lane + lanes) % self.workers
+            stream = PoolStream(self, stream_id, [(first + i) % self.workers for i in range(lanes)],
+                                depth or 2 * lanes)
+            self.streams[stream_id] = stream
+        return stream
+
+    def _collect(self):
+        # Routes results to their stream, where they wait for their turn
+        while True:
+            try:
+                item = self.results.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            stream_id, seq, result = item
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream._deliver(seq, result)
+
+    def alive(self):
+        return all(p.is_alive() for p in self.processes)
+
+    def close(self):
+        with self._lock:
+            streams = list(self.streams.values())
+        for stream in streams:
+            stream.close()
+        for q in self.tasks:
+            q.put(None)
+        for p in self.processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self.results.put(None)
+        self._collector.join(timeout=5)
+
+
+class PoolStream:
+    def __init__(self, pool, stream_id, lanes, depth):
+        self.pool = pool
+        self.id = stream_id
+        self.lanes = lanes
+        self.depth = depth  # frames in flight before submit() waits
+        self.submitted = 0
+        self.delivered = 0
+        self._pending = {}  # seq -> result, until it is next in order
+        self._cond = threading.Condition()
+
+    def submit(self, frame):
+        # frame is an image (pickled to the worker) or a dict naming a
+        # FrameRing slot. Returns the frame's sequence number. Blocks while
+        # `depth` frames are already in flight, so a slow pool pushes back.
+        seq = self.submitted
+        with self._cond:
+            while seq - self.delivered >= self.depth:
+                self._wait()
+        lane = seq % len(self.lanes)
+        self.pool.tasks[self.lanes[lane]].put(((self.id, lane), seq, frame))
+        self.submitted += 1
+        return seq
+
+    def result(self):
+        # Next result in frame order: (landmarks, handedness, inference seconds)
+        with self._cond:
+            while self.delivered not in self._pending:
+                self._wait()
+            landmarks, handedness, seconds, error = self._pending.pop(self.delivered)
+            self.delivered += 1
+            self._cond.notify_all()
+        if error:
+            raise RuntimeError(f"hand tracking worker failed: {error}")
+        return landmarks, handedness, seconds
+
+    @property
+    def in_flight(self):
+        return self.submitted - self.delivered
+
+    def _wait(self):
+        if not self._cond.wait(RESULT_TIMEOUT) and not self.pool.alive():
+            raise RuntimeError("hand tracking worker exited")
+
+    def _deliver(self, seq, result):
+        with self._cond:
+            self._pending[seq] = result
+            self._cond.notify_all()
+
+    def close(self):
+        with self.pool._lock:
+            if self.pool.streams.pop(self.id, None) is None:
+                return
+        for lane, worker in enumerate(self.lanes):
+            self.pool.tasks[worker].put(((self.id, lane), 0, None))
+
+
+class PooledDetector:
+    # Stands in for HandDetector in GestureEngine. findHands() submits the
+    # frame and hands back the oldest frame whose landmarks are ready, so the
+    # engine sees frames `depth` steps late but the pool stays busy. Frames
+    # in a FrameRing slot travel as a reference; the slot stays with the
+    # frame until it comes back out (frameSlot).
+    def __init__(self, pool, lanes=None, depth=None):
+        self.stream = pool.stream(lanes, depth)
+        self.landmarks = np.zeros((0, 21, 3), dtype=np.float32)
+        self.handedness = []
+        self.inferred = True
+        self.lastRoi = None
+        self._frames = []  # (image, capture time, slot, draw) submitted, oldest first
+        self.frameTime = None  # capture time of the frame findHands last returned
+        self.frameSlot = None  # and its FrameRing slot, if it has one
+        self.timer = Timing.NULL_TIMER
+
+    def warmUp(self, shape=(480, 640, 3)):
+        # A blank frame through every lane, so each worker has built its
+        # detector and loaded the model before the first real frame
+        blank = np.zeros(shape, dtype=np.uint8)
+        with self.timer('warm_up'):
+            for _ in self.stream.lanes:
+                self.stream.submit(blank)
+            for _ in self.stream.lanes:
+                self.stream.result()
+
+    def findHands(self, img, draw=True, forceInference=False, ring=None, slot=None, captureTime=None):
+        # forceInference is moot here: every frame runs the model
+        with self.timer('pool_submit'):
+            if slot is not None:
+                self.stream.submit({"ring": ring.spec(), "index": slot.index, "seq": slot.seq})
+            else:
+                self.stream.submit(img)
+                # Pickled into the queue, unpickled into a new array in the worker
+                self.timer.inc('frame_allocations_total', 2, stage='pool_transfer')
+                self.timer.inc('frame_bytes_copied_total', 2 * img.nbytes, stage='pool_transfer')
+        # draw travels with the frame: it applies to this frame's overlay,
+        # which is drawn `depth` calls later
+        self._frames.append((img, time.time() if captureTime is None else captureTime, slot, draw))
+        if self.stream.in_flight < self.stream.depth:
+            return None  # pipeline still filling
+        return self._next()
+
+    def drain(self):
+        # Oldest frame still in flight, or None once the pool is empty. Drawn
+        # as requested when it was submitted.
+        if not self._frames:
+            return None
+        return self._next()
+
+    def _next(self):
+        img, self.frameTime, self.frameSlot, draw = self._frames.pop(0)
+        with self.timer('pool_wait'):
+            landmarks, self.handedness, seconds = self.stream.result()
+        self.landmarks = landmarks
+        self.timer.add('hands.process', seconds)
+        self.timer.inc('model_runs_total', mode='pool')
+        if draw and len(landmarks):
+            with self.timer('draw'):
+                htm.drawLandmarks(img, landmarks)
+        return img
+
+    def findLandmarks(self):
+        return self.landmarks
+
+    def drawLandmarks(self, img):
+        return htm.drawLandmarks(img, self.landmarks)
+
+    def release(self):
+        # Slots of frames still in flight; the caller releases them
+        slots = [frame[2] for frame in self._frames if frame[2] is not None]
+        self._frames = []
+        self.stream.close()
+        return slots
@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+
+# Compact columnar landmark recordings. A recording is a directory of raw
+# little-endian arrays that replay memory-maps without parsing:
+#
+#   timestamps.bin  float64 (frames,)        capture time of each frame
+#   ends.bin        uint32  (frames,)        running hand count; frame i owns
+#                                            hands ends[i-1]:ends[i]
+#   landmarks.bin   float32 (hands, 21, 3)   x, y, z in pixels
+#   handedness.bin  int8    (hands,)         0 = Right, 1 = Left
+#   meta.json       frame size and counts
+#
+# Frames without hands cost 12 bytes, each hand 253 bytes.
+
+FORMAT_VERSION = 1
+LABELS = ("Right", "Left")
+
+
+class LandmarkRecorder:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "wb")
+                       for name in ("timestamps", "ends", "landmarks", "handedness")}
+        self.frames = 0
+        self.hands = 0
+        self.frame_size = None
+
+    def append(self, timestamp, landmarks, handedness, shape=None):
+        if self.frame_size is None and shape is not None:
+            self.frame_size = [int(shape[1]), int(shape[0])]
+        n = len(landmarks)
+        self.hands += n
+        self.frames += 1
+        f = self._files
+        f["timestamps"].write(np.float64(timestamp).tobytes())
+        f["ends"].write(np.uint32(self.hands).tobytes())
+        if n:
+            f["landmarks"].write(np.ascontiguousarray(landmarks, dtype="<f4").tobytes())
+            f["handedness"].write(bytes(1 if label == "Left" else 0 for label in handedness[:n]))
+
+    def close(self):
+        if not self._files:
+            return
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "frames": self.frames, "hands": self.hands,
+                       "frame_size": self.frame_size}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _map(path, dtype, shape):
+    # np.memmap refuses empty files, so empty columns become empty arrays.
+    # Plain ndarray views skip memmap's per-slice bookkeeping during replay.
+    if shape[0] == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape).view(np.ndarray)
+
+
+class LandmarkReplay:
+    def __init__(self, path):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        self.meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        # Sizes come from the files themselves, so a recording that was cut
+        # off before close() still replays up to its last complete frame
+        frames = os.path.getsize(os.path.join(path, "ends.bin")) // 4
+        frames = min(frames, os.path.getsize(os.path.join(path, "timestamps.bin")) // 8)
+        hands = os.path.getsize(os.path.join(path, "handedness.bin"))
+        hands = min(hands, os.path.getsize(os.path.join(path, "landmarks.bin")) // (21 * 3 * 4))
+        self.timestamps = _map(os.path.join(path, "timestamps.bin"), "<f8", (frames,))
+        self.ends = _map(os.path.join(path, "ends.bin"), "<u4", (frames,))
+        while frames and self.ends[frames - 1] > hands:
+            frames -= 1
+        self.timestamps = self.timestamps[:frames]
+        self.ends = self.ends[:frames]
+        self.landmarks = _map(os.path.join(path, "landmarks.bin"), "<f4", (hands, 21, 3))
+        self.handedness = _map(os.path.join(path, "handedness.bin"), "i1", (hands,))
+
+    def __len__(self):
+        return len(self.ends)
+
+    def frame(self, i):
+        # (timestamp, (hands, 21, 3) landmark view, handedness labels)
+        start = int(self.ends[i - 1]) if i else 0
+        end = int(self.ends[i])
+        labels = [LABELS[h] for h in self.handedness[start:end]]
+        return float(self.timestamps[i]), self.landmarks[start:end], labels
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.frame(i)
+
+    @property
+    def duration(self):
+        if len(self) < 2:
+            return 0.0
+        return float(self.timestamps[-1] - self.timestamps[0])
+
+
+def replay_gestures(replay, engine):
+    # Feed a recording straight into a GestureEngine's gesture layer, using
+    # the recorded timestamps as the clock. Yields (timestamp, gesture).
+    for timestamp, landmarks, handedness in replay:
+        gesture, color, idx = engine.evaluate(landmarks, handedness, now=timestamp)
+        if gesture:
+            yield timestamp, gesture
+
+
+class ReplayEngine:
+    # Engine-shaped wrapper that plays a recording back in real time (paced
+    # by its timestamps) so it can drive a Pipeline.PipelineWorker like a
+    # camera: gestures come from a landmark-only GestureEngine and the frame
+    # is the hand skeleton drawn on a blank canvas.
+    def __init__(self, path, loop=True, enable_actions=False):
+        import GestureEngine
+        import HandTrackingModule as htm
+
+        self.draw_landmarks = htm.drawLandmarks
+        self.log = LandmarkReplay(path)
+        self.engine = GestureEngine.GestureEngine(source=None, enable_actions=enable_actions)
+        self.loop = loop
+        width, height = self.log.meta.get("frame_size") or (640, 480)
+        self.blank = np.zeros((height, width, 3), dtype=np.uint8)
+        self.index = 0
+        self.capture_time = None
+        self.landmarks = np.zeros((0, 21, 3), dtype=np.float32)
+        self.handedness = []
+        self._origin = None  # wall time of the recording's first frame
+
+    @property
+    def timer(self):
+        return self.engine.timer
+
+    def set_timer(self, timer):
+        self.engine.set_timer(timer)
+
+    def process_frame(self, draw=True):
+        if self.index >= len(self.log):
+            if not (self.loop and len(self.log)):
+                return None, None
+            self.index = 0
+            self._origin = None
+        timestamp, landmarks, handedness = self.log.frame(self.index)
+        self.landmarks, self.handedness = landmarks, handedness
+        offset = timestamp - float(self.log.timestamps[0])
+        if self._origin is None:
+            self._origin = time.time() - offset
+        delay = self._origin + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.index += 1
+        self.capture_time = time.time()
+
+        gesture, color, idx = self.engine.evaluate(landmarks, handedness)
+        self.timer.inc('frames_processed_total')
+        if not draw:
+            return self.blank, gesture  # Never drawn on, so it can be shared
+        img = self.draw_landmarks(self.blank.copy(), landmarks)
+        self.timer.inc('frame_allocations_total', stage='draw')
+        self.timer.inc('frame_bytes_copied_total', img.nbytes, stage='draw')
+        if gesture:
+            lm = landmarks[idx]
+            cv2.putText(img, gesture, (int(lm[0, 0]), int(lm[0, 1]) - 50),
+                        cv2.FONT_HERSHEY_DUPLEX, 0.8, color, 2)
+        return img, gesture
+
+    def warm_up(self):
+        # No model to load, but drawing needs MediaPipe's hand connections
+        import HandTrackingModule as htm
+        htm.loadMediapipe()
+
+    def hold_frame(self):
+        return None  # every drawn frame is a new array
+
+    def release(self):
+        self.engine.release()
+
+
+def is_recording(path):
+    return os.path.isfile(os.path.join(path, "ends.bin"))
+
+
+def record(args):
+    import GestureEngine
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    engine = GestureEngine.GestureEngine(source=source, enable_actions=False)
+    engine.recorder = LandmarkRecorder(args.output)
+    start = time.time()
+    try:
+        while args.seconds <= 0 or time.time() - start < args.seconds:
+            frame_bytes, gesture = engine.get_frame_data()
+            if frame_bytes is None:
+                break
+    except KeyboardInterrupt:
+        pass
+    engine.release()
+    print(f"Recorded {engine.recorder.frames} frames, {engine.recorder.hands} hands to {args.output}")
+
+
+def replay(args):
+    import GestureEngine
+
+    log = LandmarkReplay(args.recording)
+    engine = GestureEngine.GestureEngine(source=None, enable_actions=False)
+    start = time.perf_counter()
+    events = list(replay_gestures(log, engine))
+    elapsed = time.perf_counter() - start
+    for timestamp, gesture in events:
+        print(f"{timestamp:.3f} {gesture}")
+    speedup = log.duration / elapsed if elapsed else float("inf")
+    print(f"{len(log)} frames in {elapsed * 1000:.1f} ms ({speedup:.0f}x real time), {len(events)} gestures")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Record or replay landmark logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("record", help="record landmarks from a camera index or video file")
+    p.add_argument("output")
+    p.add_argument("--source", default="0")
+    p.add_argument("--seconds", type=float, default=0, help="stop after N seconds (0 = until EOF / Ctrl+C)")
+    p.set_defaults(func=record)
+    p = sub.add_parser("replay", help="run the gesture logic over a recording")
+    p.add_argument("recording")
+    p.set_defaults(func=replay)
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,66 @@
+import struct
+import numpy as np
+
+# Compact binary messages for the landmark-only stream (/landmarks). Instead
+# of JPEG frames with the skeleton drawn in, viewers get a few hundred bytes
+# per frame and draw the overlay themselves (static/js/script.js). All values
+# are little-endian; coordinates are pixels of the mirrored capture frame.
+#
+# Landmarks (type 1):
+#   u8 type, u8 hands, u16 width, u16 height, u32 seq, f64 capture_ts,
+#   u8 gesture length, gesture (UTF-8), then per hand:
+#   u8 handedness (0 unknown, 1 Left, 2 Right), i16 bbox x0 y0 x1 y1,
+#   i16 x y z for each of the 21 landmarks
+#
+# Thumbnail (type 2), sent at a low rate as a backdrop for the overlay:
+#   u8 type, u32 seq, JPEG bytes
+
+LANDMARKS = 1
+THUMBNAIL = 2
+
+HEADER = struct.Struct("<BBHHIdB")
+HAND = struct.Struct("<B4h")
+THUMBNAIL_HEADER = struct.Struct("<BI")
+HANDEDNESS = {"Left": 1, "Right": 2}
+HANDEDNESS_NAMES = {1: "Left", 2: "Right"}
+
+
+def pack(seq, capture_ts, frame_size, landmarks, handedness, gesture=None):
+    # landmarks: (hands, 21, 3) float array in pixels; frame_size: (width, height)
+    name = (gesture or "").encode()[:255]
+    n = min(len(landmarks), 255)
+    parts = [HEADER.pack(LANDMARKS, n, frame_size[0], frame_size[1], seq & 0xFFFFFFFF,
+                         capture_ts or 0.0, len(name)), name]
+    if n:
+        points = np.clip(np.rint(landmarks[:n]), -32768, 32767).astype("<i2")
+        xy = points[:, :, :2]
+        boxes = np.concatenate((xy.min(axis=1), xy.max(axis=1)), axis=1)
+        for i in range(n):
+            label = handedness[i] if i < len(handedness) else None
+            parts.append(HAND.pack(HANDEDNESS.get(label, 0), *(int(v) for v in boxes[i])))
+            parts.append(points[i].tobytes())
+    return b"".join(parts)
+
+
+def pack_thumbnail(seq, jpeg):
+    return THUMBNAIL_HEADER.pack(THUMBNAIL, seq & 0xFFFFFFFF) + bytes(jpeg)
+
+
+def unpack(data):
+    # Inverse of pack / pack_thumbnail, for tests and tooling
+    if data[0] == THUMBNAIL:
+        _, seq = THUMBNAIL_HEADER.unpack_from(data)
+        return {"type": "thumbnail", "seq": seq, "jpeg": bytes(data[THUMBNAIL_HEADER.size:])}
+    _, n, width, height, seq, capture_ts, name_len = HEADER.unpack_from(data)
+    offset = HEADER.size
+    gesture = bytes(data[offset:offset + name_len]).decode() or None
+    offset += name_len
+    hands = []
+    for _ in range(n):
+        label, *bbox = HAND.unpack_from(data, offset)
+        offset += HAND.size
+        points = np.frombuffer(data, dtype="<i2", count=63, offset=offset).reshape(21, 3)
+        offset += 126
+        hands.append({"handedness": HANDEDNESS_NAMES.get(label), "bbox": bbox, "landmarks": points})
+    return {"type": "landmarks", "seq": seq, "capture_ts": capture_ts, "frame_size": (width, height),
+            "gesture": gesture, "hands": hands}
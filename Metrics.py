@@ -0,0 +1,158 @@
+import bisect
+import threading
+import time
+from collections import deque
+import numpy as np
+import Timing
+
+# Runtime metrics for the live server. Metrics implements the same hook
+# interface as Timing.StageTimer (stage contexts, inc, set), so it can be
+# handed straight to GestureEngine.set_timer. Stage timings become Prometheus
+# histograms; a short window of recent samples backs the JSON percentiles.
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    def __init__(self, buckets, window=1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, prefix="gesture_"):
+        self.prefix = prefix
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.counters = {}    # label key -> value
+        self.gauges = {}      # label key -> value
+        self.histograms = {}  # (metric name, label key) -> Histogram
+
+    # Timing hook interface
+    def __call__(self, stage):
+        return Timing._Stage(self, stage)
+
+    def add(self, stage, seconds):
+        self.observe("stage_seconds", seconds, STAGE_BUCKETS, stage=stage)
+
+    def inc(self, name, value=1, **labels):
+        key = Timing.label_key(self.prefix + name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = Timing.label_key(self.prefix + name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (self.prefix + name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def labeled(self, **labels):
+        return LabeledMetrics(self, labels)
+
+    def forget(self, **labels):
+        # Drop every series carrying these labels (e.g. a torn-down pipeline)
+        wanted = set(labels.items())
+        marks = [f'{k}="{v}"' for k, v in labels.items()]
+        with self._lock:
+            for values in (self.counters, self.gauges):
+                for key in [k for k in values if all(m in k for m in marks)]:
+                    del values[key]
+            for key in [k for k in self.histograms if wanted <= set(k[1])]:
+                del self.histograms[key]
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            hists = {k: (h.buckets, list(h.counts), h.sum, h.count) for k, h in self.histograms.items()}
+        gauges[self.prefix + "uptime_seconds"] = round(time.time() - self.started, 3)
+
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            typed = set()
+            for key in sorted(values):
+                name = key.split("{", 1)[0]
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                lines.append(f"{key} {values[key]}")
+
+        typed = set()
+        for (name, labels), (buckets, counts, total, count) in sorted(hists.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            base = dict(labels)
+            cumulative = 0
+            for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += n
+                lines.append(f"{Timing.label_key(name + '_bucket', {**base, 'le': bound})} {cumulative}")
+            lines.append(f"{Timing.label_key(name + '_sum', base)} {total}")
+            lines.append(f"{Timing.label_key(name + '_count', base)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            hists = {k: (list(h.recent), h.sum, h.count) for k, h in self.histograms.items()}
+
+        histograms = {}
+        for (name, labels), (recent, total, count) in hists.items():
+            entry = {"count": count, "mean_ms": round(total / count * 1000, 4) if count else 0.0}
+            if recent:
+                p50, p95, p99 = np.percentile(np.asarray(recent) * 1000, [50, 95, 99])
+                entry.update(p50_ms=round(float(p50), 4), p95_ms=round(float(p95), 4),
+                             p99_ms=round(float(p99), 4))
+            histograms[Timing.label_key(name, dict(labels))] = entry
+
+        return {
+            "uptime_s": round(time.time() - self.started, 3),
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+
+class LabeledMetrics:
+    # The same hook interface, adding fixed labels (e.g. pipeline="lobby") to
+    # everything recorded through it, so several engines share one registry
+    enabled = True
+
+    def __init__(self, metrics, labels):
+        self.metrics = metrics
+        self.labels = labels
+
+    def __call__(self, stage):
+        return Timing._Stage(self, stage)
+
+    def add(self, stage, seconds):
+        self.metrics.observe("stage_seconds", seconds, STAGE_BUCKETS, stage=stage, **self.labels)
+
+    def inc(self, name, value=1, **labels):
+        self.metrics.inc(name, value, **self.labels, **labels)
+
+    def set(self, name, value, **labels):
+        self.metrics.set(name, value, **self.labels, **labels)
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        self.metrics.observe(name, value, buckets, **self.labels, **labels)
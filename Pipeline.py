@@ -0,0 +1,332 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import GestureRules
+import LandmarkStream
+import Timing
+
+
+# Latest-value buffer: the producer thread overwrites the current value,
+# consumers (threads or asyncio tasks) only ever see the newest one.
+class LatestValue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._value = None
+        self._waiters = []  # (loop, future) pairs of pending async readers
+        self._cond = threading.Condition(self._lock)
+
+    def publish(self, value):
+        with self._lock:
+            self._seq += 1
+            self._value = value
+            waiters, self._waiters = self._waiters, []
+            self._cond.notify_all()
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, fut)
+            except RuntimeError:
+                pass  # Loop already closed
+
+    def latest(self):
+        with self._lock:
+            return self._seq, self._value
+
+    def get(self, after_seq=0, timeout=None):
+        # Blocking read for worker threads
+        with self._lock:
+            if not self._cond.wait_for(lambda: self._seq > after_seq, timeout):
+                return after_seq, None
+            return self._seq, self._value
+
+    async def next(self, after_seq=0):
+        # Wait until something newer than after_seq is published
+        while True:
+            with self._lock:
+                if self._seq > after_seq:
+                    return self._seq, self._value
+                loop = asyncio.get_running_loop()
+                fut = loop.create_future()
+                self._waiters.append((loop, fut))
+            await fut
+
+
+# Bounded event log: unlike LatestValue, a reader gets every value published
+# since its last read, so a burst of events isn't collapsed to the newest.
+# A reader more than `size` events behind loses the oldest ones.
+class EventLog:
+    def __init__(self, size=64):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._events = deque(maxlen=size)  # (seq, value)
+        self._waiters = []
+
+    def publish(self, value):
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, value))
+            waiters, self._waiters = self._waiters, []
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, fut)
+            except RuntimeError:
+                pass  # Loop already closed
+
+    async def next(self, after_seq=0):
+        # (newest seq, [values published after after_seq])
+        while True:
+            with self._lock:
+                if self._seq > after_seq:
+                    return self._seq, [v for seq, v in self._events if seq > after_seq]
+                loop = asyncio.get_running_loop()
+                fut = loop.create_future()
+                self._waiters.append((loop, fut))
+            await fut
+
+
+def _wake(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+
+# Single-producer fan-out for the MJPEG stream. Every frame is captured,
+# inferred and encoded once; all subscribers share the same bytes object and
+# a slow subscriber simply jumps to the newest frame instead of queueing.
+class FrameHub:
+    def __init__(self):
+        self.latest = LatestValue()
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.frames_published = 0
+
+    def publish(self, frame_bytes):
+        self.frames_published += 1
+        self.latest.publish(frame_bytes)
+
+    def subscribe(self):
+        sub = Subscription(self)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+class Subscription:
+    def __init__(self, hub):
+        self.hub = hub
+        self.seq = 0
+        self.delivered = 0
+        self.skipped = 0  # frames this subscriber never saw because it was slow
+
+    async def next(self):
+        seq, frame_bytes = await self.hub.latest.next(self.seq)
+        if self.seq:
+            self.skipped += seq - self.seq - 1
+        self.seq = seq
+        self.delivered += 1
+        return frame_bytes
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Demand-driven JPEG encoding for the MJPEG stream. Frames are only encoded
+# while someone is subscribed, at most max_fps times a second (independent of
+# the inference rate) and optionally downscaled to `width`. Encoding runs on
+# a small thread pool (cv2.imencode releases the GIL), so it overlaps with
+# inference of the next frame. When every encoder is busy the frame is
+# skipped rather than queued, like a slow viewer.
+class StreamEncoder:
+    def __init__(self, quality=80, width=None, max_fps=None, workers=2, hub=None, timer=Timing.NULL_TIMER):
+        self.hub = hub
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        self.width = width
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self.workers = workers
+        self.timer = timer
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="jpeg-encode")
+        self._local = threading.local()  # per-thread resize buffer
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._submitted = 0  # sequence number of the last submitted frame
+        self._published = 0  # sequence number of the newest published frame
+        self._next_due = 0.0
+        self.encoded = 0
+        self.skipped = 0  # frames that were submitted but never published
+
+    def should_encode(self):
+        # Called once per frame before drawing, so unwatched frames skip the
+        # overlay as well as the encode
+        if not self.hub.subscriber_count:
+            self.timer.inc('frames_not_encoded_total', reason='no_viewers')
+            return False
+        if time.perf_counter() < self._next_due:
+            self.timer.inc('frames_not_encoded_total', reason='fps_limit')
+            return False
+        return True
+
+    def submit(self, img, release=None):
+        # img must not be modified until release() is called (after the
+        # encode, or right away if the frame is skipped)
+        with self._lock:
+            if self._in_flight >= self.workers:
+                self.skipped += 1
+                self.timer.inc('frames_not_encoded_total', reason='encoder_busy')
+                if release:
+                    release()
+                return False
+            self._in_flight += 1
+            self._submitted += 1
+            seq = self._submitted
+            if self.interval:
+                self._next_due = max(self._next_due + self.interval, time.perf_counter())
+        self._pool.submit(self._encode, seq, img, release)
+        return True
+
+    def _resize(self, img):
+        h, w = img.shape[:2]
+        size = (self.width, round(h * self.width / w))
+        buf = getattr(self._local, 'buf', None)
+        if buf is None or buf.shape != (size[1], size[0]) + img.shape[2:]:
+            buf = self._local.buf = np.empty((size[1], size[0]) + img.shape[2:], dtype=img.dtype)
+        cv2.resize(img, size, dst=buf, interpolation=cv2.INTER_AREA)
+        return buf
+
+    def _encode(self, seq, img, release=None):
+        buffer = None
+        try:
+            with self.timer('imencode'):
+                if self.width and img.shape[1] > self.width:
+                    img = self._resize(img)
+                ok, buffer = cv2.imencode('.jpg', img, self.params)
+            self.timer.inc('frame_allocations_total', stage='imencode')
+        except Exception as e:
+            print(f"Encode error: {e}")
+        finally:
+            img = None
+            if release:
+                release()
+        with self._lock:
+            self._in_flight -= 1
+            if buffer is None or seq < self._published:
+                # Failed, or a newer frame finished first on another worker
+                self.skipped += 1
+                self.timer.inc('frames_not_encoded_total', reason='stale')
+                return
+            self._published = seq
+            self.encoded += 1
+            # The encoded array is handed out as-is (no tobytes() copy);
+            # viewers only read it, so it is never written again
+            self.hub.publish(memoryview(buffer))
+        self.timer.inc('frames_encoded_total')
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+# Background worker that owns the GestureEngine. Capture and inference
+# happen here, JPEG encoding on the StreamEncoder's pool, so the event loop
+# never blocks on them. While landmark viewers are connected it also
+# publishes every frame's landmarks (LandmarkStream messages), plus a small
+# JPEG thumbnail every so often for them to draw over.
+class PipelineWorker:
+    def __init__(self, engine, encoder=None, thumbnail_width=160, thumbnail_fps=2.0):
+        self.engine = engine
+        self.frames = FrameHub()       # latest JPEG, fanned out to viewers
+        self.gestures = EventLog()  # gesture events {"action", "capture_ts"}
+        self.landmarks = LatestValue()   # latest packed landmark message
+        self.thumbnails = LatestValue()  # latest packed thumbnail message
+        self.landmark_viewers = 0  # set by the session; nothing is packed while 0
+        self.thumbnail_width = thumbnail_width  # 0 = no thumbnails
+        self.thumbnail_interval = 1.0 / thumbnail_fps if thumbnail_fps else 0.0
+        self._next_thumbnail = 0.0
+        self._landmark_seq = 0
+        self.encoder = encoder or StreamEncoder()
+        self.encoder.hub = self.frames
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        # Encoder reports through the same hooks as the engine
+        self.encoder.timer = self.engine.timer
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="gesture-pipeline", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.encoder.shutdown()
+        self.engine.release()
+
+    def step(self):
+        # Process one frame; False when the source had nothing to give
+        encode = self.encoder.should_encode()
+        img, gesture = self.engine.process_frame(draw=encode)
+        if img is None:
+            return False
+        if self.landmark_viewers:
+            self.publish_landmarks(img, gesture)
+        if encode:
+            # Ring-backed frames stay out of rotation until encoded
+            self.encoder.submit(img, self.engine.hold_frame())
+        if gesture and GestureRules.is_event(gesture):
+            # Capture timestamp travels with the event for end-to-end latency
+            self.gestures.publish({"action": gesture, "capture_ts": self.engine.capture_time})
+        return True
+
+    def publish_landmarks(self, img, gesture):
+        timer = self.engine.timer
+        self._landmark_seq += 1
+        height, width = img.shape[:2]
+        with timer('pack_landmarks'):
+            message = LandmarkStream.pack(self._landmark_seq, self.engine.capture_time, (width, height),
+                                          self.engine.landmarks, self.engine.handedness, gesture)
+        self.landmarks.publish(message)
+        now = time.perf_counter()
+        if self.thumbnail_width and now >= self._next_thumbnail:
+            # Small enough to encode inline. Drawn on only if someone is
+            # also watching the MJPEG stream at the moment.
+            self._next_thumbnail = now + self.thumbnail_interval
+            with timer('thumbnail'):
+                size = (self.thumbnail_width, round(height * self.thumbnail_width / width))
+                small = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+                ok, jpeg = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, 60])
+            if ok:
+                self.thumbnails.publish(LandmarkStream.pack_thumbnail(self._landmark_seq, jpeg))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.step():
+                    time.sleep(0.01)  # Avoid tight loop if no frames
+                timer = self.engine.timer
+                if timer.enabled:
+                    # CPU used by this pipeline's thread (capture + inference)
+                    timer.set('pipeline_cpu_seconds', time.thread_time())
+            except Exception as e:
+                print(f"Pipeline error: {e}")
+                self.engine.timer.inc('pipeline_errors_total')
+                time.sleep(0.1)
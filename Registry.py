@@ -0,0 +1,206 @@
+import asyncio
+import os
+import re
+import time
+import Broadcast
+import FrameSource
+import GestureEngine
+import LandmarkLog
+import Pipeline
+import Timing
+
+# Registry of independent gesture pipelines, so one server can drive several
+# cameras or kiosks. Each PipelineSession owns its engine, worker thread,
+# MJPEG hub and WebSocket broadcaster, and records its metrics with a
+# pipeline="<id>" label. Sources:
+#
+#   "0", 1               camera index
+#   "clip.mp4"           video file
+#   "rtsp://host/feed"   any stream URL OpenCV can open
+#   "frames/"            directory of images
+#   "synthetic:640x480"  moving test pattern (FrameSource)
+#   "replay:session.lmk" landmark recording (LandmarkLog), played in real time
+#
+# Files, image directories and the test pattern are paced to their fps and
+# loop, like a replay, so the gesture rules' wall-clock cooldowns and swipe
+# windows see real-time motion. Pipelines requested over HTTP are limited to
+# camera indices, the test pattern and uploaded files (client_source).
+
+ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def client_source(source, upload_dir):
+    # A source a client may open: camera index, synthetic pattern or a file
+    # under upload_dir (by name or path). Anything else is a ValueError.
+    source = str(source)
+    if source.isdigit() or FrameSource.SYNTHETIC_PATTERN.match(source):
+        return source
+    root = os.path.realpath(upload_dir)
+    for candidate in (os.path.join(root, source), source):
+        path = os.path.realpath(candidate)
+        if os.path.commonpath([root, path]) == root and os.path.isfile(path):
+            return path
+    raise ValueError(f"source {source!r} is not a camera index, 'synthetic' or an uploaded file")
+
+
+def open_engine(source, enable_actions=False, inference_pool=None, pool_lanes=None, frame_ring=0,
+                capture_options=None):
+    # Blocking (opens the device / loads the model); call from a thread
+    if isinstance(source, str) and source.startswith("replay:"):
+        return LandmarkLog.ReplayEngine(source[len("replay:"):])
+    if isinstance(source, str) and os.path.isdir(source) and LandmarkLog.is_recording(source):
+        return LandmarkLog.ReplayEngine(source)
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    engine = GestureEngine.GestureEngine(source=source, enable_actions=enable_actions,
+                                         inference_pool=inference_pool, pool_lanes=pool_lanes,
+                                         frame_ring=frame_ring,
+                                         capture_options=dict(capture_options or {}, realtime=True, loop=True))
+    if not engine.cap.isOpened():
+        engine.release()
+        raise ValueError(f"could not open source {source!r}")
+    return engine
+
+
+class PipelineSession:
+    def __init__(self, pipeline_id, source, engine, metrics=None, stream_options=None,
+                 worker_options=None):
+        self.id = pipeline_id
+        self.source = source
+        self.created = time.time()
+        self.engine = engine
+        self.timer = metrics.labeled(pipeline=pipeline_id) if metrics else Timing.NULL_TIMER
+        engine.set_timer(self.timer)
+        self.worker = Pipeline.PipelineWorker(engine, Pipeline.StreamEncoder(**(stream_options or {})),
+                                              **(worker_options or {}))
+        self.broadcaster = Broadcast.Broadcaster(timer=self.timer)
+        # Landmark-only viewers (binary LandmarkStream messages). A short
+        # queue: a viewer that falls behind should skip frames, not lag.
+        self.landmark_broadcaster = Broadcast.Broadcaster(queue_size=4, timer=self.timer,
+                                                          name="ws_landmarks")
+        self._forwarders = []
+
+    async def _forward_gestures(self):
+        # Gestures published by the worker go to this pipeline's WebSocket clients
+        seq = 0
+        while True:
+            seq, events = await self.worker.gestures.next(seq)
+            for event in events:
+                self.broadcaster.broadcast(dict(event, pipeline=self.id))
+                print(f"Broadcasted [{self.id}]: {event['action']}")
+
+    async def _forward_landmarks(self, source):
+        # Only the newest message is forwarded if the loop falls behind
+        seq = 0
+        while True:
+            seq, message = await source.next(seq)
+            self.landmark_broadcaster.broadcast_raw(message)
+            self.update_landmark_viewers()
+
+    def update_landmark_viewers(self):
+        # The worker packs landmarks only while someone is listening
+        self.worker.landmark_viewers = len(self.landmark_broadcaster.clients)
+
+    def start(self):
+        self.worker.start()
+        self._forwarders = [asyncio.create_task(self._forward_gestures()),
+                            asyncio.create_task(self._forward_landmarks(self.worker.landmarks)),
+                            asyncio.create_task(self._forward_landmarks(self.worker.thumbnails))]
+
+    async def stop(self):
+        for task in self._forwarders:
+            task.cancel()
+        await self.broadcaster.close()
+        await self.landmark_broadcaster.close()
+        await asyncio.to_thread(self.worker.stop)
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "source": str(self.source),
+            "uptime_s": round(time.time() - self.created, 1),
+            "frames_published": self.worker.frames.frames_published,
+            "viewers": self.worker.frames.subscriber_count,
+            "ws_clients": len(self.broadcaster.clients),
+            "landmark_clients": len(self.landmark_broadcaster.clients),
+        }
+
+
+class EngineRegistry:
+    def __init__(self, metrics=None, stream_options=None, inference_pool=None, pool_lanes=None,
+                 frame_ring=0, worker_options=None, capture_options=None):
+        self.metrics = metrics
+        self.stream_options = stream_options or {}
+        self.worker_options = worker_options or {}  # PipelineWorker thumbnail settings
+        # Optional InferencePool.InferencePool shared by every camera/file pipeline
+        self.inference_pool = inference_pool
+        self.pool_lanes = pool_lanes
+        self.frame_ring = frame_ring  # spare FrameRing slots per engine
+        self.capture_options = capture_options  # FrameSource.open_source settings
+        self.sessions = {}
+        self._pending = set()  # ids reserved by creates still opening their source
+        self._lock = asyncio.Lock()
+
+    def get(self, pipeline_id):
+        return self.sessions.get(pipeline_id)
+
+    async def create(self, source, pipeline_id=None, enable_actions=False):
+        if pipeline_id is not None and not ID_PATTERN.match(pipeline_id):
+            raise ValueError(f"invalid pipeline id {pipeline_id!r}")
+        # Only the id is reserved under the lock; opening the source and
+        # warming up the model can take seconds and must not hold up other
+        # creates and deletes
+        async with self._lock:
+            if pipeline_id is None:
+                pipeline_id = f"p{len(self.sessions) + len(self._pending) + 1}"
+                while pipeline_id in self.sessions or pipeline_id in self._pending:
+                    pipeline_id += "_"
+            elif pipeline_id in self.sessions or pipeline_id in self._pending:
+                raise KeyError(f"pipeline {pipeline_id!r} already exists")
+            self._pending.add(pipeline_id)
+        try:
+            engine = await asyncio.to_thread(open_engine, source, enable_actions,
+                                             self.inference_pool, self.pool_lanes, self.frame_ring,
+                                             self.capture_options)
+            # Load the model before the first frame, off the event loop
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(engine.warm_up)
+            except BaseException:
+                engine.release()
+                raise
+            warm_up = time.perf_counter() - start
+            session = PipelineSession(pipeline_id, source, engine, self.metrics, self.stream_options,
+                                      self.worker_options)
+            async with self._lock:
+                session.start()
+                self.sessions[pipeline_id] = session
+                self._update_gauges()
+        finally:
+            self._pending.discard(pipeline_id)
+        print(f"Started pipeline {pipeline_id} ({source}), model warm-up {warm_up:.2f}s")
+        return session
+
+    async def remove(self, pipeline_id):
+        async with self._lock:
+            session = self.sessions.pop(pipeline_id, None)
+            self._update_gauges()
+        if session is None:
+            return False
+        await session.stop()
+        if self.metrics:
+            self.metrics.forget(pipeline=pipeline_id)
+        print(f"Stopped pipeline {pipeline_id}")
+        return True
+
+    async def close(self):
+        for pipeline_id in list(self.sessions):
+            await self.remove(pipeline_id)
+
+    def update_viewer_gauges(self):
+        for session in self.sessions.values():
+            session.timer.set("stream_viewers", session.worker.frames.subscriber_count)
+
+    def _update_gauges(self):
+        if self.metrics:
+            self.metrics.set("pipelines", len(self.sessions))
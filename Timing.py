@@ -0,0 +1,86 @@
+import time
+from contextlib import nullcontext
+
+# Per-stage timing hooks for the frame path. Components hold a timer and wrap
+# each stage in `with self.timer('stage'):`, and bump counters, gauges and
+# histograms with `inc`, `set` and `observe`. The default NULL_TIMER hands
+# back one shared no-op context, so the hooks cost next to nothing when
+# disabled.
+
+
+class NullTimer:
+    enabled = False
+    _ctx = nullcontext()
+
+    def __call__(self, stage):
+        return self._ctx
+
+    def add(self, stage, seconds):
+        pass
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def set(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, buckets=None, **labels):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class _Stage:
+    __slots__ = ('timer', 'stage', 'start')
+
+    def __init__(self, timer, stage):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.stage, time.perf_counter() - self.start)
+
+
+class StageTimer:
+    enabled = True
+
+    def __init__(self):
+        self.samples = {}  # stage -> list of durations in seconds
+        self.counters = {}
+
+    def __call__(self, stage):
+        return _Stage(self, stage)
+
+    def add(self, stage, seconds):
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples[stage] = []
+        samples.append(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = label_key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, buckets=None, **labels):
+        # Histogram values (e.g. client latency) are kept as samples too
+        self.add(label_key(name, labels), value)
+
+    def reset(self):
+        self.samples = {}
+        self.counters = {}
+
+
+def label_key(name, labels):
+    # 'name{a="x",b="y"}' with labels sorted, as Prometheus renders them
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
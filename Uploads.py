@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import os
+import uuid
+import cv2
+import VideoIndex
+
+# Streaming video uploads. Chunks are hashed and written from a worker
+# thread as they arrive, so a large upload never blocks the event loop (and
+# with it the gesture stream and WebSockets). Files are stored under their
+# content hash: uploading the same video twice just returns the stored copy.
+# New MP4/MOV uploads can be remuxed in the background with the index moved
+# to the front, and get their keyframe index built right away.
+
+CHUNK_SIZE = 1024 * 1024
+EXTENSIONS = {".mp4", ".m4v", ".mov", ".mkv", ".avi", ".webm"}
+FASTSTART_EXTENSIONS = {".mp4", ".m4v", ".mov"}
+
+
+class UploadError(ValueError):
+    status_code = 400
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+def _write(f, digest, chunk):
+    digest.update(chunk)
+    f.write(chunk)
+
+
+async def store(chunks, filename, folder, max_bytes):
+    # Consumes an async iterator of byte chunks. Returns a dict describing the
+    # stored file; raises UploadError (nothing is left behind on failure).
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in EXTENSIONS:
+        raise UploadError(f"unsupported file type '{ext}'")
+    os.makedirs(folder, exist_ok=True)
+    partial = os.path.join(folder, f".incoming-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(partial, "wb") as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+                await asyncio.to_thread(_write, f, digest, chunk)
+        if not size:
+            raise UploadError("empty upload")
+
+        name = digest.hexdigest()[:32] + ext
+        path = os.path.join(folder, name)
+        duplicate = os.path.exists(path)
+        if duplicate:
+            os.remove(partial)
+        else:
+            os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return {"filename": name, "path": path, "sha256": digest.hexdigest(), "bytes": size,
+            "duplicate": duplicate}
+
+
+def prepare(path, faststart=True):
+    # Background follow-up for a new upload: faststart remux (the content
+    # address stays that of the uploaded bytes), then the keyframe index.
+    ext = os.path.splitext(path)[1].lower()
+    if faststart and ext in FASTSTART_EXTENSIONS:
+        remuxed = path + ".faststart.part"
+        try:
+            if VideoIndex.mp4_faststart(path, remuxed):
+                os.replace(remuxed, path)
+                print(f"Moved MP4 index to the front of {os.path.basename(path)}")
+        except OSError as e:
+            print(f"faststart failed for {path}: {e}")
+        finally:
+            if os.path.exists(remuxed):
+                os.remove(remuxed)
+    try:
+        cap = cv2.VideoCapture(path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        cap.release()
+        VideoIndex.KeyframeIndex.load(path, fps, os.path.dirname(path))
+    except Exception as e:
+        print(f"Keyframe index failed for {path}: {e}")
+
+
+async def file_chunks(upload, chunk_size=CHUNK_SIZE):
+    # Chunks of a starlette UploadFile (multipart form uploads)
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,395 @@
+import bisect
+import json
+import os
+import shutil
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+import cv2
+
+# Fast seeking for OpenCV video playback.
+#
+# cv2.VideoCapture.set(CAP_PROP_POS_FRAMES, n) decodes forward from the
+# keyframe before n, so a seek into the middle of a long GOP stalls. A
+# KeyframeIndex lists the keyframes (read from the MP4 sync-sample table, or
+# ffprobe for other containers) so seeks can land right after one, and is
+# cached as JSON next to uploads so each video is only scanned once.
+# SeekableVideo also keeps an LRU FrameCache of the first frames at every
+# landing point it decodes: a repeated swipe to the same spot is served from
+# the cache while the decoder repositions behind it.
+
+# OpenCV's FFmpeg backend seeks to ~16 frames before the requested one and
+# decodes forward from the keyframe before that. Asking for a keyframe
+# itself therefore decodes the whole previous GOP; asking for the frame
+# SEEK_PREROLL after it decodes only those few frames.
+SEEK_PREROLL = 16
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "uploads")
+INDEX_VERSION = 1
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts"}
+
+
+def _boxes(f, end):
+    # Yields (type, box start, payload start, box end) for the boxes up to `end`
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return  # Corrupt box
+        yield kind, start, start + header, start + size
+        f.seek(start + size)
+
+
+def _mp4_tracks(f, end, track=None, tracks=None):
+    # Collects the sample tables of every track: {hdlr, timescale, stss, stts}
+    if tracks is None:
+        tracks = []
+    for kind, _, start, stop in list(_boxes(f, end)):
+        f.seek(start)
+        if kind == b"trak":
+            track = {}
+            tracks.append(track)
+        if kind in CONTAINERS:
+            _mp4_tracks(f, stop, track, tracks)
+        elif track is not None and kind == b"hdlr":
+            track["hdlr"] = f.read(12)[8:12]
+        elif track is not None and kind == b"mdhd":
+            version = f.read(1)[0]
+            f.seek(start + (20 if version == 1 else 12))
+            track["timescale"] = struct.unpack(">I", f.read(4))[0]
+        elif track is not None and kind == b"stss":
+            count = struct.unpack(">4xI", f.read(8))[0]
+            track["stss"] = struct.unpack(f">{count}I", f.read(4 * count))
+        elif track is not None and kind == b"stts":
+            count = struct.unpack(">4xI", f.read(8))[0]
+            track["stts"] = struct.unpack(f">{2 * count}I", f.read(8 * count))
+        f.seek(stop)
+    return tracks
+
+
+def mp4_keyframes(path):
+    # Keyframe frame numbers and times from the first video track, or None
+    # when the file isn't MP4/MOV. No stss box means every frame is a keyframe.
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(0)
+        try:
+            tracks = _mp4_tracks(f, size)
+        except (struct.error, IndexError):
+            return None
+    for track in tracks:
+        if track.get("hdlr") != b"vide" or "stts" not in track:
+            continue
+        stts = track["stts"]
+        timescale = track.get("timescale") or 1
+        starts = []  # decode time of every sample
+        t = 0
+        for count, delta in zip(stts[::2], stts[1::2]):
+            starts.extend(range(t, t + count * delta, delta) if delta else [t] * count)
+            t += count * delta
+        samples = track.get("stss") or range(1, len(starts) + 1)
+        frames = [s - 1 for s in samples if 0 < s <= len(starts)]
+        return frames, [starts[n] / timescale for n in frames]
+    return None
+
+
+def ffprobe_keyframes(path, fps):
+    if not shutil.which("ffprobe"):
+        return None
+    out = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+                          "-show_entries", "frame=pts_time", "-of", "csv=p=0", path],
+                         capture_output=True, text=True, timeout=120)
+    times = [float(line) for line in out.stdout.split() if line.replace(".", "", 1).isdigit()]
+    if out.returncode or not times:
+        return None
+    return [round(t * fps) for t in times], times
+
+
+def _patch_offsets(moov, start, end, move):
+    # Rewrites every stco/co64 chunk offset inside moov[start:end] as move(offset)
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", moov, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", moov, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise ValueError("corrupt box")
+        if kind in CONTAINERS:
+            _patch_offsets(moov, pos + header, pos + size, move)
+        elif kind in (b"stco", b"co64"):
+            count = struct.unpack_from(">I", moov, pos + header + 4)[0]
+            fmt = f">{count}{'I' if kind == b'stco' else 'Q'}"
+            offsets = [move(o) for o in struct.unpack_from(fmt, moov, pos + header + 8)]
+            if kind == b"stco" and offsets and max(offsets) > 0xFFFFFFFF:
+                raise ValueError("chunk offsets overflow stco")
+            struct.pack_into(fmt, moov, pos + header + 8, *offsets)
+        pos += size
+
+
+def _mover(old, new):
+    # Maps an offset in the old layout to the new one, given both as lists of
+    # (start, stop) byte ranges of the same boxes in the same order
+    def move(offset):
+        for (start, stop), (new_start, _) in zip(old, new):
+            if start <= offset < stop:
+                return new_start + offset - start
+        raise ValueError(f"chunk offset {offset} is not in a box that moves")
+    return move
+
+
+def mp4_faststart(src, dst):
+    # Rewrites an MP4/MOV with the moov box (the index) before the media
+    # data, like qt-faststart, so playback and indexing can start without
+    # reading to the end of the file. Returns False if src is not an MP4,
+    # is already faststart, or can't be rewritten; dst is only written on success.
+    with open(src, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(0)
+        try:
+            # Box extents including headers (64-bit sizes have 16-byte headers)
+            extents = [(kind, start, stop) for kind, start, _, stop in _boxes(f, size)]
+        except struct.error:
+            return False
+        kinds = [kind for kind, _, _ in extents]
+        if b"moov" not in kinds or b"mdat" not in kinds or kinds.index(b"moov") < kinds.index(b"mdat"):
+            return False
+        moov_box = extents[kinds.index(b"moov")]
+        f.seek(moov_box[1])
+        moov = bytearray(f.read(moov_box[2] - moov_box[1]))
+        header = 16 if struct.unpack_from(">I", moov)[0] == 1 else 8
+
+        # New order: ftyp (if it leads), moov, then everything else as it was
+        head = extents[:1] if kinds[0] == b"ftyp" else []
+        rest = [e for e in extents if e is not moov_box and e not in head]
+        old, new, pos = [], [], 0
+        for box in head + [moov_box] + rest:
+            kind, start, stop = box
+            if box is not moov_box:
+                old.append((start, stop))
+                new.append((pos, pos + stop - start))
+            pos += stop - start
+        try:
+            # Chunks in front of moov move back by its size, chunks behind it
+            # stay put; an offset anywhere else means the file can't be moved
+            _patch_offsets(moov, header, len(moov), _mover(old, new))
+        except (ValueError, struct.error) as e:
+            print(f"faststart skipped for {src}: {e}")
+            return False
+
+        with open(dst, "wb") as out:
+            for kind, start, stop in head:
+                f.seek(start)
+                out.write(f.read(stop - start))
+            out.write(moov)
+            for kind, start, stop in rest:
+                f.seek(start)
+                remaining = stop - start
+                while remaining:
+                    chunk = f.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    remaining -= len(chunk)
+    return True
+
+
+class KeyframeIndex:
+    def __init__(self, frames, times):
+        self.frames = list(frames)
+        self.times = list(times)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def nearest(self, seconds):
+        # (frame, time) of the keyframe closest to `seconds`
+        i = bisect.bisect_left(self.times, seconds)
+        if i == len(self.times) or (i and seconds - self.times[i - 1] <= self.times[i] - seconds):
+            i -= 1
+        return self.frames[i], self.times[i]
+
+    def before(self, frame):
+        # Last keyframe at or before `frame`
+        i = bisect.bisect_right(self.frames, frame)
+        return self.frames[i - 1] if i else 0
+
+    @classmethod
+    def load(cls, path, fps, index_dir=DEFAULT_INDEX_DIR):
+        # Cached index if it still matches the file, else scan and cache
+        stat = os.stat(path)
+        cache = os.path.join(index_dir, os.path.basename(path) + ".keyframes.json")
+        key = {"version": INDEX_VERSION, "size": stat.st_size, "mtime": stat.st_mtime}
+        try:
+            with open(cache) as f:
+                data = json.load(f)
+            if all(data.get(k) == v for k, v in key.items()):
+                return cls(data["frames"], data["times"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        found = mp4_keyframes(path) or ffprobe_keyframes(path, fps)
+        if not found:
+            return None
+        index = cls(*found)
+        try:
+            os.makedirs(index_dir, exist_ok=True)
+            with open(cache, "w") as f:
+                json.dump(dict(key, frames=index.frames, times=index.times), f)
+        except OSError as e:
+            print(f"Could not cache keyframe index: {e}")
+        return index
+
+
+class FrameCache:
+    # LRU of decoded frames by frame number, bounded by total bytes
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, frame):
+        img = self._frames.get(frame)
+        if img is None:
+            self.misses += 1
+            return None
+        self._frames.move_to_end(frame)
+        self.hits += 1
+        return img
+
+    def put(self, frame, img):
+        if frame in self._frames or img.nbytes > self.max_bytes:
+            return
+        self._frames[frame] = img
+        self.bytes += img.nbytes
+        while self.bytes > self.max_bytes:
+            _, old = self._frames.popitem(last=False)
+            self.bytes -= old.nbytes
+
+    def __contains__(self, frame):
+        return frame in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+
+class SeekableVideo:
+    # cv2.VideoCapture with keyframe-aligned seeks and a seek cache. Not
+    # thread-safe: one decode thread reads and seeks. read() returns
+    # (success, frame number, image); the image is always the caller's to
+    # draw on (the cache keeps its own copies).
+    def __init__(self, path, cache_mb=128, warm=8, index_dir=DEFAULT_INDEX_DIR, build_index=True):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.cache = FrameCache(int(cache_mb * 1024 * 1024))
+        self.warm = warm  # frames cached from each landing point
+        self.index = None
+        self.position = 0  # number of the next frame read() returns
+        self._replay = []  # cached frames to serve before decoding resumes
+        self._resume = None  # frame the decoder must be moved to after the replay
+        self._index_ready = threading.Event()
+        if build_index and os.path.isfile(path):
+            # Built in the background; seeks fall back to plain frame seeks until ready
+            threading.Thread(target=self._build_index, args=(index_dir,), name="keyframe-index",
+                             daemon=True).start()
+        else:
+            self._index_ready.set()
+
+    def _build_index(self, index_dir):
+        try:
+            self.index = KeyframeIndex.load(self.path, self.fps, index_dir)
+        except Exception as e:
+            print(f"Keyframe index failed for {self.path}: {e}")
+        self._index_ready.set()
+
+    def wait_index(self, timeout=None):
+        return self._index_ready.wait(timeout)
+
+    def _landing_frame(self, keyframe):
+        if keyframe < SEEK_PREROLL:
+            return keyframe  # Start of the file seeks cheaply anyway
+        if self.total_frames:
+            return min(keyframe + SEEK_PREROLL, self.total_frames - 1)
+        return keyframe + SEEK_PREROLL
+
+    def landing(self, seconds, current=None):
+        # Where a seek to `seconds` will land: (frame, time). Given the
+        # playhead `current`, a keyframe landing must be on the same side of
+        # it as the target and within half the jump, or the seek is exact
+        # (slower in a long GOP, but a forward skip never goes backwards).
+        exact = max(0, int(seconds * self.fps))
+        if not self.index:
+            return exact, exact / self.fps
+        frame = self._landing_frame(self.index.nearest(seconds)[0])
+        if current is not None:
+            jump = seconds - current
+            landed = frame / self.fps
+            if (landed - current) * jump <= 0 or abs(landed - seconds) > abs(jump) / 2:
+                frame = exact
+        return frame, frame / self.fps
+
+    def seek(self, seconds, current=None):
+        frame, landed = self.landing(seconds, current)
+        self.seek_frame(frame)
+        return landed
+
+    def seek_frame(self, frame):
+        # Serve whatever run of frames from `frame` is cached first; the
+        # decoder is only repositioned once that run is used up, so the
+        # stall overlaps with showing the cached frames
+        run = []
+        while len(run) < self.warm:
+            img = self.cache.get(frame + len(run))
+            if img is None:
+                break
+            run.append(img)
+        self._replay = run[::-1]
+        self.position = frame
+        self._resume = frame + len(run)
+        if not run:
+            self._reposition()
+
+    def _reposition(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, self._resume)
+        self._resume = None
+
+    def _cacheable(self, frame):
+        # First `warm` frames of every landing point
+        if not self.index:
+            return False
+        offset = frame - self._landing_frame(self.index.before(frame))
+        return 0 <= offset < self.warm
+
+    def read(self):
+        frame = self.position
+        if self._replay:
+            self.position += 1
+            return True, frame, self._replay.pop().copy()
+        if self._resume is not None:
+            self._reposition()
+        success, img = self.cap.read()
+        if not success:
+            return False, frame, None
+        self.position += 1
+        if self._cacheable(frame):
+            self.cache.put(frame, img.copy())
+        return True, frame, img
+
+    def release(self):
+        self.cap.release()
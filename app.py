@@ -1,92 +1,269 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, UploadFile, File
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, BackgroundTasks, HTTPException
+from fastapi.responses import HTMLResponse, StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import os
-import shutil
+from contextlib import asynccontextmanager
 import asyncio
-import GestureEngine
-
-app = FastAPI()
+import os
+import json
+import time
+import Metrics
+import Registry
+import Uploads
 
 # Configuration
 UPLOAD_FOLDER = 'static/uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+MAX_UPLOAD_MB = float(os.environ.get("GESTURE_MAX_UPLOAD_MB", "1024"))
+# Move the MP4 index to the front of new uploads (GESTURE_UPLOAD_FASTSTART=0 to skip)
+UPLOAD_FASTSTART = os.environ.get("GESTURE_UPLOAD_FASTSTART", "1") != "0"
+# Set GESTURE_METRICS=0 to leave the hot-path hooks as no-ops
+METRICS_ENABLED = os.environ.get("GESTURE_METRICS", "1") != "0"
+# /video_feed encoding, independent of the inference rate (0 = unlimited / full size)
+STREAM_QUALITY = int(os.environ.get("GESTURE_STREAM_QUALITY", "80"))
+STREAM_WIDTH = int(os.environ.get("GESTURE_STREAM_WIDTH", "0")) or None
+STREAM_FPS = float(os.environ.get("GESTURE_STREAM_FPS", "0")) or None
+# Backdrop for landmark-only viewers (/landmarks); width 0 = no thumbnails
+THUMBNAIL_WIDTH = int(os.environ.get("GESTURE_THUMBNAIL_WIDTH", "160"))
+THUMBNAIL_FPS = float(os.environ.get("GESTURE_THUMBNAIL_FPS", "2"))
 
-# Static files and Templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+# Pipeline started at boot (empty = none); more can be added at runtime via /pipelines
+DEFAULT_SOURCE = os.environ.get("GESTURE_SOURCE", "0")
+DEFAULT_PIPELINE = "default"
+# GESTURE_ACTIONS=0 keeps the default pipeline from pressing keys / setting brightness
+ACTIONS_ENABLED = os.environ.get("GESTURE_ACTIONS", "1") != "0"
+# Hand tracking in worker processes (0 = in the pipeline thread). Each
+# pipeline spreads over GESTURE_INFERENCE_LANES workers (0 = all of them).
+INFERENCE_WORKERS = int(os.environ.get("GESTURE_INFERENCE_WORKERS", "0"))
+INFERENCE_LANES = int(os.environ.get("GESTURE_INFERENCE_LANES", "0")) or None
+# Spare shared-memory frame slots per pipeline (0 = a new array per frame)
+FRAME_RING = int(os.environ.get("GESTURE_FRAME_RING", "8"))
+# Capture settings requested from cameras (0 = driver default); cameras are
+# read on their own thread, newest frame wins
+CAPTURE_WIDTH = int(os.environ.get("GESTURE_CAPTURE_WIDTH", "0")) or None
+CAPTURE_HEIGHT = int(os.environ.get("GESTURE_CAPTURE_HEIGHT", "0")) or None
+CAPTURE_FPS = float(os.environ.get("GESTURE_CAPTURE_FPS", "0")) or None
+CAPTURE_BUFFER = int(os.environ.get("GESTURE_CAPTURE_BUFFER", "0")) or None
 
-# Gesture Engine
-gesture_engine = GestureEngine.GestureEngine()
+metrics = Metrics.Metrics()
 
-# WebSocket Manager to broadcast gestures
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+# Gesture pipelines (engine + worker + MJPEG hub + WebSocket broadcaster each)
+registry = Registry.EngineRegistry(
+    metrics if METRICS_ENABLED else None,
+    stream_options={"quality": STREAM_QUALITY, "width": STREAM_WIDTH, "max_fps": STREAM_FPS},
+    pool_lanes=INFERENCE_LANES, frame_ring=FRAME_RING,
+    worker_options={"thumbnail_width": THUMBNAIL_WIDTH, "thumbnail_fps": THUMBNAIL_FPS},
+    capture_options={"width": CAPTURE_WIDTH, "height": CAPTURE_HEIGHT, "fps": CAPTURE_FPS,
+                     "buffer_size": CAPTURE_BUFFER})
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Startup state for /ready. The default pipeline (camera, model warm-up) is
+# brought up in the background so the server accepts connections at once.
+startup = {"started": None, "done": False, "error": None, "seconds": None}  # set by lifespan
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+async def start_default_pipeline():
+    try:
+        if DEFAULT_SOURCE:
+            # Only the default pipeline presses keys / sets brightness on this machine
+            await registry.create(DEFAULT_SOURCE, DEFAULT_PIPELINE, enable_actions=ACTIONS_ENABLED)
+    except Exception as e:
+        startup["error"] = str(e)
+        print(f"Default pipeline not started: {e}")
+    finally:
+        startup["done"] = True
+        startup["seconds"] = round(time.time() - startup["started"], 3)
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup["started"] = time.time()
+    if INFERENCE_WORKERS > 0:
+        import InferencePool
+        registry.inference_pool = InferencePool.InferencePool(workers=INFERENCE_WORKERS)
+    task = asyncio.create_task(start_default_pipeline())
+    yield
+    await task  # an engine still opening must be registered before it can be closed
+    await registry.close()
+    if registry.inference_pool:
+        registry.inference_pool.close()
 
-manager = ConnectionManager()
+app = FastAPI(lifespan=lifespan)
+
+# Static files and Templates
+app.mount("/static", StaticFiles(directory="static"), name="static")
+templates = Jinja2Templates(directory="templates")
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.get("/health")
+async def health():
+    # Liveness: the server is up and the event loop is responsive
+    return {"status": "ok", "uptime_s": round(time.time() - startup["started"], 1)}
+
+@app.get("/ready")
+async def ready():
+    # Readiness: the default pipeline has opened its source and warmed up the model
+    body = {"ready": False, "status": "starting", "pipelines": list(registry.sessions),
+            "startup_s": startup["seconds"]}
+    if startup["done"]:
+        if startup["error"]:
+            body.update(status="failed", error=startup["error"])
+        else:
+            body.update(ready=True, status="ready")
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
 @app.post("/upload_video")
-async def upload_video(video: UploadFile = File(...)):
-    filename = video.filename
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(video.file, buffer)
-        
-    return {"status": "success", "filename": filename, "url": f"/static/uploads/{filename}"}
-
-async def generate_frames():
-    while True:
-        # We need to run the engine in a wheel or thread if it's blocking
-        # But for M-JPEG it's usually fine to loop
-        frame_bytes, gesture = gesture_engine.get_frame_data()
-        
-        if gesture and gesture != "Brightness":
-            # Broadcast gesture to all websocket clients
-            # Since this is an async generator, we can await
-            await manager.broadcast({"action": gesture})
-            print(f"Broadcasted: {gesture}")
-
-        if frame_bytes:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+async def upload_video(request: Request, background: BackgroundTasks, filename: str = ""):
+    # The raw request body (?filename=...) is streamed to disk in chunks;
+    # multipart form posts with a "video" field are accepted too
+    max_bytes = int(MAX_UPLOAD_MB * 1024 * 1024)
+    length = request.headers.get("content-length", "")
+    try:
+        if length.isdigit() and int(length) > max_bytes:
+            raise Uploads.UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            video = form.get("video")
+            if video is None or isinstance(video, str):
+                raise Uploads.UploadError("missing 'video' file field")
+            info = await Uploads.store(Uploads.file_chunks(video), video.filename, UPLOAD_FOLDER, max_bytes)
         else:
-            await asyncio.sleep(0.01) # Avoid tight loop if no frames
+            info = await Uploads.store(request.stream(), filename, UPLOAD_FOLDER, max_bytes)
+    except Uploads.UploadError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=e.status_code)
+
+    if not info["duplicate"]:
+        background.add_task(Uploads.prepare, info["path"], UPLOAD_FASTSTART)
+    name = info["filename"]
+    return {"status": "success", "filename": name, "url": f"/static/uploads/{name}",
+            "sha256": info["sha256"], "bytes": info["bytes"], "duplicate": info["duplicate"]}
+
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+def get_session(pipeline_id):
+    session = registry.get(pipeline_id)
+    if session is None:
+        if pipeline_id == DEFAULT_PIPELINE and DEFAULT_SOURCE and not startup["done"]:
+            raise HTTPException(status_code=503, detail="default pipeline is starting")
+        raise HTTPException(status_code=404, detail=f"no pipeline {pipeline_id!r}")
+    return session
+
+async def generate_frames(session):
+    # Only await the pipeline's latest frame; capture, inference and encoding
+    # run once in the pipeline no matter how many viewers are connected
+    with session.worker.frames.subscribe() as sub:
+        while True:
+            frame = await sub.next()
+            yield b''.join((FRAME_HEADER, frame, b'\r\n'))
 
 @app.get("/video_feed")
 async def video_feed():
-    return StreamingResponse(generate_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+    return await pipeline_video_feed(DEFAULT_PIPELINE)
+
+@app.get("/video_feed/{pipeline_id}")
+async def pipeline_video_feed(pipeline_id: str):
+    session = get_session(pipeline_id)
+    return StreamingResponse(generate_frames(session), media_type="multipart/x-mixed-replace; boundary=frame")
+
+@app.get("/pipelines")
+async def list_pipelines():
+    return [session.describe() for session in registry.sessions.values()]
+
+@app.post("/pipelines")
+async def create_pipeline(request: Request):
+    # {"source": "0" | "synthetic" | "<uploaded file>", "id": optional}. Other
+    # sources (streams, replays, any other path) only via GESTURE_SOURCE.
+    body = await request.json()
+    if body.get("source") is None:
+        return JSONResponse({"status": "error", "message": "missing 'source'"}, status_code=400)
+    try:
+        source = Registry.client_source(body["source"], UPLOAD_FOLDER)
+        session = await registry.create(source, body.get("id"))
+    except KeyError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=409)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    return session.describe()
+
+@app.delete("/pipelines/{pipeline_id}")
+async def delete_pipeline(pipeline_id: str):
+    if not await registry.remove(pipeline_id):
+        raise HTTPException(status_code=404, detail=f"no pipeline {pipeline_id!r}")
+    return {"status": "success"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    registry.update_viewer_gauges()
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics.json")
+async def metrics_snapshot():
+    registry.update_viewer_gauges()
+    return metrics.snapshot()
+
+async def websocket_session(websocket, pipeline_id):
+    # Same checks as get_session. While the default pipeline is starting the
+    # socket closes with 1013 (try again later), an unknown id with 1008.
+    try:
+        return get_session(pipeline_id)
+    except HTTPException as e:
+        await websocket.close(code=1013 if e.status_code == 503 else 1008, reason=e.detail)
+        return None
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    await pipeline_websocket(websocket, DEFAULT_PIPELINE)
+
+@app.websocket("/ws/{pipeline_id}")
+async def pipeline_websocket(websocket: WebSocket, pipeline_id: str):
+    session = await websocket_session(websocket, pipeline_id)
+    if session is None:
+        return
+    manager = session.broadcaster
     await manager.connect(websocket)
     try:
         while True:
-            # Just keep the connection alive
-            await websocket.receive_text()
-    except WebSocketDisconnect:
+            # Clients echo each gesture's capture timestamp back once it is
+            # handled, which gives the capture-to-client latency (plus the ack hop)
+            message = await websocket.receive_text()
+            record_client_latency(session, message)
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the broadcaster already evicted and closed this socket
         manager.disconnect(websocket)
 
+@app.websocket("/landmarks")
+async def landmarks_endpoint(websocket: WebSocket):
+    await landmark_websocket(websocket, DEFAULT_PIPELINE)
+
+@app.websocket("/landmarks/{pipeline_id}")
+async def pipeline_landmarks_endpoint(websocket: WebSocket, pipeline_id: str):
+    await landmark_websocket(websocket, pipeline_id)
+
+async def landmark_websocket(websocket: WebSocket, pipeline_id: str):
+    # Binary LandmarkStream messages for client-side overlays; no server-side
+    # drawing or JPEG encoding unless someone also watches /video_feed
+    session = await websocket_session(websocket, pipeline_id)
+    if session is None:
+        return
+    manager = session.landmark_broadcaster
+    await manager.connect(websocket)
+    session.update_landmark_viewers()
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass  # Nothing expected from the client
+    except RuntimeError:
+        pass  # The broadcaster already evicted and closed this socket
+    manager.disconnect(websocket)
+    session.update_landmark_viewers()
+
+def record_client_latency(session, message):
+    try:
+        data = json.loads(message)
+        if data.get("type") == "ack" and data.get("capture_ts"):
+            session.timer.observe("capture_to_ack_seconds", time.time() - float(data["capture_ts"]))
+    except (ValueError, TypeError, AttributeError):
+        pass
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5000)
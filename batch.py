@@ -0,0 +1,149 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Headless batch mode: runs video files through HandDetector and the gesture
+# rules as fast as they decode, one file per worker process, and writes a
+# JSON-lines timeline of gesture events. No camera, no window, no key
+# presses. Timestamps are positions in each video (seconds).
+#
+#   python batch.py sessions/ clip.mp4 --workers 4 --output timeline.jsonl
+#   python batch.py sessions/ --record landmarks/   # also keep the landmarks
+#
+# Recordings are named after each video; videos that share a name (a/clip.mp4,
+# b/clip.mp4) get a short hash of their path appended so none overwrites another.
+#
+# Every event is a line {"type": "gesture", "file", "t", "frame", "gesture",
+# "hand", "track"} (track: the hand's HandTracks id); held poses that repeat
+# every frame (GestureRules.POSE_STATES) are left out. Each file ends with a
+# {"type": "summary", ...} line (frames, duration, processing fps, gesture
+# counts, or "error").
+
+VIDEO_EXTENSIONS = {".mp4", ".m4v", ".mov", ".mkv", ".avi", ".webm"}
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                videos += [os.path.join(root, name) for name in sorted(files)
+                           if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS]
+        else:
+            videos.append(path)
+    return videos
+
+
+def record_names(videos):
+    # {video: recording name}, unique across the batch
+    stems = {}
+    for path in videos:
+        stems.setdefault(os.path.splitext(os.path.basename(path))[0], set()).add(os.path.abspath(path))
+    names = {}
+    for path in videos:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if len(stems[stem]) > 1:
+            stem += "-" + hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+        names[path] = stem
+    return names
+
+
+def process_file(task):
+    # Runs in a worker process. Returns (events, summary) for one video.
+    path, options = task
+    import GestureEngine
+    import GestureRules
+    import LandmarkLog
+
+    summary = {"type": "summary", "file": path}
+    events = []
+    start = time.perf_counter()
+    engine = None
+    try:
+        engine = GestureEngine.GestureEngine(source=path, adaptive_inference=options["adaptive"],
+                                             enable_actions=False, media_clock=True,
+                                             rules_path=options["rules"])
+        if not engine.cap.isOpened():
+            raise ValueError("could not open video")
+        if options["record"]:
+            engine.recorder = LandmarkLog.LandmarkRecorder(options["record"])
+        frames = 0
+        while True:
+            img, gesture = engine.process_frame(draw=False)
+            if img is None:
+                break
+            frames += 1
+            if gesture and GestureRules.is_event(gesture):
+                hand = engine.gesture_hand
+                events.append({"type": "gesture", "file": path, "t": round(engine.capture_time, 3),
+                               "frame": frames - 1, "gesture": gesture,
+                               "hand": engine.handedness[hand] if hand < len(engine.handedness) else None,
+                               "track": engine.rules.tracks[hand].id})
+        elapsed = time.perf_counter() - start
+        counts = {}
+        for event in events:
+            counts[event["gesture"]] = counts.get(event["gesture"], 0) + 1
+        summary.update(frames=frames, duration_s=round(engine.capture_time or 0.0, 3),
+                       elapsed_s=round(elapsed, 3), fps=round(frames / elapsed, 1) if elapsed else 0.0,
+                       gestures=counts)
+    except Exception as e:
+        summary["error"] = str(e)
+    finally:
+        if engine is not None:
+            engine.release()
+    return events, summary
+
+
+def run(args):
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("No video files found", file=sys.stderr)
+        return 1
+    options = {"adaptive": args.adaptive, "record": args.record, "rules": args.rules}
+    out = open(args.output, "w") if args.output else sys.stdout
+    workers = max(1, min(args.workers, len(videos)))
+    frames = failed = 0
+    start = time.perf_counter()
+    # spawn: MediaPipe and OpenCV threads don't survive fork
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ctx.Pool(workers) as pool:
+            names = record_names(videos) if args.record else {}
+            tasks = [(path, dict(options, record=args.record and os.path.join(args.record, names[path])))
+                     for path in videos]
+            for done, (events, summary) in enumerate(pool.imap_unordered(process_file, tasks), 1):
+                # A file's lines stay together; files appear as they finish
+                for line in events + [summary]:
+                    out.write(json.dumps(line) + "\n")
+                out.flush()
+                frames += summary.get("frames", 0)
+                failed += "error" in summary
+                status = summary.get("error") or f"{summary['frames']} frames, {len(events)} gestures, {summary['fps']} fps"
+                print(f"[{done}/{len(videos)}] {summary['file']}: {status}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{len(videos)} files, {frames} frames in {elapsed:.1f}s "
+          f"({frames / elapsed:.1f} fps over {workers} workers), {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    import GestureRules
+
+    parser = argparse.ArgumentParser(description="Extract gesture timelines from video files")
+    parser.add_argument("inputs", nargs="+", help="video files or directories (searched recursively)")
+    parser.add_argument("--output", help="JSON-lines file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="adaptive inference (faster, skips the model on some frames)")
+    parser.add_argument("--record", help="also save each file's landmarks (LandmarkLog) under this directory")
+    parser.add_argument("--rules", default=GestureRules.DEFAULT_PATH, help="gesture rules file")
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,760 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import cv2
+import numpy as np
+import Timing
+
+# Offline benchmark harness. Replays a recording through the real frame path
+# (no webcam, no key presses) and writes per-stage latency stats as JSON so
+# runs can be compared across commits and machines:
+#
+#   python benchmark.py pipeline --video Video.mp4 --output run.json
+#   python benchmark.py pipeline --baseline run.json --max-regression 0.15
+#   python benchmark.py replay session.lmk
+#   python benchmark.py encode --viewers 0,1,20 --width 640 --quality 70
+#   python benchmark.py seek --video Video.mp4 --seeks 20
+#   python benchmark.py workers --workers 1,2,4 --sources 1
+#   python benchmark.py frames --ring 8 --pool-workers 2
+#   python benchmark.py startup --repeat 5
+#   python benchmark.py landmarks --video Video.mp4
+#   python benchmark.py capture --source synthetic:640x480@30 --work-ms 50
+
+
+def percentiles(samples):
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+    }
+
+
+def stage_stats(timer):
+    return {stage: percentiles(samples) for stage, samples in timer.samples.items() if samples}
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip()
+    except Exception:
+        commit = ""
+    versions = {}
+    for name in ("cv2", "mediapipe", "numpy"):
+        module = sys.modules.get(name)
+        if module is not None:
+            versions[name] = getattr(module, "__version__", "")
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+        "args": {k: v for k, v in vars(args).items() if k not in ("func", "output", "baseline")},
+    }
+
+
+def bench_pipeline(args):
+    import GestureEngine
+
+    engine = GestureEngine.GestureEngine(source=args.video,
+                                         adaptive_inference=args.adaptive,
+                                         frame_budget=1 / args.budget_fps,
+                                         roi_inference=args.roi,
+                                         enable_actions=False)
+    if not engine.cap.isOpened():
+        raise SystemExit(f"Could not open {args.video}")
+
+    timer = Timing.StageTimer()
+    engine.set_timer(timer)
+
+    # Warm up the MediaPipe graph outside the measured window
+    for _ in range(args.warmup):
+        if engine.get_frame_data()[0] is None:
+            break
+    timer.reset()
+
+    frames = 0
+    gestures = {}
+    start = time.perf_counter()
+    while args.frames <= 0 or frames < args.frames:
+        frame_start = time.perf_counter()
+        frame_bytes, gesture = engine.get_frame_data()
+        if frame_bytes is None:
+            break
+        timer.add("total", time.perf_counter() - frame_start)
+        frames += 1
+        if gesture:
+            gestures[gesture] = gestures.get(gesture, 0) + 1
+    elapsed = time.perf_counter() - start
+    engine.release()
+
+    return {
+        "frames": frames,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_fps": round(frames / elapsed, 2) if elapsed else 0.0,
+        "gestures": gestures,
+        "counters": timer.counters,
+        "stages": stage_stats(timer),
+    }
+
+
+def bench_replay(args):
+    import GestureEngine
+    import LandmarkLog
+
+    log = LandmarkLog.LandmarkReplay(args.recording)
+    timer = Timing.StageTimer()
+    gestures = {}
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        # Fresh engine per pass so cooldown state doesn't leak between passes
+        engine = GestureEngine.GestureEngine(source=None, enable_actions=False)
+        engine.set_timer(timer)
+        for timestamp, gesture in LandmarkLog.replay_gestures(log, engine):
+            gestures[gesture] = gestures.get(gesture, 0) + 1
+    elapsed = time.perf_counter() - start
+    frames = len(log) * args.repeat
+
+    return {
+        "frames": frames,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_fps": round(frames / elapsed, 2) if elapsed else 0.0,
+        "realtime_factor": round(log.duration * args.repeat / elapsed, 1) if elapsed else 0.0,
+        "gestures": gestures,
+        "counters": timer.counters,
+        "stages": stage_stats(timer),
+    }
+
+
+STREAM_STAGES = ("draw", "draw_text", "imencode")
+
+
+def bench_encode(args):
+    # CPU cost of the MJPEG path: the old inline encode of every frame versus
+    # demand-driven encoding with 0..N viewers attached. Viewers only need to
+    # be subscribed; fan-out hands them all the same encoded buffer.
+    import GestureEngine
+    import Pipeline
+
+    engine = GestureEngine.GestureEngine(source=args.video, adaptive_inference=args.adaptive,
+                                         enable_actions=False)
+    if not engine.cap.isOpened():
+        raise SystemExit(f"Could not open {args.video}")
+    for _ in range(args.warmup):
+        engine.get_frame_data()
+
+    configs = [("inline", None)] + [(f"viewers_{n}", n) for n in args.viewers]
+    runs = {}
+    stages = {}
+    for name, viewers in configs:
+        # Same engine and frames for every run; only the stream path differs
+        engine.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        encoder = Pipeline.StreamEncoder(quality=args.quality, width=args.width,
+                                         max_fps=args.stream_fps, workers=args.workers)
+        worker = Pipeline.PipelineWorker(engine, encoder)
+        subs = [worker.frames.subscribe() for _ in range(viewers or 0)]
+
+        timer = Timing.StageTimer()
+        engine.set_timer(timer)
+        encoder.timer = timer
+        frames = 0
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        while args.frames <= 0 or frames < args.frames:
+            frame_start = time.perf_counter()
+            if viewers is None:
+                ok = engine.get_frame_data()[0] is not None
+            else:
+                ok = worker.step()
+            if not ok:
+                break
+            timer.add("total", time.perf_counter() - frame_start)
+            frames += 1
+        encoder.shutdown()  # waits for in-flight encodes, so their CPU is counted
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        for sub in subs:
+            sub.close()
+
+        # Time spent drawing and encoding, i.e. what the stream itself costs
+        stream = sum(sum(timer.samples.get(stage, ())) for stage in STREAM_STAGES)
+        runs[name] = {
+            "frames": frames,
+            "encoded": frames if viewers is None else encoder.encoded,
+            "throughput_fps": round(frames / elapsed, 2) if elapsed else 0.0,
+            "cpu_s": round(cpu, 4),
+            "cpu_ms_per_frame": round(cpu / frames * 1000, 4) if frames else 0.0,
+            "stream_ms_per_frame": round(stream / frames * 1000, 4) if frames else 0.0,
+        }
+        for stage, stats in stage_stats(timer).items():
+            stages[f"{name}/{stage}"] = stats
+    engine.release()
+
+    base = runs["inline"]["cpu_s"]
+    for run in runs.values():
+        run["cpu_vs_inline"] = round(run["cpu_s"] / base, 3) if base else 0.0
+    return {
+        "frames": runs["inline"]["frames"],
+        "throughput_fps": runs["inline"]["throughput_fps"],
+        "runs": runs,
+        "stages": stages,
+    }
+
+
+def bench_seek(args):
+    # Time from a seek request to its first decoded frame, for the same
+    # forward/rewind swipe pattern: plain CAP_PROP_POS_FRAMES seeks,
+    # keyframe-aligned seeks, and keyframe seeks with the frame cache warm
+    import random
+    import VideoIndex
+
+    probe = VideoIndex.SeekableVideo(args.video, build_index=False)
+    if not probe.cap.isOpened():
+        raise SystemExit(f"Could not open {args.video}")
+    fps, duration = probe.fps, probe.total_frames / probe.fps
+    probe.release()
+
+    # Swipe pairs around random playheads: forward by --skip, then back
+    rng = random.Random(args.seed)
+    targets = []
+    for _ in range(args.seeks):
+        base = rng.uniform(0, max(0.0, duration - args.skip - 1))
+        targets += [base + args.skip, base] * args.repeat
+
+    def run(video, seek):
+        samples = []
+        for target in targets:
+            start = time.perf_counter()
+            seek(video, target)
+            video.read()
+            samples.append(time.perf_counter() - start)
+            for _ in range(args.play):  # watch a little before the next swipe
+                video.read()
+        return samples
+
+    def frame_seek(video, target):
+        video.seek_frame(int(target * fps))
+
+    def keyframe_seek(video, target):
+        video.seek(target)
+
+    timer = Timing.StageTimer()
+    video = VideoIndex.SeekableVideo(args.video, cache_mb=0)
+    video.wait_index()
+    indexed = video.index is not None
+    video.index = None  # plain frame seeks, no cache
+    timer.samples["seek_frame"] = run(video, frame_seek)
+    video.release()
+
+    video = VideoIndex.SeekableVideo(args.video, cache_mb=0)
+    video.wait_index()
+    timer.samples["seek_keyframe"] = run(video, keyframe_seek)
+    video.release()
+
+    video = VideoIndex.SeekableVideo(args.video, cache_mb=args.cache_mb)
+    video.wait_index()
+    run(video, keyframe_seek)  # first pass fills the cache
+    video.cache.hits = video.cache.misses = 0
+    timer.samples["seek_cached"] = run(video, keyframe_seek)
+    video.release()
+
+    return {
+        "seeks": len(targets),
+        "keyframes": len(video.index) if indexed else 0,
+        "cache": {"frames": len(video.cache), "mb": round(video.cache.bytes / 2 ** 20, 1),
+                  "hits": video.cache.hits, "misses": video.cache.misses},
+        "stages": stage_stats(timer),
+    }
+
+
+def bench_workers(args):
+    # Hand tracking throughput with the model in-process versus on an
+    # InferencePool of 1..N worker processes. --sources 1 pipelines one video
+    # across all workers; more sources run side by side, one lane each.
+    import threading
+    import GestureEngine
+    import InferencePool
+
+    counts = args.workers or list(range(1, (os.cpu_count() or 1) + 1))
+    lanes = None if args.sources == 1 else 1
+
+    def run(pool):
+        # Every source is driven by its own thread, as the server's pipelines are
+        timer = Timing.StageTimer()
+        engines = []
+        for _ in range(args.sources):
+            engine = GestureEngine.GestureEngine(source=args.video, adaptive_inference=False,
+                                                 enable_actions=False, inference_pool=pool,
+                                                 pool_lanes=lanes)
+            if not engine.cap.isOpened():
+                raise SystemExit(f"Could not open {args.video}")
+            for _ in range(args.warmup):
+                engine.process_frame(draw=False)
+            engine.set_timer(timer)
+            engines.append(engine)
+        frames = [0] * len(engines)
+
+        def drive(i):
+            while args.frames <= 0 or frames[i] < args.frames:
+                if engines[i].process_frame(draw=False)[0] is None:
+                    break
+                frames[i] += 1
+
+        threads = [threading.Thread(target=drive, args=(i,)) for i in range(len(engines))]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        for engine in engines:
+            engine.release()
+        total = sum(frames)
+        return {
+            "workers": pool.workers if pool else 0,
+            "frames": total,
+            "throughput_fps": round(total / elapsed, 2) if elapsed else 0.0,
+        }, stage_stats(timer)
+
+    runs = {}
+    stages = {}
+    configs = [("in_process", 0)] + [(f"workers_{n}", n) for n in counts]
+    for name, workers in configs:
+        pool = InferencePool.InferencePool(workers=workers) if workers else None
+        try:
+            runs[name], run_stages = run(pool)
+        finally:
+            if pool:
+                pool.close()
+        for stage, stats in run_stages.items():
+            stages[f"{name}/{stage}"] = stats
+
+    base = runs["in_process"]["throughput_fps"]
+    for r in runs.values():
+        r["speedup"] = round(r["throughput_fps"] / base, 3) if base else 0.0
+    return {
+        "sources": args.sources,
+        "throughput_fps": max(r["throughput_fps"] for r in runs.values()),
+        "runs": runs,
+        "stages": stages,
+    }
+
+
+def bench_frames(args):
+    # Frame buffers allocated and bytes copied per frame on the server path
+    # (capture, inference, overlay, encode for one viewer), with every frame
+    # in a new array versus frames living in a shared-memory FrameRing
+    import GestureEngine
+    import InferencePool
+    import Pipeline
+
+    pool = InferencePool.InferencePool(workers=args.pool_workers) if args.pool_workers else None
+    runs = {}
+    stages = {}
+    try:
+        for name, ring in (("arrays", 0), (f"ring_{args.ring}", args.ring)):
+            engine = GestureEngine.GestureEngine(source=args.video, adaptive_inference=False,
+                                                 enable_actions=False, inference_pool=pool,
+                                                 frame_ring=ring)
+            if not engine.cap.isOpened():
+                raise SystemExit(f"Could not open {args.video}")
+            worker = Pipeline.PipelineWorker(engine, Pipeline.StreamEncoder())
+            sub = worker.frames.subscribe()
+            for _ in range(args.warmup):
+                worker.step()
+            timer = Timing.StageTimer()
+            engine.set_timer(timer)
+            worker.encoder.timer = timer
+            frames = 0
+            start = time.perf_counter()
+            while args.frames <= 0 or frames < args.frames:
+                if not worker.step():
+                    break
+                frames += 1
+            worker.encoder.shutdown()
+            elapsed = time.perf_counter() - start
+            sub.close()
+            exhausted = timer.counters.get("frame_ring_exhausted_total", 0)
+            engine.release()
+
+            def per_frame(prefix):
+                total = sum(v for k, v in timer.counters.items() if k.startswith(prefix))
+                return total / frames if frames else 0.0
+
+            runs[name] = {
+                "frames": frames,
+                "throughput_fps": round(frames / elapsed, 2) if elapsed else 0.0,
+                "allocations_per_frame": round(per_frame("frame_allocations_total"), 3),
+                "kb_copied_per_frame": round(per_frame("frame_bytes_copied_total") / 1024, 1),
+                "ring_exhausted": exhausted,
+                "by_stage": {k: v for k, v in timer.counters.items() if k.startswith("frame_")},
+            }
+            for stage, stats in stage_stats(timer).items():
+                stages[f"{name}/{stage}"] = stats
+    finally:
+        if pool:
+            pool.close()
+    return {
+        "pool_workers": args.pool_workers,
+        "throughput_fps": runs[f"ring_{args.ring}"]["throughput_fps"],
+        "runs": runs,
+        "stages": stages,
+    }
+
+
+def bench_landmarks(args):
+    # Per-viewer bandwidth and server CPU of the MJPEG stream (overlay drawn
+    # and encoded on the server) versus the landmark-only stream (binary
+    # landmarks every frame plus a small thumbnail at --thumbnail-fps)
+    import GestureEngine
+    import LandmarkStream
+
+    engine = GestureEngine.GestureEngine(source=args.video, adaptive_inference=args.adaptive,
+                                         enable_actions=False)
+    if not engine.cap.isOpened():
+        raise SystemExit(f"Could not open {args.video}")
+    fps = engine.cap.get(cv2.CAP_PROP_FPS) or 30.0
+    thumbnail_every = max(1, round(fps / args.thumbnail_fps)) if args.thumbnail_fps else 0
+    params = [cv2.IMWRITE_JPEG_QUALITY, args.quality]
+
+    runs = {}
+    stages = {}
+    for name in ("mjpeg", "landmarks"):
+        engine.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        timer = Timing.StageTimer()
+        engine.set_timer(timer)
+        frames = sent = hands = 0
+        while args.frames <= 0 or frames < args.frames:
+            start = time.perf_counter()
+            img, gesture = engine.process_frame(draw=name == "mjpeg")
+            if img is None:
+                break
+            timer.add("frame", time.perf_counter() - start)
+            if name == "mjpeg":
+                with timer("imencode"):
+                    ok, jpeg = cv2.imencode(".jpg", img, params)
+                sent += len(jpeg)
+            else:
+                height, width = img.shape[:2]
+                with timer("pack_landmarks"):
+                    message = LandmarkStream.pack(frames, engine.capture_time, (width, height),
+                                                  engine.landmarks, engine.handedness, gesture)
+                sent += len(message)
+                hands += len(engine.landmarks)
+                # The encoding must round-trip to the nearest pixel
+                unpacked = LandmarkStream.unpack(message)["hands"]
+                for hand, lm in zip(unpacked, engine.landmarks):
+                    assert np.abs(hand["landmarks"] - lm).max() <= 0.5 + 1e-3
+                if thumbnail_every and frames % thumbnail_every == 0:
+                    with timer("thumbnail"):
+                        size = (args.thumbnail_width, round(height * args.thumbnail_width / width))
+                        ok, jpeg = cv2.imencode(".jpg", cv2.resize(img, size, interpolation=cv2.INTER_AREA),
+                                                [cv2.IMWRITE_JPEG_QUALITY, 60])
+                    sent += len(LandmarkStream.pack_thumbnail(frames, jpeg))
+            frames += 1
+
+        stream = sum(sum(timer.samples.get(stage, ()))
+                     for stage in STREAM_STAGES + ("pack_landmarks", "thumbnail"))
+        runs[name] = {
+            "frames": frames,
+            "bytes_per_frame": round(sent / frames, 1) if frames else 0.0,
+            "kbit_per_s": round(sent / frames * fps * 8 / 1000, 1) if frames else 0.0,
+            "stream_ms_per_frame": round(stream / frames * 1000, 4) if frames else 0.0,
+        }
+        if name == "landmarks":
+            runs[name]["hands_per_frame"] = round(hands / frames, 2) if frames else 0.0
+        for stage, stats in stage_stats(timer).items():
+            stages[f"{name}/{stage}"] = stats
+    engine.release()
+
+    base = runs["mjpeg"]["bytes_per_frame"]
+    for r in runs.values():
+        r["bandwidth_vs_mjpeg"] = round(r["bytes_per_frame"] / base, 5) if base else 0.0
+    return {"fps": fps, "runs": runs, "stages": stages}
+
+
+# Child processes for the startup benchmark. Each prints one JSON object of
+# wall-clock timestamps; the parent subtracts its own launch time.
+STARTUP_IMPORT = """
+import json, time
+import {module}
+print(json.dumps({{"imported": time.time()}}))
+"""
+
+STARTUP_ENGINE = """
+import json, sys, time
+import GestureEngine
+t = {{"imported": time.time()}}
+engine = GestureEngine.GestureEngine(source={video!r}, enable_actions=False)
+t["opened"] = time.time()
+engine.warm_up()
+t["warmed_up"] = time.time()
+engine.process_frame()
+t["first_frame"] = time.time()
+engine.release()
+print(json.dumps(t))
+"""
+
+STARTUP_SERVER = """
+import json, time
+import app
+from fastapi.testclient import TestClient
+if __name__ == '__main__':
+    with TestClient(app.app) as client:
+        client.get("/health")
+        t = {{"health": time.time()}}
+        while client.get("/ready").json()["status"] == "starting":
+            time.sleep(0.005)
+        t["ready"] = time.time()
+    print(json.dumps(t))
+"""
+
+
+def bench_capture(args):
+    # Capture-to-consume latency with a consumer slower than the camera: a
+    # plain read() through the driver's frame queue versus the capture thread
+    # that keeps only the newest frame. Files and the synthetic pattern are
+    # paced to their fps and queue --buffer frames like a camera driver.
+    import FrameSource
+
+    runs = {}
+    stages = {}
+    for name, threaded in (("direct", False), ("threaded", True)):
+        source = FrameSource.open_source(args.source, fps=args.fps, buffer_size=args.buffer,
+                                         realtime=True, loop=True, threaded=threaded)
+        if not source.isOpened():
+            raise SystemExit(f"Could not open {args.source}")
+        timer = Timing.StageTimer()
+        source.timer = timer
+        frames = 0
+        start = time.perf_counter()
+        while frames < args.frames:
+            success, img = source.read()
+            if not success:
+                break
+            frames += 1
+            time.sleep(args.work_ms / 1000)  # stands in for inference
+        elapsed = time.perf_counter() - start
+        source.release()
+        stats = stage_stats(timer).get("capture_latency", {})
+        runs[name] = {
+            "frames": frames,
+            "throughput_fps": round(frames / elapsed, 2) if elapsed else 0.0,
+            "dropped": source.frames_dropped,
+            "latency_p50_ms": stats.get("p50_ms", 0.0),
+            "latency_p95_ms": stats.get("p95_ms", 0.0),
+        }
+        stages[f"{name}/capture_latency"] = stats
+    return {"source": str(args.source), "work_ms": args.work_ms, "runs": runs, "stages": stages}
+
+
+def bench_startup(args):
+    # Cold start, each sample in a fresh interpreter: import cost of the
+    # modules the server loads, time to the first processed frame, and time
+    # until the server answers /health and reports /ready
+    env = dict(os.environ, GESTURE_SOURCE=args.video, GESTURE_ACTIONS="0", GESTURE_METRICS="0")
+
+    def child(code):
+        launched = time.time()
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                             env=env, timeout=args.timeout)
+        if out.returncode:
+            raise SystemExit(f"startup child failed:\n{out.stderr[-2000:]}")
+        stamps = json.loads(out.stdout.strip().splitlines()[-1])
+        return launched, stamps
+
+    timer = Timing.StageTimer()
+    for _ in range(args.repeat):
+        for name, module in (("hand_tracking", "HandTrackingModule"), ("mediapipe", "mediapipe"),
+                             ("app", "app")):
+            launched, t = child(STARTUP_IMPORT.format(module=module))
+            timer.add(f"import_{name}", t["imported"] - launched)
+        launched, t = child(STARTUP_ENGINE.format(video=args.video))
+        timer.add("engine_open", t["opened"] - t["imported"])
+        timer.add("engine_warm_up", t["warmed_up"] - t["opened"])
+        timer.add("first_frame", t["first_frame"] - launched)
+        launched, t = child(STARTUP_SERVER.format())
+        timer.add("server_health", t["health"] - launched)
+        timer.add("server_ready", t["ready"] - launched)
+    return {"repeat": args.repeat, "stages": stage_stats(timer)}
+
+
+def compare(result, baseline, metric, max_regression, min_delta_ms):
+    # Returns the stages whose metric got slower than the allowed threshold.
+    # Tiny absolute differences are ignored so sub-millisecond stages don't flap.
+    regressions = []
+    for stage, stats in result.get("stages", {}).items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base or metric not in base:
+            continue
+        old, new = base[metric], stats[metric]
+        if new - old > min_delta_ms and new > old * (1 + max_regression):
+            regressions.append((stage, old, new))
+    return regressions
+
+
+def print_report(result):
+    if "frames" in result:
+        print(f"{result['benchmark']}: {result['frames']} frames, {result.get('throughput_fps', 0)} fps")
+    else:
+        print(f"{result['benchmark']}:")
+    print(f"  {'stage':<24}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, s in sorted(result.get("stages", {}).items()):
+        print(f"  {stage:<24}{s['count']:>8}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}")
+    if "runs" in result and result["benchmark"] == "workers":
+        print(f"  {'run':<24}{'workers':>8}{'frames':>8}{'fps':>10}{'speedup':>10}")
+        for name, r in result["runs"].items():
+            print(f"  {name:<24}{r['workers']:>8}{r['frames']:>8}{r['throughput_fps']:>10.1f}{r['speedup']:>10.3f}")
+    elif "runs" in result and result["benchmark"] == "landmarks":
+        print(f"  {'run':<24}{'frames':>8}{'bytes/f':>10}{'kbit/s':>10}{'stream ms/f':>12}{'vs mjpeg':>10}")
+        for name, r in result["runs"].items():
+            print(f"  {name:<24}{r['frames']:>8}{r['bytes_per_frame']:>10.1f}{r['kbit_per_s']:>10.1f}"
+                  f"{r['stream_ms_per_frame']:>12.3f}{r['bandwidth_vs_mjpeg']:>10.4f}")
+    elif "runs" in result and result["benchmark"] == "capture":
+        print(f"  {'run':<24}{'frames':>8}{'fps':>10}{'dropped':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, r in result["runs"].items():
+            print(f"  {name:<24}{r['frames']:>8}{r['throughput_fps']:>10.1f}{r['dropped']:>10}"
+                  f"{r['latency_p50_ms']:>10.1f}{r['latency_p95_ms']:>10.1f}")
+    elif "runs" in result and result["benchmark"] == "frames":
+        print(f"  {'run':<24}{'frames':>8}{'fps':>10}{'allocs/f':>10}{'KB copied/f':>12}")
+        for name, r in result["runs"].items():
+            print(f"  {name:<24}{r['frames']:>8}{r['throughput_fps']:>10.1f}"
+                  f"{r['allocations_per_frame']:>10.2f}{r['kb_copied_per_frame']:>12.1f}")
+    elif "runs" in result:
+        print(f"  {'run':<24}{'encoded':>8}{'fps':>10}{'cpu ms/f':>10}{'stream ms/f':>12}{'vs inline':>10}")
+        for name, r in result["runs"].items():
+            print(f"  {name:<24}{r['encoded']:>8}{r['throughput_fps']:>10.1f}{r['cpu_ms_per_frame']:>10.3f}"
+                  f"{r['stream_ms_per_frame']:>12.3f}{r['cpu_vs_inline']:>10.3f}")
+
+
+def run(args):
+    result = {"benchmark": args.command, "meta": metadata(args)}
+    result.update(args.func(args))
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.metric, args.max_regression, args.min_delta_ms)
+        for stage, old, new in regressions:
+            print(f"REGRESSION {stage}: {args.metric} {old:.3f} ms -> {new:.3f} ms")
+        if regressions:
+            return 1
+        print(f"No stage regressed more than {args.max_regression:.0%} ({args.metric})")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Gesture pipeline benchmarks")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", help="write results as JSON")
+    common.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    common.add_argument("--metric", default="p95_ms", choices=["mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+    common.add_argument("--max-regression", type=float, default=0.15,
+                        help="fail if a stage gets slower than this fraction (default 0.15)")
+    common.add_argument("--min-delta-ms", type=float, default=0.1,
+                        help="ignore regressions smaller than this many ms")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pipeline", parents=[common], help="per-stage latency of the frame path")
+    p.add_argument("--video", default="Video.mp4")
+    p.add_argument("--frames", type=int, default=0, help="stop after N frames (0 = whole file)")
+    p.add_argument("--warmup", type=int, default=10)
+    p.add_argument("--adaptive", action=argparse.BooleanOptionalAction, default=True,
+                   help="adaptive inference scheduling")
+    p.add_argument("--budget-fps", type=float, default=30.0)
+    p.add_argument("--roi", action="store_true", help="ROI-cropped inference")
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("replay", parents=[common], help="gesture classification over a landmark recording")
+    p.add_argument("recording", help="directory written by LandmarkLog.py record")
+    p.add_argument("--repeat", type=int, default=1)
+    p.set_defaults(func=bench_replay)
+
+    p = sub.add_parser("encode", parents=[common], help="CPU cost of MJPEG encoding by viewer count")
+    p.add_argument("--video", default="Video.mp4")
+    p.add_argument("--frames", type=int, default=300, help="frames per run (0 = whole file)")
+    p.add_argument("--warmup", type=int, default=10)
+    p.add_argument("--adaptive", action=argparse.BooleanOptionalAction, default=True,
+                   help="adaptive inference scheduling")
+    p.add_argument("--viewers", type=lambda v: [int(n) for n in v.split(",")], default=[0, 1, 20],
+                   help="comma-separated viewer counts (default 0,1,20)")
+    p.add_argument("--quality", type=int, default=80)
+    p.add_argument("--width", type=int, default=None, help="downscale the stream to this width")
+    p.add_argument("--stream-fps", type=float, default=None, help="cap the stream frame rate")
+    p.add_argument("--workers", type=int, default=2)
+    p.set_defaults(func=bench_encode)
+
+    p = sub.add_parser("seek", parents=[common], help="seek latency: frame vs keyframe vs cached")
+    p.add_argument("--video", default="Video.mp4")
+    p.add_argument("--seeks", type=int, default=20, help="random playheads to swipe around")
+    p.add_argument("--skip", type=float, default=10.0, help="seconds per swipe")
+    p.add_argument("--repeat", type=int, default=2, help="forward/rewind pairs per playhead")
+    p.add_argument("--play", type=int, default=5, help="frames read after each seek")
+    p.add_argument("--cache-mb", type=float, default=128)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_seek)
+
+    p = sub.add_parser("workers", parents=[common], help="hand tracking throughput by worker processes")
+    p.add_argument("--video", default="Video.mp4")
+    p.add_argument("--frames", type=int, default=200, help="frames per source per run (0 = whole file)")
+    p.add_argument("--warmup", type=int, default=10)
+    p.add_argument("--workers", type=lambda v: [int(n) for n in v.split(",")], default=None,
+                   help="comma-separated worker counts (default 1..cpu count)")
+    p.add_argument("--sources", type=int, default=1,
+                   help="parallel copies of the video (1 = one stream spread over all workers)")
+    p.set_defaults(func=bench_workers)
+
+    p = sub.add_parser("frames", parents=[common], help="frame allocations and copies: arrays vs FrameRing")
+    p.add_argument("--video", default="Video.mp4")
+    p.add_argument("--frames", type=int, default=200, help="frames per run (0 = whole file)")
+    p.add_argument("--warmup", type=int, default=10)
+    p.add_argument("--ring", type=int, default=8, help="spare FrameRing slots")
+    p.add_argument("--pool-workers", type=int, default=0, help="run inference on an InferencePool")
+    p.set_defaults(func=bench_frames)
+
+    p = sub.add_parser("landmarks", parents=[common], help="bandwidth: MJPEG vs landmark-only stream")
+    p.add_argument("--video", default="Video.mp4")
+    p.add_argument("--frames", type=int, default=300, help="frames per run (0 = whole file)")
+    p.add_argument("--adaptive", action=argparse.BooleanOptionalAction, default=True,
+                   help="adaptive inference scheduling")
+    p.add_argument("--quality", type=int, default=80, help="MJPEG quality")
+    p.add_argument("--thumbnail-width", type=int, default=160)
+    p.add_argument("--thumbnail-fps", type=float, default=2.0, help="0 = landmarks only")
+    p.set_defaults(func=bench_landmarks)
+
+    p = sub.add_parser("startup", parents=[common], help="cold import, first frame and server readiness")
+    p.add_argument("--video", default="Video.mp4")
+    p.add_argument("--repeat", type=int, default=3, help="fresh interpreters per measurement")
+    p.add_argument("--timeout", type=float, default=120.0, help="seconds per child process")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("capture", parents=[common], help="capture latency: direct reads vs capture thread")
+    p.add_argument("--source", default="synthetic:640x480@30",
+                   help="camera index, video, image directory or synthetic[:WxH][@fps]")
+    p.add_argument("--fps", type=float, default=None, help="pace files and the test pattern at this rate")
+    p.add_argument("--buffer", type=int, default=4, help="frames the emulated driver queues")
+    p.add_argument("--frames", type=int, default=60, help="frames consumed per run")
+    p.add_argument("--work-ms", type=float, default=50.0, help="consumer time per frame")
+    p.set_defaults(func=bench_capture)
+    return parser
+
+
+if __name__ == '__main__':
+    sys.exit(run(build_parser().parse_args()))
@@ -0,0 +1,92 @@
+import asyncio
+import time
+import Broadcast
+import Timing
+
+# Load test for the gesture WebSocket fan-out. Hundreds of simulated local
+# clients (fast, slow, failing and half-open) are attached to one
+# Broadcaster; broadcast() must stay cheap for the event loop, fast clients
+# must get every event, and bad clients must be evicted without stalling
+# anyone else. No server or browser needed.
+
+FAST, SLOW, FAILING, HUNG = 300, 20, 10, 10
+EVENTS = 200
+EVENT_INTERVAL = 0.005
+
+
+class FakeSocket:
+    def __init__(self, kind):
+        self.kind = kind
+        self.received = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.kind == "failing":
+            raise ConnectionResetError("peer went away")
+        if self.kind == "hung":
+            await asyncio.Event().wait()  # half-open: never completes
+        if self.kind == "slow":
+            await asyncio.sleep(0.05)
+        self.received.append(text)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+
+async def main():
+    timer = Timing.StageTimer()
+    manager = Broadcast.Broadcaster(queue_size=32, send_timeout=0.2, max_failures=3, timer=timer)
+    kinds = ["fast"] * FAST + ["slow"] * SLOW + ["failing"] * FAILING + ["hung"] * HUNG
+    sockets = [FakeSocket(kind) for kind in kinds]
+    for ws in sockets:
+        await manager.connect(ws)
+
+    sent = []
+    slowest = 0.0
+    start = time.perf_counter()
+    for i in range(EVENTS):
+        t = time.perf_counter()
+        sent.append(manager.broadcast({"action": "Play", "seq": i}))
+        slowest = max(slowest, time.perf_counter() - t)
+        await asyncio.sleep(EVENT_INTERVAL)
+    elapsed = time.perf_counter() - start
+    # Let slow clients drain their queues and timeouts fire
+    deadline = time.perf_counter() + 5.0
+    while time.perf_counter() < deadline and any(c.queue for c in manager.clients.values()):
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.1)
+
+    by_kind = {}
+    for ws in sockets:
+        by_kind.setdefault(ws.kind, []).append(ws)
+
+    # Fast clients get everything, in order, as the one shared string per event
+    for ws in by_kind["fast"]:
+        assert len(ws.received) == EVENTS, len(ws.received)
+        assert all(a is b for a, b in zip(ws.received, sent))
+    # Slow clients drop the oldest messages but end on the newest one
+    for ws in by_kind["slow"]:
+        assert ws.received[-1] is sent[-1]
+        assert len(ws.received) < EVENTS
+    # Failing and half-open clients are gone
+    for ws in by_kind["failing"] + by_kind["hung"]:
+        assert ws not in manager.clients and ws.closed
+    assert len(manager.clients) == FAST + SLOW, len(manager.clients)
+    await manager.close()
+
+    evictions = {k: v for k, v in timer.counters.items() if k.startswith("ws_evictions")}
+    print(f"clients={len(sockets)} events={EVENTS} in {elapsed:.2f}s, "
+          f"slowest broadcast() {slowest * 1000:.3f} ms")
+    print(f"sent={timer.counters.get('ws_messages_sent_total', 0)} "
+          f"dropped={timer.counters.get('ws_messages_dropped_total', 0)} evictions={evictions}")
+    # Without per-client queues, one hung client would have stalled the loop
+    # for send_timeout per event
+    assert elapsed < EVENTS * EVENT_INTERVAL * 2 + 1.0, elapsed
+    print("OK")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,12 +1,18 @@
+import sys
 import cv2
+import FrameSource
 
-cap = cv2.VideoCapture(0)
+# Shows a frame source with its capture-to-display latency:
+#   python camera_test.py [camera index | video | image dir | synthetic]
+cap = FrameSource.open_source(sys.argv[1] if len(sys.argv) > 1 else 0, realtime=True)
 
 while True:
     ret, frame = cap.read()
     if not ret:
         break
 
+    cv2.putText(frame, f"{cap.latency * 1000:.0f} ms, {cap.frames_dropped} dropped", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
     cv2.imshow("Webcam Test", frame)
 
     if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -14,4 +20,3 @@ while True:
 
 cap.release()
 cv2.destroyAllWindows()
-
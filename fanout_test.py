@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import Pipeline
+import Timing
+
+# Checks that /video_feed fan-out runs inference and encoding once per frame
+# no matter how many viewers are attached, and not at all with no viewers.
+# Uses a stand-in engine so no camera is needed.
+
+FRAMES = 60
+FRAME_TIME = 0.005
+
+
+class CountingEngine:
+    timer = Timing.NULL_TIMER
+
+    def __init__(self):
+        self.inferences = 0
+        self.lock = threading.Lock()
+
+    def process_frame(self, draw=True):
+        time.sleep(FRAME_TIME)
+        with self.lock:
+            if self.inferences >= FRAMES:
+                return None, None  # camera exhausted
+            self.inferences += 1
+            n = self.inferences
+        return np.full((48, 64, 3), n, dtype=np.uint8), None
+
+    def hold_frame(self):
+        return None  # a new array per frame
+
+    def release(self):
+        pass
+
+
+async def viewer(hub, delay, received):
+    with hub.subscribe() as sub:
+        while True:
+            try:
+                received.append(await asyncio.wait_for(sub.next(), 0.5))
+            except asyncio.TimeoutError:
+                return sub.skipped  # source exhausted
+            if delay:
+                await asyncio.sleep(delay)  # slow client
+
+
+async def run_viewers(n):
+    engine = CountingEngine()
+    worker = Pipeline.PipelineWorker(engine)
+    received = [[] for _ in range(n)]
+    # Every third viewer is slow and must skip frames rather than queue them
+    tasks = [asyncio.create_task(viewer(worker.frames, 0.02 if i % 3 == 2 else 0, received[i]))
+             for i in range(n)]
+    await asyncio.sleep(0)  # let viewers subscribe before the first frame
+    worker.start()
+    skipped = await asyncio.gather(*tasks)
+    worker.stop()
+
+    published = worker.frames.frames_published
+    assert engine.inferences == FRAMES, engine.inferences
+    # One read + inference + encode per frame, not per viewer; a frame is
+    # only dropped when both encoders are still busy with earlier ones
+    assert published == worker.encoder.encoded, (published, worker.encoder.encoded)
+    assert published + worker.encoder.skipped == FRAMES, (published, worker.encoder.skipped)
+    # Everyone ends on the newest frame and shares the same buffer
+    last = [r[-1] for r in received]
+    assert all(frame is last[0] for frame in last)
+    return engine.inferences, published, skipped
+
+
+def run_unwatched():
+    engine = CountingEngine()
+    worker = Pipeline.PipelineWorker(engine)
+    worker.start()
+    while engine.inferences < FRAMES:
+        time.sleep(FRAME_TIME)
+    worker.stop()
+    assert worker.frames.frames_published == 0
+    assert worker.encoder.encoded == 0
+
+
+if __name__ == '__main__':
+    for n in (1, 5, 20):
+        inferences, published, skipped = asyncio.run(run_viewers(n))
+        print(f"viewers={n:2d} frames={published} inferences={inferences} "
+              f"max_skipped={max(skipped)}")
+    run_unwatched()
+    print(f"viewers= 0 frames=0 inferences={FRAMES}")
+    print("OK")
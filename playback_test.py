@@ -0,0 +1,131 @@
+import os
+import struct
+import tempfile
+import time
+import cv2
+import numpy as np
+import Controller
+import VideoIndex
+
+# Headless checks for the pipelined player: Video.mp4 plays against the wall
+# clock (no audio needed) with Video.mp4 also standing in for the webcam.
+# Slow inference must not slow playback, a slow renderer must drop late
+# frames rather than drift, and seeks/pauses must move the clock (in the
+# swipe's direction, even with keyframes far apart). Uploads
+# with the index at the end (and a 64-bit mdat) must remux to the same video.
+
+SECONDS = 4.0
+
+
+def player():
+    return Controller.GestureVideoController("Video.mp4", webcam_source="Video.mp4",
+                                             headless=True, loop=False, audio=False)
+
+
+def slow_inference():
+    app = player()
+    find_hands = app.detector.findHands
+
+    def slow(img, *args, **kwargs):
+        time.sleep(0.2)  # ~5 fps inference
+        return find_hands(img, *args, **kwargs)
+
+    app.detector.findHands = slow
+    report = app.run(seconds=SECONDS)
+    # Video keeps its own pace: nearly every frame shown, on time
+    assert report["shown"] >= SECONDS * app.fps * 0.9, report
+    assert report["mean_drift_ms"] < 1000 / app.fps, report
+    return report
+
+
+def slow_render():
+    app = player()
+    app.show = lambda img: time.sleep(0.05)  # slower than one frame (33 ms)
+    report = app.run(seconds=SECONDS)
+    # Late frames are dropped, so the picture stays with the clock
+    assert report["dropped_late"] > 0, report
+    assert report["max_drift_ms"] < 2000 / app.fps + 60, report
+    assert abs(report["clock_s"] - report["position_s"]) < 0.2, report
+    return report
+
+
+def seek_and_pause():
+    app = player()
+    app.gestures.put("Forward")
+    report = app.run(seconds=1.0)
+    assert report["position_s"] >= 10.0, report
+
+    app = player()
+    app.gestures.put("Pause")
+    report = app.run(seconds=1.0)
+    assert report["shown"] <= 2 and report["clock_s"] < 0.1, report
+    return report
+
+
+def sparse_keyframe_seeks():
+    # Keyframes at 0 s and 30 s only: a 10 s skip must still move the
+    # playhead the way it was asked to, whatever keyframe is nearest
+    app = player()
+    app.video.wait_index()
+    app.video.index = VideoIndex.KeyframeIndex([0, 900], [0.0, 30.0])
+    app.set_pause(True)
+    exact = 0
+    for playhead in np.arange(0.0, app.duration - 10.0, 0.5):
+        for forward in (True, False):
+            app.clock.seek(playhead)
+            app.seek_video(forward)
+            landed = app.clock.time()
+            if forward:
+                assert landed > playhead, (playhead, landed)
+            elif playhead >= 10.0:
+                assert landed < playhead, (playhead, landed)
+            exact += landed not in (0.0, (900 + VideoIndex.SEEK_PREROLL) / app.video.fps)
+    app.video.release()
+    return {"seeks": 2 * len(np.arange(0.0, app.duration - 10.0, 0.5)), "exact": exact}
+
+
+def large_mdat_faststart():
+    # Video.mp4 rewritten as ftyp, other boxes, mdat with a 64-bit size, moov
+    with open("Video.mp4", "rb") as f:
+        data = f.read()
+        f.seek(0)
+        boxes = {kind: (start, payload, stop) for kind, start, payload, stop in VideoIndex._boxes(f, len(data))}
+    moov_start, _, moov_stop = boxes[b"moov"]
+    _, mdat_payload, mdat_stop = boxes[b"mdat"]
+    head = data[:moov_start] if moov_start < boxes[b"mdat"][0] else b""
+    media = data[mdat_payload:mdat_stop]
+    mdat = struct.pack(">I4sQ", 1, b"mdat", 16 + len(media)) + media
+    moov = bytearray(data[moov_start:moov_stop])
+    delta = len(head) + 16 - mdat_payload
+    VideoIndex._patch_offsets(moov, 8, len(moov), lambda offset: offset + delta)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = os.path.join(tmp, "tail.mp4"), os.path.join(tmp, "fast.mp4")
+        with open(src, "wb") as f:
+            f.write(head + mdat + moov)
+        assert VideoIndex.mp4_faststart(src, dst)
+        with open(dst, "rb") as f:
+            kinds = [kind for kind, _, _, _ in VideoIndex._boxes(f, os.path.getsize(dst))]
+        assert kinds.index(b"moov") < kinds.index(b"mdat"), kinds
+        assert VideoIndex.mp4_keyframes(dst) == VideoIndex.mp4_keyframes("Video.mp4")
+        # Every frame decodes to the original pixels
+        frames = 0
+        original, remuxed = cv2.VideoCapture("Video.mp4"), cv2.VideoCapture(dst)
+        while True:
+            ok, a = original.read()
+            ok2, b = remuxed.read()
+            assert ok == ok2, frames
+            if not ok:
+                break
+            assert np.array_equal(a, b), frames
+            frames += 1
+        original.release()
+        remuxed.release()
+    assert frames > 0
+    return {"boxes": [kind.decode() for kind in kinds], "frames": frames}
+
+
+if __name__ == '__main__':
+    for check in (sparse_keyframe_seeks, large_mdat_faststart, slow_inference, slow_render, seek_and_pause):
+        print(f"{check.__name__}: {check()}")
+    print("OK")
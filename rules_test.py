@@ -0,0 +1,171 @@
+import sys
+import time
+from collections import deque
+import numpy as np
+import GestureRules
+import HandTrackingModule as htm
+
+# Regression check for the compiled gesture rules: the dashboard profile in
+# gestures.json against the hand-written if-chain it replaced (kept below as
+# ReferenceChain), frame by frame on random one-hand landmark sequences and,
+# if given, a LandmarkLog recording:
+#   python rules_test.py [recording]
+#
+# The only expected difference is the documented one: the old chain restarted
+# the brightness timer whenever it was due, even with the pinch in the neutral
+# band, while the rules start a cooldown only when a rule fires. Every mismatch
+# must disappear when the reference does the same. (The pinch pose shadows the
+# volume and pause poses in both, so those never fire.)
+#
+# Random sequences keep one hand in view: swipes are now measured per hand
+# (HandTracks) and hands are ranked by rule rather than checked in order, so
+# two-hand frames are expected to differ.
+
+FRAMES = 20000
+SEED = 0
+
+# Finger states of the poses the random hand holds, None = random
+POSES = [[1, 1, 1, 1, 1], [0, 0, 0, 0, 0], [1, 0, 0, 0, 0], [1, 1, 1, 0, 0],
+         [1, 1, 0, 0, 0], [0, 1, 0, 0, 0], None]
+
+
+class ReferenceChain:
+    # The dashboard's if-chain before gestures.json, without its actions.
+    # neutral_reset=False only restarts the brightness timer on a hit.
+    def __init__(self, neutral_reset=True):
+        self.neutral_reset = neutral_reset
+        self.gesture_cooldown = 0
+        self.volume_last_time = 0
+        self.brightness_last_time = 0
+        self.wrist_x_history = deque(maxlen=10)
+
+    def evaluate(self, landmarks, handedness, now):
+        if not len(landmarks):
+            return None
+        self.wrist_x_history.append((now, int(landmarks[0, 0, 0])))
+        fingers = htm.fingersUpArray(landmarks, handedness)
+        pinch = htm.distances(landmarks, 4, 8)
+        for idx, lm in enumerate(landmarks):
+            gesture = self.detect(lm, fingers[idx].tolist(), pinch[idx], now)
+            if gesture:
+                return gesture
+        return None
+
+    def detect(self, lm, fingers, dist, now):
+        if len(self.wrist_x_history) >= 5:
+            start_time, start_x = self.wrist_x_history[0]
+            end_time, end_x = self.wrist_x_history[-1]
+            if now - start_time < 0.4 and abs(end_x - start_x) > 50:
+                if now - self.gesture_cooldown > 1.0:
+                    self.gesture_cooldown = now
+                    return "Forward" if end_x > start_x else "Rewind"
+                return None
+
+        if fingers[2:] == [0, 0, 0]:
+            if now - self.brightness_last_time > 0.15:
+                if self.neutral_reset:
+                    self.brightness_last_time = now
+                if dist < 40:
+                    self.brightness_last_time = now
+                    return "Brightness Down"
+                elif dist > 110:
+                    self.brightness_last_time = now
+                    return "Brightness Up"
+            return "Brightness"
+
+        if fingers[1:] == [0, 0, 0, 0]:
+            if now - self.volume_last_time > 0.2:
+                self.volume_last_time = now
+                if lm[4, 1] < lm[2, 1] - 25:
+                    return "VolUp"
+                elif lm[4, 1] > lm[2, 1] + 25:
+                    return "VolDown"
+
+        if now - self.gesture_cooldown > 1.0:
+            if fingers == [1, 1, 1, 1, 1]:
+                self.gesture_cooldown = now
+                return "Play"
+            if fingers == [0, 0, 0, 0, 0]:
+                self.gesture_cooldown = now
+                return "Pause"
+        return None
+
+
+def hand(rng, wrist, fingers, label, pinch, thumb_dy):
+    # (21, 3) landmarks with the given finger states around an integer wrist
+    lm = np.zeros((21, 3), dtype=np.float32)
+    lm[:, :2] = wrist + rng.uniform(-80, 80, (21, 2))
+    lm[0, :2] = wrist
+    side = -1 if label == "Left" else 1
+    lm[4, 0] = lm[3, 0] + side * (1 if fingers[0] else -1) * rng.uniform(5, 30)
+    lm[4, 1] = lm[2, 1] + thumb_dy
+    # Index tip at the wanted pinch distance from the thumb tip
+    angle = rng.uniform(0, 2 * np.pi)
+    lm[8, :2] = lm[4, :2] + pinch * np.array([np.cos(angle), np.sin(angle)])
+    for f, (pip, tip) in enumerate([(6, 8), (10, 12), (14, 16), (18, 20)], 1):
+        lm[pip, 1] = lm[tip, 1] + (1 if fingers[f] else -1) * rng.uniform(5, 40)
+    return lm
+
+
+def random_frames(count, seed=SEED):
+    # One hand holding random poses for a few frames each, drifting and now
+    # and then swiping sideways, at a jittery ~30 fps
+    rng = np.random.default_rng(seed)
+    now, wrist = 100.0, np.array([320.0, 240.0])
+    frames = []
+    while len(frames) < count:
+        pose = POSES[rng.integers(len(POSES))]
+        fingers = pose if pose is not None else rng.integers(0, 2, 5).tolist()
+        label = "Left" if rng.random() < 0.5 else "Right"
+        step = rng.choice([0, 0, 0, -25, 25]) + rng.normal(0, 3, 2) * [1, 0.5]
+        pinch, thumb_dy = rng.uniform(10, 150), rng.uniform(-60, 60)
+        for _ in range(rng.integers(3, 40)):
+            now += rng.uniform(0.025, 0.040)
+            wrist = np.clip(wrist + step, [50, 50], [590, 430]).round()
+            # Finger and thumb positions move a little within a hold
+            pinch = np.clip(pinch + rng.normal(0, 6), 0, 200)
+            thumb_dy += rng.normal(0, 5)
+            lm = hand(rng, wrist, fingers, label, pinch, thumb_dy)
+            if pose is None and rng.random() < 0.1:
+                fingers = rng.integers(0, 2, 5).tolist()
+            frames.append((now, lm[None], [label]))
+    return frames[:count]
+
+
+def compare(frames, name):
+    rules = GestureRules.GestureRules("dashboard", reload_interval=0)
+    chain, fixed = ReferenceChain(), ReferenceChain(neutral_reset=False)
+    differences, unexplained, counts = 0, [], {}
+    for i, (now, landmarks, handedness) in enumerate(frames):
+        match = rules.evaluate(landmarks, handedness, now=now)
+        got = match.name if match else None
+        expected = chain.evaluate(landmarks, handedness, now)
+        timers = fixed.evaluate(landmarks, handedness, now)
+        if got:
+            counts[got] = counts.get(got, 0) + 1
+        differences += got != expected
+        if got != timers:
+            unexplained.append((i, now, got, timers))
+    print(f"{name}: {len(frames)} frames, {differences} differences from the old chain "
+          f"(brightness timer), {len(unexplained)} unexplained")
+    print(f"  gestures: {dict(sorted(counts.items()))}")
+    return differences, unexplained, counts
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    differences, unexplained, counts = compare(random_frames(FRAMES), "random")
+    # Random poses must reach every reachable rule, and the timer difference must show up
+    names = {rule["name"] for rule in GestureRules.load_profile("dashboard")["rules"]}
+    assert set(counts) == names - {"VolUp", "VolDown", "Pause"}, counts
+    assert differences > 0
+    assert not unexplained, unexplained[:10]
+
+    if len(sys.argv) > 1:
+        import LandmarkLog
+        replay = LandmarkLog.LandmarkReplay(sys.argv[1])
+        # Only frames with at most one hand compare exactly, see above
+        frames = [frame for frame in replay if len(frame[1]) <= 1]
+        _, unexplained, _ = compare(frames, sys.argv[1])
+        assert not unexplained, unexplained[:10]
+    print(f"OK ({time.perf_counter() - start:.1f}s)")
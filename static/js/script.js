@@ -34,6 +34,10 @@ function setupWebSocket() {
     const data = JSON.parse(event.data);
     if (data.action) {
       handleGesture(data.action);
+      // Echo the capture timestamp so the server can measure end-to-end latency
+      if (data.capture_ts) {
+        socket.send(JSON.stringify({ type: 'ack', capture_ts: data.capture_ts }));
+      }
     }
   };
 
@@ -111,22 +115,186 @@ function showToast(message) {
   }, 4000);
 }
 
+// Live feed modes. "server" shows the MJPEG stream with the overlay drawn on
+// the server. The landmark modes open /landmarks instead: a few hundred
+// bytes of binary landmarks per frame (see LandmarkStream.py), drawn here
+// over a low-rate thumbnail from the server or over this browser's camera.
+const feedMode = document.getElementById('feed-mode');
+const camFeed = document.getElementById('cam-feed');
+const landmarkCanvas = document.getElementById('landmark-canvas');
+const localCamera = document.getElementById('local-camera');
+const landmarkCtx = landmarkCanvas.getContext('2d');
+const landmarkUrl = `${protocol}//${window.location.host}/landmarks`;
+
+const HAND_CONNECTIONS = [
+  [0, 1], [1, 2], [2, 3], [3, 4], [0, 5], [5, 6], [6, 7], [7, 8], [5, 9], [9, 10], [10, 11],
+  [11, 12], [9, 13], [13, 14], [14, 15], [15, 16], [13, 17], [0, 17], [17, 18], [18, 19], [19, 20]
+];
+const HANDEDNESS = ['', 'Left', 'Right'];
+
+let landmarkSocket = null;
+let latestLandmarks = null;
+let thumbnail = null;
+let renderScheduled = false;
+
+function parseLandmarks(buffer) {
+  const view = new DataView(buffer);
+  const type = view.getUint8(0);
+  if (type === 2) {
+    return { type: 'thumbnail', jpeg: new Blob([buffer.slice(5)], { type: 'image/jpeg' }) };
+  }
+  const hands = view.getUint8(1);
+  const nameLength = view.getUint8(18);
+  const gesture = new TextDecoder().decode(new Uint8Array(buffer, 19, nameLength));
+  let offset = 19 + nameLength;
+  const parsed = [];
+  for (let h = 0; h < hands; h++) {
+    const label = HANDEDNESS[view.getUint8(offset)] || '';
+    const bbox = [0, 1, 2, 3].map(i => view.getInt16(offset + 1 + 2 * i, true));
+    offset += 9;
+    const points = [];
+    for (let i = 0; i < 21; i++, offset += 6) {
+      points.push([view.getInt16(offset, true), view.getInt16(offset + 2, true)]);
+    }
+    parsed.push({ label, bbox, points });
+  }
+  return {
+    type: 'landmarks',
+    width: view.getUint16(2, true),
+    height: view.getUint16(4, true),
+    gesture,
+    hands: parsed
+  };
+}
+
+function scheduleRender() {
+  if (!renderScheduled) {
+    renderScheduled = true;
+    requestAnimationFrame(renderLandmarks);
+  }
+}
+
+function renderLandmarks() {
+  renderScheduled = false;
+  const frame = latestLandmarks;
+  if (!frame) return;
+  if (landmarkCanvas.width !== frame.width || landmarkCanvas.height !== frame.height) {
+    landmarkCanvas.width = frame.width;
+    landmarkCanvas.height = frame.height;
+  }
+  const ctx = landmarkCtx;
+  ctx.fillStyle = '#000';
+  ctx.fillRect(0, 0, frame.width, frame.height);
+  if (feedMode.value === 'camera' && localCamera.readyState >= 2) {
+    // Server landmarks are mirrored; mirror the local camera to match
+    ctx.save();
+    ctx.scale(-1, 1);
+    ctx.drawImage(localCamera, -frame.width, 0, frame.width, frame.height);
+    ctx.restore();
+  } else if (feedMode.value === 'thumbnail' && thumbnail) {
+    ctx.drawImage(thumbnail, 0, 0, frame.width, frame.height);
+  }
+
+  for (const hand of frame.hands) {
+    ctx.strokeStyle = '#e0e0e0';
+    ctx.lineWidth = 2;
+    ctx.beginPath();
+    for (const [a, b] of HAND_CONNECTIONS) {
+      ctx.moveTo(hand.points[a][0], hand.points[a][1]);
+      ctx.lineTo(hand.points[b][0], hand.points[b][1]);
+    }
+    ctx.stroke();
+    ctx.fillStyle = '#ff3030';
+    for (const [x, y] of hand.points) {
+      ctx.fillRect(x - 3, y - 3, 6, 6);
+    }
+  }
+  if (frame.gesture && frame.hands.length) {
+    const [x, y] = frame.hands[0].points[0];
+    ctx.font = '24px Inter, sans-serif';
+    ctx.fillStyle = '#00ff88';
+    ctx.fillText(frame.gesture, x, y - 50);
+  }
+  if (feedMode.value === 'camera') scheduleRender();  // keep the camera moving
+}
+
+function openLandmarkSocket() {
+  landmarkSocket = new WebSocket(landmarkUrl);
+  landmarkSocket.binaryType = 'arraybuffer';
+  landmarkSocket.onmessage = async (event) => {
+    const message = parseLandmarks(event.data);
+    if (message.type === 'thumbnail') {
+      thumbnail = await createImageBitmap(message.jpeg);
+    } else {
+      latestLandmarks = message;
+    }
+    scheduleRender();
+  };
+  landmarkSocket.onclose = () => {
+    // Reconnect only while a landmark mode is still selected
+    if (landmarkSocket && feedMode.value !== 'server') {
+      setTimeout(() => { if (feedMode.value !== 'server') openLandmarkSocket(); }, 2000);
+    }
+  };
+}
+
+async function setFeedMode(mode) {
+  localStorage.setItem('feedMode', mode);
+  if (mode === 'server') {
+    if (landmarkSocket) {
+      const old = landmarkSocket;
+      landmarkSocket = null;
+      old.close();
+    }
+    if (localCamera.srcObject) {
+      localCamera.srcObject.getTracks().forEach(track => track.stop());
+      localCamera.srcObject = null;
+    }
+    landmarkCanvas.hidden = true;
+    camFeed.hidden = false;
+    camFeed.src = camFeed.dataset.src;
+    return;
+  }
+  // Dropping the <img> source closes the MJPEG stream, so the server stops
+  // drawing and encoding frames for this viewer
+  camFeed.removeAttribute('src');
+  camFeed.hidden = true;
+  landmarkCanvas.hidden = false;
+  if (mode === 'camera' && !localCamera.srcObject) {
+    try {
+      localCamera.srcObject = await navigator.mediaDevices.getUserMedia({ video: true });
+    } catch (err) {
+      console.warn('Local camera unavailable, using thumbnails:', err);
+      feedMode.value = 'thumbnail';
+      return setFeedMode('thumbnail');
+    }
+  }
+  if (mode === 'thumbnail' && localCamera.srcObject) {
+    localCamera.srcObject.getTracks().forEach(track => track.stop());
+    localCamera.srcObject = null;
+  }
+  if (!landmarkSocket) openLandmarkSocket();
+  scheduleRender();
+}
+
+feedMode.addEventListener('change', () => setFeedMode(feedMode.value));
+feedMode.value = localStorage.getItem('feedMode') || 'server';
+if (feedMode.value !== 'server') setFeedMode(feedMode.value);
+
 // File Upload
 document.getElementById('video-upload').addEventListener('change', async function (e) {
   const file = e.target.files[0];
   if (!file) return;
 
-  // Create FormData
-  const formData = new FormData();
-  formData.append('video', file);
-
   try {
     // Show loading state (simple)
     document.querySelector('.upload-btn').textContent = "Uploading...";
 
-    const response = await fetch('/upload_video', {
+    // Send the file as the raw request body so the server can stream it to disk
+    const response = await fetch('/upload_video?filename=' + encodeURIComponent(file.name), {
       method: 'POST',
-      body: formData
+      headers: { 'Content-Type': file.type || 'application/octet-stream' },
+      body: file
     });
 
     const result = await response.json();